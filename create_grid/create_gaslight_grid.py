@@ -8,6 +8,12 @@ from synthesizer.grid import Grid
 from synthesizer.sed import Sed
 from synthesizer.abundances import Abundances
 from synthesizer.photoionisation import cloudy23, cloudy17
+from gaslight.io import (
+    write_grid,
+    parse_chunks,
+    LAYOUT_VERSION,
+    PRECISIONS,
+)
 from utils import (
     get_grid_properties,
     load_grid_params,)
@@ -56,6 +62,50 @@ if __name__ == "__main__":
                         default=False,
                         required=False)
 
+    # the layout of the output grid (see gaslight.io)
+    parser.add_argument("-layout_version",
+                        type=int,
+                        default=LAYOUT_VERSION,
+                        required=False)
+
+    # the chunking of the grid datasets: line, slice, auto, none or a comma
+    # separated chunk shape (see gaslight.io.get_chunk_shape)
+    parser.add_argument("-chunks",
+                        type=str,
+                        default=None,
+                        required=False)
+
+    # the compression filter, e.g. gzip or lzf
+    parser.add_argument("-compression",
+                        type=str,
+                        default=None,
+                        required=False)
+
+    # the compression level (gzip only)
+    parser.add_argument("-compression_opts",
+                        type=int,
+                        default=None,
+                        required=False)
+
+    # apply the shuffle filter before compression
+    parser.add_argument("-shuffle",
+                        action="store_true")
+
+    # the precision to store the lines and continua at: float64, float32 or
+    # mixed (float32 luminosities, float64 continua). float32 can only hold
+    # values up to ~3.4e38, so luminosities above this need -log10.
+    parser.add_argument("-precision",
+                        type=str,
+                        default="float64",
+                        choices=PRECISIONS,
+                        help="float32 and mixed require -log10 for "
+                             "luminosities above ~3.4e38 erg/s",
+                        required=False)
+
+    # store log10 of the lines and continua
+    parser.add_argument("-log10",
+                        action="store_true")
+
     # parse arguments
     args = parser.parse_args()
     incident_grid_dir = args.incident_grid_dir
@@ -65,6 +115,8 @@ if __name__ == "__main__":
     output_dir = args.output_dir
     normalise = args.normalise
     save_continuum = args.save_continuum
+    layout_version = args.layout_version
+    precision = args.precision
 
     # define model name
     model_name = f'{incident_grid}-{config_file}'
@@ -156,16 +208,21 @@ if __name__ == "__main__":
 
     # Setup output arrays.
 
-    # line luminosities and correspinding continuum
-    luminosity = {}
-    incident_continuum = {}
-    nebular_continuum = {}
-    transmitted_continuum = {}
-    for line_id in line_ids:
-        luminosity[line_id] = np.empty(total_shape)
-        incident_continuum[line_id] = np.empty(total_shape)
-        nebular_continuum[line_id] = np.empty(total_shape)
-        transmitted_continuum[line_id] = np.empty(total_shape)
+    # line luminosities and correspinding continuum. Each is a single array
+    # with the line as the first axis, i.e. a line cube (see gaslight.io).
+    line_index = {line_id: i for i, line_id in enumerate(line_ids)}
+    cube_shape = (len(line_ids),) + tuple(total_shape)
+    # These are allocated at float64, whatever the storage precision, so
+    # values beyond the range of float32 (~3.4e38) are not silently turned
+    # into infinities here. write_grid casts them to the storage precision,
+    # raising an exception if they do not fit (in which case use -log10).
+    luminosity = np.empty(cube_shape)
+    incident_continuum = np.empty(cube_shape)
+    nebular_continuum = np.empty(cube_shape)
+    transmitted_continuum = np.empty(cube_shape)
+
+    # line wavelengths
+    wavelengths = {}
 
     # continuum
     if save_continuum:
@@ -224,7 +281,7 @@ if __name__ == "__main__":
             else:
 
                 # Read in line luminosities and normalise them if required.
-                line_ids, line_wavelengths, line_luminosities = cloudy.read_linelist(
+                model_line_ids, line_wavelengths, line_luminosities = cloudy.read_linelist(
                     model_file,
                     extension='emergent_elin')
 
@@ -233,26 +290,30 @@ if __name__ == "__main__":
 
                 # record line luminosities and continu
                 for line_id, line_luminosity, line_wavelength in zip(
-                    line_ids,
+                    model_line_ids,
                     line_luminosities,
                     line_wavelengths):
 
-                    luminosity[line_id][model_index] = (line_luminosity
-                                                               / normalisation)
+                    wavelengths[line_id] = line_wavelength
+
+                    # the index of this line and model in the line cubes
+                    index = (line_index[line_id],) + model_index
 
-                    incident_continuum[line_id][model_index] = np.interp(
+                    luminosity[index] = (line_luminosity / normalisation)
+
+                    incident_continuum[index] = np.interp(
                         line_wavelength,
                         spec_dict['lam'],
                         spec_dict['incident']
                         ) / normalisation
 
-                    nebular_continuum[line_id][model_index] = np.interp(
+                    nebular_continuum[index] = np.interp(
                         line_wavelength,
                         spec_dict['lam'],
                         spec_dict['nebular_continuum']
                         ) / normalisation
 
-                    transmitted_continuum[line_id][model_index] = np.interp(
+                    transmitted_continuum[index] = np.interp(
                         line_wavelength,
                         spec_dict['lam'],
                         spec_dict['transmitted']
@@ -286,24 +347,26 @@ if __name__ == "__main__":
         open(f'{model_name}.failed_models', 'w').writelines(failed_grid_points_string_list)
 
 
-    # open the new grid and save results
-    with h5py.File(f"{grid_dir}/{model_name}.hdf5", "w") as hf:
-
-        # save a list of the axes in the correct order
-        hf.attrs['axes'] = total_axes
-
-        # save the values of the axes
-        for k, v in total_axes_values.items():
-            hf[f'axes/{k}'] = v
-
-        for line_id, line_wavelength in zip(line_ids, line_wavelengths):
-            hf[f'wavelength/{line_id}'] = line_wavelength
-
-        for line_id in line_ids:
-            hf[f'luminosity/{line_id}'] = luminosity[line_id]
-            hf[f'incident_continuum/{line_id}'] = incident_continuum[line_id]
-            hf[f'nebular_continuum/{line_id}'] = nebular_continuum[line_id]
-            hf[f'transmitted_continuum/{line_id}'] = transmitted_continuum[line_id]
+    # create the new grid and save results
+    write_grid(
+        f"{grid_dir}/{model_name}.hdf5",
+        total_axes,
+        total_axes_values,
+        line_ids,
+        wavelengths,
+        {
+            'luminosity': luminosity,
+            'incident_continuum': incident_continuum,
+            'nebular_continuum': nebular_continuum,
+            'transmitted_continuum': transmitted_continuum,
+        },
+        layout_version=layout_version,
+        chunks=parse_chunks(args.chunks),
+        compression=args.compression,
+        compression_opts=args.compression_opts,
+        shuffle=args.shuffle,
+        precision=precision,
+        log10=args.log10)
 
     # open the new continuum grid and save results
     if save_continuum:
@@ -0,0 +1,527 @@
+"""
+Caching utilities used by the Grid.
+
+The LRUCache defined here is used to hold lazily loaded line arrays and
+other objects which are expensive to (re)create but which we do not want to
+keep around indefinitely.
+
+The DiskCache persists derived products (arrays, or tuples and dictionaries
+of arrays) between sessions as NPZ files in a directory, so repeated runs
+start warm. Entries are keyed by a hash of an arbitrary (hashable) key which
+the Grid builds from its content hash and the computation's parameters, so
+entries for a grid that has since changed are simply never read again, and
+are eventually evicted.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def get_nbytes(value):
+    """
+    Estimate the memory footprint of a cached value.
+
+    Arrays report their own size. Tuples, lists and dictionaries are summed
+    over their contents. Anything else is treated as having no size, i.e.
+    it will only be counted against the number of items.
+
+    Args:
+        value (object)
+            The object to measure.
+
+    Returns:
+        int
+            The (approximate) size of the object in bytes.
+    """
+
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sum(get_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(get_nbytes(v) for v in value.values())
+    return 0
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used cache with optional limits on both the
+    number of items and the total memory held.
+
+    Attributes:
+        max_items (int)
+            The maximum number of items to hold. None means unlimited.
+        max_bytes (int)
+            The maximum number of bytes to hold. None means unlimited.
+        nbytes (int)
+            The number of bytes currently held.
+        hits (int)
+            The number of successful lookups.
+        misses (int)
+            The number of failed lookups.
+    """
+
+    def __init__(self, max_items=None, max_bytes=None):
+        """
+        Initialise the cache.
+
+        Args:
+            max_items (int)
+                The maximum number of items to hold. None means unlimited.
+            max_bytes (int)
+                The maximum number of bytes to hold. None means unlimited.
+        """
+
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+
+        # The cached values, ordered from least to most recently used, and
+        # the size of each.
+        self._data = OrderedDict()
+        self._sizes = {}
+        self.nbytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+        # A re-entrant lock protecting the data and counters, and a lock per
+        # key currently being created by get_or_create.
+        self._lock = threading.RLock()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __getstate__(self):
+        """
+        Locks cannot be pickled so drop it (and the cached data, which the
+        receiving process can rebuild on demand).
+        """
+        state = self.__dict__.copy()
+        state["_data"] = OrderedDict()
+        state["_sizes"] = {}
+        state["nbytes"] = 0
+        del state["_lock"]
+        del state["_pending"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        self._pending = {}
+
+    def get(self, key, default=None):
+        """
+        Return a cached value, marking it as the most recently used.
+
+        Args:
+            key (hashable)
+                The key to look up.
+            default (object)
+                The value to return if the key is not in the cache.
+
+        Returns:
+            object
+                The cached value or default.
+        """
+
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """
+        Add a value to the cache, evicting the least recently used entries
+        as necessary to respect the limits. A value that on its own exceeds
+        max_bytes is not cached.
+
+        Args:
+            key (hashable)
+                The key to store the value under.
+            value (object)
+                The value to store.
+        """
+
+        nbytes = get_nbytes(value)
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return
+
+            self._data[key] = value
+            self._sizes[key] = nbytes
+            self.nbytes += nbytes
+
+            # Evict until we are within the limits
+            while (
+                (self.max_items is not None
+                 and len(self._data) > self.max_items)
+                or (self.max_bytes is not None
+                    and self.nbytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._data)))
+
+    def get_or_create(self, key, factory):
+        """
+        Return a cached value, creating (and caching) it with factory() if it
+        is not present.
+
+        This is safe to call from several threads: a value is only created
+        once, with other threads requesting the same key waiting for it,
+        while different keys can be created concurrently.
+
+        Args:
+            key (hashable)
+                The key to look up.
+            factory (callable)
+                A function taking no arguments that creates the value.
+
+        Returns:
+            object
+                The cached or newly created value.
+        """
+
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            key_lock = self._pending.setdefault(key, threading.Lock())
+
+        with key_lock:
+
+            # Another thread may have created the value while we waited
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    return self._data[key]
+
+            try:
+                value = factory()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+
+        return value
+
+    def _remove(self, key):
+        """
+        Remove a key, updating the memory count.
+        """
+        del self._data[key]
+        self.nbytes -= self._sizes.pop(key)
+
+    def clear(self):
+        """
+        Empty the cache. The hit and miss counters are retained.
+        """
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """
+        Return a summary of the cache usage.
+
+        Returns:
+            dict
+                A dictionary containing the number of items, bytes, hits and
+                misses.
+        """
+        return {
+            "items": len(self._data),
+            "nbytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def get_stable_key(key):
+    """
+    Convert a key into a string that is the same in every session. This
+    differs from repr in that sets are sorted (the order of a set of strings
+    changes between sessions).
+
+    Args:
+        key (object)
+            A key built from strings, numbers, None, tuples, lists and
+            (frozen)sets.
+
+    Returns:
+        str
+    """
+
+    if isinstance(key, (tuple, list)):
+        return "(" + ",".join(get_stable_key(k) for k in key) + ")"
+    if isinstance(key, (set, frozenset)):
+        return "{" + ",".join(sorted(get_stable_key(k) for k in key)) + "}"
+    if isinstance(key, slice):
+        return get_stable_key(("slice", key.start, key.stop, key.step))
+    if isinstance(key, np.generic):
+        return repr(key.item())
+    return repr(key)
+
+
+class DiskCache:
+    """
+    A persistent cache of arrays, stored as one NPZ file per entry in a
+    directory, with an optional limit on the total size. When the limit is
+    exceeded the least recently used entries (by file modification time,
+    which is updated on every read) are deleted.
+
+    Several processes can share a directory: files are written to a
+    temporary name and then atomically renamed, and missing or unreadable
+    entries are treated as misses.
+
+    Attributes:
+        directory (str)
+            The directory holding the cache.
+        max_bytes (int)
+            The maximum total size of the cache in bytes. None means
+            unlimited.
+        hits (int)
+            The number of successful lookups.
+        misses (int)
+            The number of failed lookups.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        """
+        Initialise the cache, creating the directory if necessary.
+
+        Args:
+            directory (str)
+                The directory holding the cache.
+            max_bytes (int)
+                The maximum total size of the cache in bytes. None means
+                unlimited.
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_path(self, key):
+        """
+        The path of the file holding an entry.
+        """
+        name = hashlib.sha256(get_stable_key(key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.npz")
+
+    def __contains__(self, key):
+        return os.path.exists(self._get_path(key))
+
+    def get(self, key, default=None):
+        """
+        Return a cached value, marking it as the most recently used.
+
+        Args:
+            key (hashable)
+                The key to look up.
+            default (object)
+                The value to return if the key is not in the cache.
+
+        Returns:
+            object
+                The cached value or default.
+        """
+
+        path = self._get_path(key)
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                value = _decode(data)
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Add a value to the cache, evicting the least recently used entries
+        as necessary to respect the size limit.
+
+        Args:
+            key (hashable)
+                The key to store the value under.
+            value (np.ndarray, tuple, list or dict)
+                The value to store. Dictionaries must have string keys.
+        """
+
+        path = self._get_path(key)
+
+        # Write to a temporary file then rename so readers never see a
+        # partially written entry
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                np.savez(file, **_encode(value))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.evict()
+
+    def get_or_create(self, key, factory):
+        """
+        Return a cached value, creating (and caching) it with factory() if it
+        is not present.
+
+        Args:
+            key (hashable)
+                The key to look up.
+            factory (callable)
+                A function taking no arguments that creates the value.
+
+        Returns:
+            object
+                The cached or newly created value.
+        """
+
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def _get_entries(self):
+        """
+        Return the (path, size, modification time) of every entry.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".npz"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    @property
+    def nbytes(self):
+        """
+        The total size of the cache in bytes.
+        """
+        return sum(size for _, size, _ in self._get_entries())
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache is within
+        its size limit.
+        """
+
+        if self.max_bytes is None:
+            return
+
+        entries = self._get_entries()
+        nbytes = sum(size for _, size, _ in entries)
+
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if nbytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            nbytes -= size
+
+    def clear(self):
+        """
+        Delete every entry. The hit and miss counters are retained.
+        """
+        for path, _, _ in self._get_entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """
+        Return a summary of the cache usage.
+
+        Returns:
+            dict
+                A dictionary containing the number of items, bytes, hits and
+                misses.
+        """
+        entries = self._get_entries()
+        return {
+            "items": len(entries),
+            "nbytes": sum(size for _, size, _ in entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _encode(value):
+    """
+    Convert an array, or a tuple, list or dictionary of arrays, into the
+    arrays stored in an NPZ file. The "__kind__" entry records which.
+    """
+
+    if isinstance(value, dict):
+        arrays = {f"k:{k}": np.asarray(v) for k, v in value.items()}
+        kind = "dict"
+    elif isinstance(value, (tuple, list)):
+        arrays = {f"i:{i}": np.asarray(v) for i, v in enumerate(value)}
+        kind = "tuple"
+    else:
+        arrays = {"value": np.asarray(value)}
+        kind = "array"
+
+    arrays["__kind__"] = np.array(kind)
+
+    return arrays
+
+
+def _decode(data):
+    """
+    The inverse of _encode.
+    """
+
+    kind = str(data["__kind__"])
+
+    if kind == "dict":
+        return {
+            name[2:]: data[name] for name in data.files
+            if name.startswith("k:")}
+
+    if kind == "tuple":
+        items = sorted(
+            (int(name[2:]), name) for name in data.files
+            if name.startswith("i:"))
+        return tuple(data[name] for _, name in items)
+
+    return data["value"]
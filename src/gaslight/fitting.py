@@ -0,0 +1,500 @@
+"""
+Fitting observed line fluxes (or line ratios) with every model of a grid.
+
+The models are streamed in chunks (see Grid.iter_models) and, for each chunk,
+the chi-squared of every model is computed at once with matrix products over
+the lines, so the full grid is never held in memory as Python objects or
+cubes. Failed models are excluded (their chi-squared is infinite).
+
+When fitting fluxes each model can be given a free normalisation (e.g. the
+unknown mass or distance of the source). The normalisation minimising the
+chi-squared has the closed form
+
+    A = sum(w f L) / sum(w L^2),    w = 1 / sigma^2
+
+where f are the observed fluxes and L the model luminosities, giving
+
+    chi2 = sum(w f^2) - sum(w f L)^2 / sum(w L^2).
+
+Line ratios are computed for every model from the luminosities of the lines
+(or blends) in each ratio and need no normalisation.
+
+The posterior of every model is proportional to exp(-chi2 / 2) (i.e. a
+uniform prior over the grid points, and the best normalisation of each
+model). The marginal posterior of each axis is accumulated chunk by chunk,
+rescaled whenever a better fit is found, so the fit also scales to grids too
+large to hold the chi-squared of every model.
+
+Example:
+    result = fit_fluxes(
+        grid,
+        ["H 1 4861.32A", "O 3 5006.84A", "N 2 6583.45A"],
+        fluxes,
+        errors)
+    print(result.best_fit_parameters)
+    metallicity_posterior = result.marginals["metallicity"]
+"""
+
+import numpy as np
+
+import gaslight.exceptions as exceptions
+from gaslight.lines import get_blend_line_ids
+from gaslight.utils import strip_units
+
+
+class FitResult:
+    """
+    The result of fitting a grid.
+
+    Attributes:
+        axes (list, str)
+            The axes of the grid.
+        axes_values (dict)
+            The values of each axis.
+        best_fit_index (tuple)
+            The indices of the best fitting model.
+        best_fit_parameters (dict)
+            The parameters (axis values) of the best fitting model.
+        best_fit_chi2 (float)
+            The chi-squared of the best fitting model.
+        best_fit_normalisation (float)
+            The normalisation of the best fitting model (1 if the fit has no
+            free normalisation).
+        marginals (dict)
+            The marginal posterior of each axis, normalised to sum to 1,
+            keyed by axis.
+        chi2 (np.ndarray)
+            The chi-squared of every model, with the shape of the grid, if
+            requested (otherwise None). Failed models are infinite.
+        normalisation (np.ndarray)
+            The best normalisation of every model, with the shape of the
+            grid, if requested and the fit has a free normalisation
+            (otherwise None).
+        number_of_observations (int)
+            The number of observed values (lines or ratios) fitted.
+        number_of_models (int)
+            The number of (non-failed) models fitted.
+    """
+
+    def __init__(
+            self,
+            axes,
+            axes_values,
+            best_fit_index,
+            best_fit_chi2,
+            best_fit_normalisation,
+            marginals,
+            chi2=None,
+            normalisation=None,
+            number_of_observations=0,
+            number_of_models=0,
+            ):
+        """
+        Initialise the FitResult.
+
+        Args:
+            axes (list, str)
+                The axes of the grid.
+            axes_values (dict)
+                The values of each axis.
+            best_fit_index (tuple)
+                The indices of the best fitting model.
+            best_fit_chi2 (float)
+                The chi-squared of the best fitting model.
+            best_fit_normalisation (float)
+                The normalisation of the best fitting model.
+            marginals (dict)
+                The marginal posterior of each axis.
+            chi2 (np.ndarray)
+                The chi-squared of every model.
+            normalisation (np.ndarray)
+                The best normalisation of every model.
+            number_of_observations (int)
+                The number of observed values fitted.
+            number_of_models (int)
+                The number of models fitted.
+        """
+
+        self.axes = list(axes)
+        self.axes_values = axes_values
+        self.best_fit_index = best_fit_index
+        self.best_fit_chi2 = best_fit_chi2
+        self.best_fit_normalisation = best_fit_normalisation
+        self.marginals = marginals
+        self.chi2 = chi2
+        self.normalisation = normalisation
+        self.number_of_observations = number_of_observations
+        self.number_of_models = number_of_models
+
+        self.best_fit_parameters = {
+            axis: axes_values[axis][index]
+            for axis, index in zip(self.axes, best_fit_index)}
+
+    def __str__(self):
+        """
+        Function to print a summary of the fit.
+        """
+
+        pstr = ""
+        pstr += "-" * 30 + "\n"
+        pstr += "FIT RESULT\n"
+        pstr += f"observations: {self.number_of_observations}\n"
+        pstr += f"models: {self.number_of_models}\n"
+        pstr += f"best fit chi2: {self.best_fit_chi2:.4g}\n"
+        pstr += f"best fit normalisation: {self.best_fit_normalisation:.4g}\n"
+        for axis, value in self.best_fit_parameters.items():
+            pstr += f"{axis}: {value}\n"
+        pstr += "-" * 30 + "\n"
+
+        return pstr
+
+    def get_marginal_mean(self, axis, log10=False):
+        """
+        Return the mean of the marginal posterior of an axis.
+
+        Args:
+            axis (str)
+                The axis.
+            log10 (bool)
+                If True, return the mean of log10 of the axis values.
+
+        Returns:
+            float
+                The posterior mean.
+        """
+
+        values = strip_units(self.axes_values[axis])
+        if log10:
+            values = np.log10(values)
+
+        return float(np.sum(self.marginals[axis] * values))
+
+
+def fit_fluxes(
+        grid,
+        line_ids,
+        fluxes,
+        errors,
+        normalise=True,
+        chunk_size=2**16,
+        return_chi2=False,
+        ):
+    """
+    Fit observed line fluxes with every model of a grid.
+
+    Args:
+        grid (gaslight.grid.Grid)
+            The grid to fit.
+        line_ids (list)
+            The ids (or handles) of the observed lines. A blend of lines may
+            be given as a comma separated string of line ids (e.g.
+            "O 3 4958.91A, O 3 5006.84A"), whose luminosities are summed.
+        fluxes (array-like)
+            The observed flux of each line. Lines with a NaN flux are
+            ignored.
+        errors (array-like)
+            The (1 sigma) error on each flux.
+        normalise (bool)
+            If True fit each model with a free normalisation, in which case
+            the fluxes can be in any units. Otherwise the fluxes are
+            compared directly with the model luminosities and should be
+            luminosities (in erg/s if no units are given).
+        chunk_size (int)
+            The number of models evaluated at once (see Grid.iter_models).
+        return_chi2 (bool)
+            If True, keep the chi-squared (and normalisation) of every
+            model. This requires memory proportional to the size of the
+            grid.
+
+    Returns:
+        FitResult
+            The result of the fit.
+    """
+
+    # Convert luminosities to the units of the grid
+    if not normalise:
+        fluxes = _to_units(fluxes, "erg/s")
+        errors = _to_units(errors, "erg/s")
+
+    fluxes, weights = _get_observations(fluxes, errors, len(line_ids))
+
+    blends = [get_blend_line_ids(line_id) for line_id in line_ids]
+    required, matrices = _get_blend_matrices(grid, blends)
+    (components,) = matrices
+
+    # The constant part of the chi-squared
+    sum_wff = np.sum(weights * fluxes**2)
+
+    def statistic(luminosity):
+
+        # The (summed) luminosity of each observed line
+        luminosity = luminosity @ components
+
+        if not normalise:
+            return np.sum(
+                weights * (fluxes - luminosity)**2, axis=1), None
+
+        sum_wfl = luminosity @ (weights * fluxes)
+        sum_wll = luminosity**2 @ weights
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            normalisation = np.where(sum_wll > 0, sum_wfl / sum_wll, 0.0)
+
+        # Clip the (small) negative values left by round-off
+        return np.maximum(
+            sum_wff - normalisation * sum_wfl, 0.0), normalisation
+
+    return _fit(
+        grid,
+        required,
+        statistic,
+        int(np.count_nonzero(weights)),
+        chunk_size,
+        return_chi2,
+        normalise)
+
+
+def fit_ratios(
+        grid,
+        ratio_ids,
+        ratios,
+        errors,
+        log10=False,
+        chunk_size=2**16,
+        return_chi2=False,
+        ):
+    """
+    Fit observed line ratios with every model of a grid.
+
+    Args:
+        grid (gaslight.grid.Grid)
+            The grid to fit.
+        ratio_ids (list)
+            The ratios, each either the name of a ratio defined in
+            synthesizer.line_ratios (e.g. "R23") or a [numerator,
+            denominator] pair (see Grid.get_ratio).
+        ratios (array-like)
+            The observed value of each ratio. Ratios with a NaN value are
+            ignored.
+        errors (array-like)
+            The (1 sigma) error on each ratio.
+        log10 (bool)
+            If True, the ratios and their errors are given (and compared) in
+            log10, i.e. dex.
+        chunk_size (int)
+            The number of models evaluated at once (see Grid.iter_models).
+        return_chi2 (bool)
+            If True, keep the chi-squared of every model. This requires
+            memory proportional to the size of the grid.
+
+    Returns:
+        FitResult
+            The result of the fit.
+    """
+
+    ratios, weights = _get_observations(ratios, errors, len(ratio_ids))
+
+    definitions = [grid.get_ratio_definition(ratio_id)
+                   for ratio_id in ratio_ids]
+    required, (numerators, denominators) = _get_blend_matrices(
+        grid,
+        [numerator for numerator, _ in definitions],
+        [denominator for _, denominator in definitions])
+
+    # Only include the ratios which were observed in the sums
+    observed = weights > 0
+
+    def statistic(luminosity):
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            model = (luminosity @ numerators) / (luminosity @ denominators)
+            if log10:
+                model = np.log10(model)
+
+        residuals = np.where(observed, ratios - model, 0.0)
+
+        return np.sum(weights * residuals**2, axis=1), None
+
+    return _fit(
+        grid,
+        required,
+        statistic,
+        int(np.count_nonzero(observed)),
+        chunk_size,
+        return_chi2,
+        False)
+
+
+def _fit(
+        grid,
+        line_ids,
+        statistic,
+        number_of_observations,
+        chunk_size,
+        return_chi2,
+        normalise,
+        ):
+    """
+    Evaluate a fit statistic for every model of a grid, chunk by chunk,
+    keeping track of the best fit and accumulating the marginal posterior
+    of each axis.
+
+    Args:
+        grid (gaslight.grid.Grid)
+            The grid to fit.
+        line_ids (list, str)
+            The lines needed to evaluate the statistic.
+        statistic (function)
+            A function taking the (n_models, n_lines) luminosities of a
+            chunk and returning the chi-squared of each model and, if the
+            fit has a free normalisation, the best normalisation of each
+            model (otherwise None).
+        number_of_observations (int)
+            The number of observed values.
+        chunk_size (int)
+            The number of models evaluated at once.
+        return_chi2 (bool)
+            If True, keep the chi-squared of every model.
+        normalise (bool)
+            Whether the fit has a free normalisation.
+
+    Returns:
+        FitResult
+            The result of the fit.
+    """
+
+    if number_of_observations == 0:
+        raise exceptions.InconsistentParameter(
+            "At least one observed value (with a finite error) is needed.")
+
+    shape = tuple(grid.grid_shape)
+
+    chi2_all = np.full(shape, np.inf) if return_chi2 else None
+    normalisation_all = (
+        np.zeros(shape) if return_chi2 and normalise else None)
+
+    # The unnormalised marginals are relative to exp(-chi2_min / 2), so are
+    # rescaled whenever the minimum improves
+    marginals = [np.zeros(n) for n in shape]
+    chi2_min = np.inf
+    best_fit_index = None
+    best_fit_normalisation = 1.0
+    number_of_models = 0
+
+    for chunk in grid.iter_models(
+            chunk_size=chunk_size, line_ids=line_ids, continuum=False):
+
+        chi2, normalisation = statistic(chunk["luminosity"])
+
+        # Exclude failed models (and any model which can not be evaluated)
+        chi2 = np.where(
+            chunk["failed_models"] | ~np.isfinite(chi2), np.inf, chi2)
+
+        indices = chunk["indices"]
+        if return_chi2:
+            chi2_all.flat[indices] = chi2
+            if normalise:
+                normalisation_all.flat[indices] = normalisation
+
+        good = np.isfinite(chi2)
+        number_of_models += int(np.count_nonzero(good))
+        if not good.any():
+            continue
+
+        best = int(np.argmin(chi2))
+        if chi2[best] < chi2_min:
+            if np.isfinite(chi2_min):
+                for marginal in marginals:
+                    marginal *= np.exp(-(chi2_min - chi2[best]) / 2)
+            chi2_min = chi2[best]
+            best_fit_index = tuple(
+                int(i) for i in np.unravel_index(indices[best], shape))
+            if normalise:
+                best_fit_normalisation = float(normalisation[best])
+
+        likelihood = np.exp(-(chi2[good] - chi2_min) / 2)
+        axis_indices = np.unravel_index(indices[good], shape)
+        for marginal, axis_index, n in zip(marginals, axis_indices, shape):
+            marginal += np.bincount(
+                axis_index, weights=likelihood, minlength=n)
+
+    if best_fit_index is None:
+        raise exceptions.InconsistentParameter(
+            "No model of the grid could be fitted.")
+
+    return FitResult(
+        grid.axes,
+        grid.axes_values,
+        best_fit_index,
+        float(chi2_min),
+        best_fit_normalisation,
+        {axis: marginal / marginal.sum()
+         for axis, marginal in zip(grid.axes, marginals)},
+        chi2=chi2_all,
+        normalisation=normalisation_all,
+        number_of_observations=number_of_observations,
+        number_of_models=number_of_models)
+
+
+def _get_observations(values, errors, n):
+    """
+    Convert observed values and their errors into arrays of values and
+    weights (1 / sigma^2), with a weight of zero for values which are not
+    observed (NaN).
+    """
+
+    values = np.atleast_1d(np.asarray(strip_units(values), dtype=float))
+    errors = np.atleast_1d(np.asarray(strip_units(errors), dtype=float))
+
+    if values.shape != (n,) or errors.shape != (n,):
+        raise exceptions.InconsistentParameter(
+            "There should be one value and one error per observation.")
+
+    observed = np.isfinite(values)
+    if np.any(errors[observed] <= 0) or not np.all(
+            np.isfinite(errors[observed])):
+        raise exceptions.InconsistentParameter(
+            "The errors should be positive and finite.")
+
+    weights = np.zeros(n)
+    weights[observed] = 1 / errors[observed]**2
+
+    return np.where(observed, values, 0.0), weights
+
+
+def _get_blend_matrices(grid, *blend_lists):
+    """
+    Convert lists of blends (each a list of line ids and/or handles) into
+    the lines needed and, for each list, an (n_lines, n_blends) matrix of
+    ones and zeros, so that luminosities @ matrix sums the luminosities of
+    the lines in each blend.
+    """
+
+    blend_lists = [
+        [grid.line_index.get_line_ids(blend) for blend in blends]
+        for blends in blend_lists]
+
+    required = sorted({
+        line_id
+        for blends in blend_lists for blend in blends for line_id in blend})
+    position = {line_id: i for i, line_id in enumerate(required)}
+
+    matrices = []
+    for blends in blend_lists:
+        matrix = np.zeros((len(required), len(blends)))
+        for j, blend in enumerate(blends):
+            for line_id in blend:
+                matrix[position[line_id], j] += 1
+        matrices.append(matrix)
+
+    return required, matrices
+
+
+def _to_units(values, units):
+    """
+    Convert values with units to the given units, leaving values without
+    units unchanged.
+    """
+    if hasattr(values, "units"):
+        return values.to(units)
+    return values
@@ -1,7 +1,37 @@
-import h5py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-from unyt import Angstrom, erg, s, Hz, unyt_array, unyt_quantity
+from unyt import Angstrom, c, unyt_array, unyt_quantity
 import gaslight.exceptions as exceptions
+from gaslight.cache import DiskCache, LRUCache
+from gaslight.io import (
+    GridFile,
+    QUANTITY_UNITS,
+    CONTINUUM_QUANTITIES,
+    compute_content_hash,
+    get_quantity_dtype,
+    read_cubes,
+)
+from gaslight.lazy import LazyQuantity, QuantityView
+from gaslight.lines import LineIndex, get_blend_line_ids
+from gaslight.shared import share_grid
+from gaslight.utils import (
+    compose_indices,
+    get_axis_slice,
+    get_hyperslabs,
+    get_nearest_indices,
+    strip_units,
+)
+from gaslight.interpolation import (
+    GridInterpolator,
+    LineInterpolator,
+    METHODS,
+    fill_table,
+    get_fill_passes,
+    log10_table,
+)
 # from gaslight.line import (
 #     Line,
 #     LineCollection,
@@ -12,6 +42,7 @@ from synthesizer.line import (
     Line,
     LineCollection,
 )
+from synthesizer import line_ratios
 from scipy.interpolate import RegularGridInterpolator
 
 
@@ -37,6 +68,59 @@ class Grid:
             A list of the names of the spectral grid axes.
         naxes
             The number of axes the spectral grid has.
+        lazy (bool)
+            Whether lines are read from the file on first access rather than
+            when the grid is opened.
+        selection (tuple)
+            The slices (one per axis) of the full grid in the file that have
+            been read, or None if the full grid was read.
+        line_cache (gaslight.cache.LRUCache)
+            The cache holding lazily loaded lines.
+        derived_cache (gaslight.cache.LRUCache)
+            The cache holding derived products, e.g. line ratio cubes,
+            keyed by their (resolved) definition.
+        disk_cache (gaslight.cache.DiskCache)
+            The persistent cache of derived products (ratios and
+            interpolation tables), shared between sessions, or None if
+            disabled. Entries are keyed by the grid's content hash, so they
+            survive copying the file but are not reused once its values
+            change.
+        interpolator_cache (gaslight.cache.LRUCache)
+            The cache holding interpolators, keyed by line, log10 axes,
+            method and engine. Its hits and misses are available from
+            interpolator_cache.stats().
+        precision (str)
+            The precision the per-line quantities are held at in memory
+            (see gaslight.io.PRECISIONS), or None to keep the precision of
+            the file. float32 is limited to values below ~3.4e38.
+        line_index (gaslight.lines.LineIndex)
+            The index of the lines, mapping between line ids and integer
+            handles and supporting wavelength and element queries. Every
+            method taking line ids also accepts handles.
+        content_hash (str)
+            A hash of the grid's contents, from the file's metadata index,
+            or None if the file has no index (see gaslight.io.write_index).
+        read_timings (dict)
+            The time (in seconds) spent reading the metadata (axes, lines,
+            wavelengths), the luminosities, the continua and the failed
+            models when the grid was opened.
+        view_of (Grid)
+            If this grid is a view (see isel and select), the grid it is a
+            view of, otherwise None.
+        view_indices (tuple)
+            If this grid is a view, the index (an integer or slice per axis
+            of view_of) defining it, otherwise None.
+        fixed_axes (dict)
+            The value of each axis removed by indexing a single point (see
+            isel and select), keyed by axis.
+        file_indices (tuple)
+            If this grid was attached to a view published in shared memory,
+            the index (an integer or slice per axis of the file) of the view
+            in the grid file, otherwise None.
+        shared_memory_handle (gaslight.shared.SharedGridHandle)
+            If the grid is attached to shared memory (see
+            from_shared_memory) the handle of the shared blocks, otherwise
+            None.
         <grid_axis> (array-like, float)
             A Grid will always contain 1D arrays corresponding to the axes
             of the spectral grid. These are read dynamically from the HDF5
@@ -49,6 +133,16 @@ class Grid:
         grid_name,
         grid_dir=None,
         lines=None,
+        lazy=False,
+        max_cache_bytes=None,
+        selection=None,
+        max_interpolators=None,
+        read_workers=None,
+        read_backend="thread",
+        precision=None,
+        max_derived_bytes=None,
+        cache_dir=None,
+        max_disk_cache_bytes=None,
     ):
         """
         Initailise the grid object, open the grid file and extracting the
@@ -62,9 +156,63 @@ class Grid:
                 The file path to the directory containing the grid file.
             lines (bool)
                 Which lines should we read
+            lazy (bool)
+                If True, line luminosities and continua are only read from
+                the file the first time they are accessed. The file handle is
+                kept open until close() is called.
+            max_cache_bytes (int)
+                The maximum memory (in bytes) used to hold lazily loaded
+                lines. When exceeded the least recently used lines are
+                dropped (and re-read if needed again). None means unlimited.
+            selection (dict)
+                A dictionary selecting a sub-volume of the grid to read. Each
+                key is an axis and each value is either a (low, high) tuple
+                of axis values (an inclusive range, either end can be None),
+                a slice of axis indices or a single value (the nearest grid
+                point). Only the matching hyperslab of each dataset is read
+                and the axes, grid shape and failed models describe the
+                sub-volume. Axes not included are read in full.
+            max_interpolators (int)
+                The maximum number of interpolators (and interpolation
+                tables) to cache. When exceeded the least recently used are
+                dropped. None means unlimited.
+            read_workers (int)
+                If greater than 1, read the lines and quantities in parallel
+                with this many workers (see gaslight.io.read_cubes). Ignored
+                by a lazy grid.
+            read_backend (str)
+                The workers used for parallel reads, either "thread" or
+                "process". Since h5py serialises access to the HDF5 library
+                only processes read concurrently.
+            precision (str)
+                The precision to hold the line luminosities and continua at
+                in memory: "float64", "float32" or "mixed" (float32
+                luminosities and float64 continua). None keeps the precision
+                of the file. Derived quantities (e.g. from get_line_arrays
+                and interpolation) are always computed in float64. Note that
+                float32 can only hold values up to ~3.4e38, so "float32" and
+                "mixed" raise an exception for grids with brighter lines
+                (luminosities are held as linear values in memory, even if
+                the file stores them as log10).
+            max_derived_bytes (int)
+                The maximum memory (in bytes) used to cache derived products
+                such as line ratio cubes. None means unlimited.
+            cache_dir (str or bool)
+                A directory in which to persist derived products (see
+                gaslight.cache.DiskCache), e.g. interpolation tables and
+                cubic spline coefficients, so later sessions do not need to
+                recompute them. True uses a directory next to the grid file
+                (<grid_dir>/<grid_name>.cache). None (or False) disables the
+                persistent cache.
+            max_disk_cache_bytes (int)
+                The maximum size (in bytes) of the persistent cache. When
+                exceeded the least recently used entries are deleted. None
+                means unlimited.
 
         """
 
+        start_time = time.perf_counter()
+
         # The grid name
         self.grid_name = grid_name
 
@@ -76,80 +224,852 @@ class Grid:
             f"{self.grid_dir}/{self.grid_name}.hdf5"
         )
 
+        # Are we loading lines lazily?
+        self.lazy = lazy
+
+        # The file wrapper used for any lazy reads
+        self.grid_file = GridFile(self.grid_filename)
+
+        # The cache holding lazily loaded lines
+        self.line_cache = LRUCache(max_bytes=max_cache_bytes)
+
+        # Parallel read options
+        self.read_workers = read_workers
+        self.read_backend = read_backend
+
+        # The in-memory precision
+        self.precision = precision
+
         # Get basic info of the grid
-        with h5py.File(self.grid_filename, "r") as hf:
+        hf = self.grid_file.hf
+
+        self.parameters = {k: v for k, v in hf.attrs.items()}
+
+        # The on-disk layout (see gaslight.io)
+        self.layout_version = self.grid_file.layout_version
 
-            self.parameters = {k: v for k, v in hf.attrs.items()}
+        # Get list of axes
+        self.axes = list(hf.attrs["axes"])
 
-            # Get list of axes
-            self.axes = list(hf.attrs["axes"])
+        # Put the values of each axis in a dictionary
+        self.axes_values = {
+            axis: hf["axes"][axis][:] for axis in self.axes
+        }
 
-            # Put the values of each axis in a dictionary
+        # Convert any selection into a tuple of slices (one per axis) and
+        # restrict the axes to the selected sub-volume.
+        self.selection = self._get_selection(selection)
+        if self.selection is not None:
             self.axes_values = {
-                axis: hf["axes"][axis][:] for axis in self.axes
+                axis: self.axes_values[axis][axis_slice]
+                for axis, axis_slice in zip(self.axes, self.selection)
             }
 
-            # Set the values of each axis as an attribute
-            # e.g. self.log10age == self.axes_values['log10age']
-            for axis in self.axes:
-                setattr(self, axis, self.axes_values[axis])
-
-            # If no lines are provided read them all
-            if not lines:
-                lines = list(hf['luminosity'].keys())
-            self.lines = lines
-            self.line_ids = self.lines
-            self.number_of_lines = len(self.line_ids)
-
-            # Get basic details of the grids.
-            # number of axes
-            self.naxes = len(self.axes)
-            self.number_of_axes = self.naxes
-
-            # grid shape
-            self.grid_shape = hf["luminosity"][lines[0]][:].shape
-            self.nmodels = np.prod(self.grid_shape)
-
-            # get wavelengths from the HDF5 file
-            self.wavelength = {line_id: hf[f'wavelength/{line_id}']
-                               * Angstrom for line_id in self.line_ids}
-            
-            # Get line luminosities.
-            self.luminosity = {}
-            for line_id in self.line_ids:
-                self.luminosity[line_id] = hf["luminosity"][line_id][:] * erg / s
-
-            # Get continuum luminosities. These are necessary for calculating
-            # equivalent widths.
-            self.nebular_continuum = False
-            self.incident_continuum = False
-            self.transmitted_continuum = False
-            self.equivalent_widths = False
-            if "nebular_continuum" in hf.keys():
-                self.nebular_continuum = {}
-                self.transmitted_continuum = {}
-                self.incident_continuum = {}
-                for line_id in self.line_ids:
-                    self.nebular_continuum[line_id] = (
-                        hf["nebular_continuum"][line_id][:] * erg / s / Hz)
-                    self.incident_continuum[line_id] = (
-                        hf["incident_continuum"][line_id][:] * erg / s / Hz)
-                    self.transmitted_continuum[line_id] = (
-                        hf["transmitted_continuum"][line_id][:] * erg / s / Hz)
+        # Set the values of each axis as an attribute
+        # e.g. self.log10age == self.axes_values['log10age']
+        for axis in self.axes:
+            setattr(self, axis, self.axes_values[axis])
+
+        # If no lines are provided read them all
+        if not lines:
+            lines = list(self.grid_file.line_ids)
+        self.lines = lines
+        self.line_ids = self.lines
+        self.number_of_lines = len(self.line_ids)
+
+        # Get basic details of the grids.
+        # number of axes
+        self.naxes = len(self.axes)
+        self.number_of_axes = self.naxes
+
+        # grid shape
+        self.grid_shape = tuple(
+            len(self.axes_values[axis]) for axis in self.axes)
+        self.nmodels = np.prod(self.grid_shape)
+
+        # get wavelengths from the HDF5 file
+        self.wavelength = {
+            line_id: wavelength * Angstrom
+            for line_id, wavelength
+            in self.grid_file.read_wavelengths(self.line_ids).items()}
+
+        # the index of the lines, used to look up lines by integer handle,
+        # wavelength or element
+        self.line_index = LineIndex(self.line_ids, self.wavelength)
+
+        # Which continuum quantities are available
+        has_continuum = self.grid_file.has_quantity("nebular_continuum")
+
+        # The hash identifying the grid's contents (None if the file has no
+        # index, see gaslight.io)
+        self.content_hash = self.grid_file.content_hash
+
+        self.read_timings = {
+            "metadata": time.perf_counter() - start_time}
+
+        # Get line luminosities.
+        start_time = time.perf_counter()
+        self.luminosity = self._read_quantities(["luminosity"])["luminosity"]
+        self.read_timings["luminosity"] = time.perf_counter() - start_time
+
+        # Get continuum luminosities. These are necessary for calculating
+        # equivalent widths.
+        start_time = time.perf_counter()
+        self.nebular_continuum = False
+        self.incident_continuum = False
+        self.transmitted_continuum = False
+        self.equivalent_widths = False
+        if has_continuum:
+            for quantity, values in self._read_quantities(
+                    CONTINUUM_QUANTITIES).items():
+                setattr(self, quantity, values)
+        self.read_timings["continuum"] = time.perf_counter() - start_time
 
         # It is possible that some models may have failed. We can identify
-        # these if the value of a H\alpha luminosity is False.
-        self.failed_models = (self.luminosity['H 1 6562.80A'].value == False)
-
-        # dictionary holding interpolators
-        self.interpolator = {}
-
-        # list of parameters where we interpolate in log space
+        # these if the value of a H\alpha luminosity is False. This is read
+        # from the file's index (or directly) so a lazy grid does not need
+        # to hold it.
+        start_time = time.perf_counter()
+        self.failed_models = self.grid_file.read_failed_models(
+            self.selection)
+        self.read_timings["failed_models"] = time.perf_counter() - start_time
+
+        # Only a lazy grid needs to keep the file open
+        if not self.lazy:
+            self.grid_file.close()
+
+        # cache holding interpolators (and the tables they evaluate)
+        self.interpolator_cache = LRUCache(max_items=max_interpolators)
+
+        # cache holding derived products (e.g. line ratios)
+        self.derived_cache = LRUCache(max_bytes=max_derived_bytes)
+
+        # the persistent cache of derived products and the identity of the
+        # grid (as read) that its entries are keyed by
+        self.disk_cache = None
+        if cache_dir is True:
+            cache_dir = f"{self.grid_dir}/{self.grid_name}.cache"
+        if cache_dir:
+            self.disk_cache = DiskCache(
+                cache_dir, max_bytes=max_disk_cache_bytes)
+        self._cache_identity = None
+        if self.disk_cache is not None:
+            self._cache_identity = self._get_cache_identity()
+
+        # the defaults used by get_interpolated_line (see
+        # setup_interpolator): the list of parameters where we interpolate
+        # in log space, the interpolation method and engine, whether failed
+        # models are filled and whether log10 luminosities are interpolated.
         self.interpolator_log10 = []
+        self.interpolator_method = "linear"
+        self.interpolator_engine = "auto"
+        self.interpolator_fill_failed = False
+        self.interpolator_log10_luminosity = False
 
         # create flattened versions of the axes
         self.flatten_axes()
 
+        # the grid's arrays are private to this process
+        self.shared_memory_handle = None
+
+        # this is not a view of another grid
+        self.view_of = None
+        self.view_indices = None
+        self.fixed_axes = {}
+        self.file_indices = None
+
+    def _read_quantity(self, quantity):
+        """
+        Internally called method for reading a per-line quantity. For a lazy
+        grid this creates a mapping, sharing the Grid's line cache, which
+        only reads lines when they are accessed.
+
+        Args:
+            quantity (str)
+                The name of the quantity, e.g. "luminosity".
+
+        Returns:
+            dict or gaslight.lazy.LazyQuantity
+                The arrays (with units) for each line.
+        """
+
+        units = QUANTITY_UNITS[quantity]
+
+        if self.lazy:
+            return LazyQuantity(
+                self.grid_file,
+                quantity,
+                self.line_ids,
+                units,
+                self.line_cache,
+                selection=self.selection,
+                dtype=self._get_dtype(quantity),
+            )
+
+        return {
+            line_id: unyt_array(values, units)
+            for line_id, values
+            in self.grid_file.read_lines(
+                quantity,
+                self.line_ids,
+                self.selection,
+                self._get_dtype(quantity)).items()}
+
+    def _get_dtype(self, quantity):
+        """
+        Internally called method returning the data type a quantity is held
+        at in memory, or None to keep the precision of the file.
+        """
+        if self.precision is None:
+            return None
+        return get_quantity_dtype(self.precision, quantity)
+
+    def _read_quantities(self, quantities):
+        """
+        Internally called method for reading several per-line quantities,
+        in parallel if read_workers is greater than 1 (and the grid is not
+        lazy).
+
+        Args:
+            quantities (list, str)
+                The names of the quantities.
+
+        Returns:
+            dict
+                The values of each quantity (see _read_quantity).
+        """
+
+        if self.lazy or not self.read_workers or self.read_workers < 2:
+            return {
+                quantity: self._read_quantity(quantity)
+                for quantity in quantities}
+
+        # Worker processes reopen the file by path, so do not hold it open
+        # while they read it (it is reopened on the next access)
+        if self.read_backend == "process":
+            self.grid_file.close()
+
+        cubes = read_cubes(
+            self.grid_filename,
+            quantities,
+            self.line_ids,
+            selection=self.selection,
+            workers=self.read_workers,
+            backend=self.read_backend,
+            dtypes={
+                quantity: self._get_dtype(quantity)
+                for quantity in quantities},
+        )
+
+        return {
+            quantity: {
+                line_id: unyt_array(cube[i], QUANTITY_UNITS[quantity])
+                for i, line_id in enumerate(self.line_ids)}
+            for quantity, cube in cubes.items()}
+
+    def _get_selection(self, selection):
+        """
+        Internally called method for converting a dictionary of per-axis
+        selections (see __init__) into a tuple of slices, one per axis.
+
+        Args:
+            selection (dict)
+                The per-axis selections.
+
+        Returns:
+            tuple or None
+                A tuple of slices or None if there is no selection.
+        """
+
+        if not selection:
+            return None
+
+        for axis in selection:
+            if axis not in self.axes:
+                raise exceptions.InconsistentParameter(
+                    f"{axis} is not an axis of the grid.")
+
+        return tuple(
+            get_axis_slice(self.axes_values[axis], selection[axis])
+            if axis in selection else slice(0, len(self.axes_values[axis]), 1)
+            for axis in self.axes)
+
+    def _get_cache_identity(self):
+        """
+        Internally called method returning the key identifying this grid's
+        contents in the persistent cache: the content hash of the file (see
+        _get_content_hash), the selection and the precision. Anything which
+        changes the arrays derived products are computed from changes the
+        identity, while copying or touching the file does not.
+        """
+
+        selection = None
+        if self.selection is not None:
+            selection = tuple(
+                (s.start, s.stop, s.step) for s in self.selection)
+
+        return (self._get_content_hash(), selection, self.precision)
+
+    def _get_content_hash(self):
+        """
+        Internally called method returning the content hash of the grid
+        file, checked against the file as it is now.
+
+        The hash stored in the file's index is only recomputed by
+        write_index, so it is stale if the file has been edited in place
+        since. The size and modification time of the file the hash was last
+        checked against are therefore recorded in the persistent cache, and
+        if the file no longer matches them (or there is no record) the hash
+        is recomputed from the file, which is a single pass over its values.
+        Files without an index are hashed the same way.
+
+        Returns:
+            str
+                The content hash.
+        """
+
+        stat = os.stat(self.grid_filename)
+        state = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        record_key = ("content_hash", os.path.abspath(self.grid_filename))
+
+        record = self.disk_cache.get(record_key)
+        if record is not None and np.array_equal(record["state"], state):
+            return str(record["content_hash"])
+
+        grid_file = GridFile(self.grid_filename)
+        try:
+            content_hash = compute_content_hash(grid_file)
+        finally:
+            grid_file.close()
+
+        self.disk_cache.put(
+            record_key,
+            {"state": state, "content_hash": np.array(content_hash)})
+
+        return content_hash
+
+    def _get_persistent(self, key, factory):
+        """
+        Internally called method returning a derived product from the
+        persistent cache, computing (and storing) it with factory() if it is
+        not present or the persistent cache is disabled.
+
+        Args:
+            key (tuple)
+                The parameters of the computation. The grid's identity is
+                added to this.
+            factory (callable)
+                A function taking no arguments that computes the product.
+
+        Returns:
+            object
+                The derived product.
+        """
+
+        if self.disk_cache is None:
+            return factory()
+
+        return self.disk_cache.get_or_create(
+            (self._cache_identity,) + tuple(key), factory)
+
+    def _get_derived(self, key, factory):
+        """
+        Internally called method returning a (read-only) derived array,
+        looking first in derived_cache, then in the persistent cache, and
+        only then computing it with factory().
+        """
+
+        def create():
+            value = self._get_persistent(key, factory)
+            value.flags.writeable = False
+            return value
+
+        return self.derived_cache.get_or_create(key, create)
+
+    def isel(self, indexers=None, **indexers_kwargs):
+        """
+        Return a view of the grid selected by axis index. Each axis can be
+        indexed with an integer, which removes the axis, or a slice. The
+        view shares the memory of this grid (its arrays are NumPy views,
+        nothing is copied) and supports every method of a Grid, with its
+        own reduced axes, grid_shape, failed_models and flattened axes.
+
+        Args:
+            indexers (dict)
+                The index of each axis to select, keyed by axis. Axes not
+                included are kept in full.
+            indexers_kwargs
+                The indices as keyword arguments, e.g.
+                grid.isel(log10age=0).
+
+        Returns:
+            Grid
+                The view.
+        """
+
+        indexers = dict(indexers or {}, **indexers_kwargs)
+
+        for axis in indexers:
+            if axis not in self.axes:
+                raise exceptions.InconsistentParameter(
+                    f"{axis} is not an axis of the grid.")
+
+        key = []
+        for axis in self.axes:
+            naxis = len(self.axes_values[axis])
+            index = indexers.get(axis, slice(None))
+            if isinstance(index, slice):
+                key.append(get_axis_slice(self.axes_values[axis], index))
+            elif isinstance(index, (int, np.integer)):
+                if not -naxis <= index < naxis:
+                    raise exceptions.InconsistentParameter(
+                        f"Index {index} is out of range for {axis}.")
+                key.append(int(index) % naxis)
+            else:
+                raise exceptions.InconsistentParameter(
+                    "Axes should be indexed with an integer or a slice.")
+
+        return self._create_view(tuple(key))
+
+    def select(self, selection=None, **selection_kwargs):
+        """
+        Return a view of the grid selected by axis value (see isel). Each
+        axis can be selected with a (low, high) tuple of values (an
+        inclusive range, either end can be None), which keeps the axis, a
+        single value, which selects the nearest grid point and removes the
+        axis, or a slice of indices.
+
+        Args:
+            selection (dict)
+                The selection of each axis, keyed by axis. Axes not included
+                are kept in full.
+            selection_kwargs
+                The selections as keyword arguments, e.g.
+                grid.select(log10age=(6., 7.), metallicity=0.01).
+
+        Returns:
+            Grid
+                The view.
+        """
+
+        selection = dict(selection or {}, **selection_kwargs)
+
+        indexers = {}
+        for axis, spec in selection.items():
+            if axis not in self.axes:
+                raise exceptions.InconsistentParameter(
+                    f"{axis} is not an axis of the grid.")
+            if isinstance(spec, (slice, tuple, list)):
+                indexers[axis] = get_axis_slice(self.axes_values[axis], spec)
+            else:
+                indexers[axis] = int(self.get_nearest_index(
+                    spec, self.axes_values[axis]))
+
+        return self.isel(indexers)
+
+    def _create_view(self, key):
+        """
+        Internally called method for creating a view of the grid.
+
+        Args:
+            key (tuple)
+                An integer or slice (with explicit start, stop and step) for
+                each axis.
+
+        Returns:
+            Grid
+                The view.
+        """
+
+        view = type(self).__new__(type(self))
+        view.__dict__.update(self.__dict__)
+
+        view.view_of = self
+        view.view_indices = key
+
+        # Axes indexed by an integer are removed
+        view.axes = []
+        view.axes_values = {}
+        view.fixed_axes = dict(self.fixed_axes)
+        for axis, index in zip(self.axes, key):
+            values = self.axes_values[axis][index]
+            if isinstance(index, slice):
+                view.axes.append(axis)
+                view.axes_values[axis] = values
+                setattr(view, axis, values)
+            else:
+                view.fixed_axes[axis] = values
+                view.__dict__.pop(axis, None)
+
+        view.naxes = len(view.axes)
+        view.number_of_axes = view.naxes
+        view.grid_shape = tuple(
+            len(view.axes_values[axis]) for axis in view.axes)
+        view.nmodels = np.prod(view.grid_shape)
+
+        # Basic indexing gives views rather than copies. Lazy quantities are
+        # only indexed when a line is accessed.
+        for quantity in ("luminosity",) + tuple(CONTINUUM_QUANTITIES):
+            values = getattr(self, quantity)
+            if values is False:
+                continue
+            if isinstance(values, dict):
+                values = {
+                    line_id: array[key] for line_id, array in values.items()}
+            else:
+                values = QuantityView(values, key)
+            setattr(view, quantity, values)
+
+        view.failed_models = np.asarray(self.failed_models)[key]
+
+        # Derived products differ from the parent's so the view has its own
+        # caches and identity in the persistent cache
+        view.interpolator_cache = LRUCache(
+            max_items=self.interpolator_cache.max_items)
+        view.derived_cache = LRUCache(max_bytes=self.derived_cache.max_bytes)
+        if self._cache_identity is not None:
+            view._cache_identity = self._cache_identity + (tuple(
+                (index.start, index.stop, index.step)
+                if isinstance(index, slice) else index
+                for index in key),)
+
+        # Pickling the view must not send the parent's shared memory handle
+        # (the view keeps the parent's segments mapped)
+        view.shared_memory_handle = None
+
+        view.flatten_axes()
+
+        return view
+
+    def iter_models(
+            self,
+            chunk_size=2**16,
+            line_ids=None,
+            continuum=True,
+            source=None,
+            prefetch=True,
+            ):
+        """
+        Iterate over the models of the grid in fixed size chunks (in the
+        order of the flattened grid), so the line luminosities and continua
+        of very large grids can be processed in bounded memory.
+
+        Each chunk is read as a few hyperslabs (see
+        gaslight.utils.get_hyperslabs), either straight from the HDF5 file
+        or from the arrays already in memory, so full cubes are never
+        created. Optionally the next chunk is read in a background thread
+        while the current one is being processed.
+
+        Args:
+            chunk_size (int)
+                The number of models per chunk. The last chunk may be
+                smaller.
+            line_ids (list)
+                The ids (or handles) of the lines. If None use all available
+                lines.
+            continuum (bool)
+                Whether to include the continua (if the grid has them).
+            source (str)
+                Either "file", to read from the HDF5 file, or "memory", to
+                read from the grid's arrays. If None, lazy grids read from
+                the file and others from memory.
+            prefetch (bool)
+                If True read the next chunk in a background thread.
+
+        Yields:
+            dict
+                The chunk, containing the flat "indices" of its models, the
+                "parameters" (a dictionary of the values of each axis), the
+                "failed_models" mask and the (n_models, n_lines) array of
+                each quantity (e.g. "luminosity"), without units.
+        """
+
+        line_ids = self._get_line_ids(line_ids)
+
+        if source is None:
+            source = "file" if self.lazy else "memory"
+        if source not in ("file", "memory"):
+            raise exceptions.UnrecognisedOption(
+                f"Unrecognised source {source}, expected file or memory.")
+
+        if chunk_size < 1:
+            raise exceptions.InconsistentParameter(
+                "chunk_size must be at least 1.")
+
+        quantities = ["luminosity"]
+        if continuum and self.nebular_continuum:
+            quantities += list(CONTINUUM_QUANTITIES)
+
+        # Reading from the file uses a private handle so the iterator can
+        # be used alongside (and from a different thread to) the grid
+        grid_file = GridFile(self.grid_filename) if source == "file" else None
+
+        bounds = list(range(0, int(self.nmodels), chunk_size)) + [
+            int(self.nmodels)]
+        chunks = list(zip(bounds[:-1], bounds[1:]))
+
+        def read_chunk(start, stop):
+            chunk = {
+                "indices": np.arange(start, stop),
+                "parameters": {
+                    axis: self.axes_values_flattened[axis][start:stop]
+                    for axis in self.axes},
+                "failed_models": self.failed_models_flattened[start:stop],
+            }
+            for quantity in quantities:
+                chunk[quantity] = self._read_models(
+                    grid_file, quantity, line_ids, start, stop)
+            return chunk
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        future = None
+
+        try:
+            if executor is None:
+                for start, stop in chunks:
+                    yield read_chunk(start, stop)
+                return
+
+            future = executor.submit(read_chunk, *chunks[0])
+            for i in range(len(chunks)):
+                chunk = future.result()
+                if i + 1 < len(chunks):
+                    future = executor.submit(read_chunk, *chunks[i + 1])
+                yield chunk
+
+        finally:
+            # If the loop was abandoned early at most one prefetch is
+            # pending, drop it (or wait for it if it has started) before
+            # the file is closed
+            if future is not None:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=True)
+            if grid_file is not None:
+                grid_file.close()
+
+    def _read_models(self, grid_file, quantity, line_ids, start, stop):
+        """
+        Internally called method reading a quantity for a contiguous range
+        of (flat) models, hyperslab by hyperslab.
+
+        Args:
+            grid_file (gaslight.io.GridFile)
+                The file to read from, or None to read from memory.
+            quantity (str)
+                The name of the quantity, e.g. "luminosity".
+            line_ids (list, str)
+                The ids of the lines.
+            start (int)
+                The first flat index.
+            stop (int)
+                One past the last flat index.
+
+        Returns:
+            np.ndarray
+                The (stop - start, n_lines) values.
+        """
+
+        values = None if grid_file is not None else getattr(self, quantity)
+
+        models = None
+        offset = 0
+        for hyperslab in get_hyperslabs(start, stop, self.grid_shape):
+
+            if grid_file is not None:
+                block = grid_file.read_cube(
+                    quantity,
+                    line_ids,
+                    self._get_file_selection(hyperslab),
+                    self._get_dtype(quantity))
+            else:
+                block = np.stack([
+                    values[line_id].ndview[hyperslab]
+                    for line_id in line_ids])
+
+            block = block.reshape(len(line_ids), -1)
+
+            if models is None:
+                models = np.empty(
+                    (stop - start, len(line_ids)), dtype=block.dtype)
+            models[offset:offset + block.shape[1]] = block.T
+            offset += block.shape[1]
+
+        return models
+
+    def _get_file_indices(self, key=None):
+        """
+        Internally called method converting an index of this grid (an
+        integer or slice per axis, by default the whole grid) into the
+        corresponding index of the grid in the file, accounting for views
+        (see isel), the selection the grid was read with and, for grids
+        attached to a shared view, the view's position in the file.
+        """
+
+        if key is None:
+            key = tuple(slice(0, n, 1) for n in self.grid_shape)
+
+        grid = self
+        key = tuple(key)
+        while grid.view_of is not None:
+            key = compose_indices(grid.view_indices, key)
+            grid = grid.view_of
+
+        if grid.file_indices is not None:
+            key = compose_indices(grid.file_indices, key)
+        elif grid.selection is not None:
+            key = compose_indices(grid.selection, key)
+
+        return key
+
+    def _get_file_selection(self, hyperslab):
+        """
+        Internally called method converting a hyperslab of this grid (a
+        tuple of slices with a step of 1) into the corresponding hyperslab
+        of the grid in the file (see _get_file_indices). Axes removed by a
+        view are selected with a slice of length 1.
+        """
+
+        return tuple(
+            index if isinstance(index, slice)
+            else slice(index, index + 1, 1)
+            for index in self._get_file_indices(hyperslab))
+
+    def to_shared_memory(self):
+        """
+        Copy the line luminosities, continua and failed models into POSIX
+        shared memory so they can be used by other processes without each
+        holding (and reading) its own copy. See gaslight.shared.
+
+        The returned handle can be pickled cheaply and passed to worker
+        processes, which attach to it with Grid.from_shared_memory (or
+        handle.attach()). The calling process owns the shared memory and
+        should call handle.unlink() once the workers are finished.
+
+        Returns:
+            gaslight.shared.SharedGridHandle
+                The handle of the shared grid.
+        """
+
+        # Already shared, nothing to do
+        if self.shared_memory_handle is not None:
+            return self.shared_memory_handle
+
+        quantities = ["luminosity"]
+        if self.nebular_continuum:
+            quantities += list(CONTINUUM_QUANTITIES)
+
+        # Everything except the shared arrays, anything cheaper to recreate
+        # than to pickle (the flattened axes) and process specific state
+        # (caches) is sent as metadata
+        excluded = set(quantities) | {
+            "failed_models",
+            "axes_values_flattened",
+            "failed_models_flattened",
+            "line_cache",
+            "interpolator_cache",
+            "derived_cache",
+            "shared_memory_handle",
+            "_shared_segments",
+            "view_of",
+            "view_indices",
+        }
+        metadata = {
+            key: value for key, value in self.__dict__.items()
+            if key not in excluded}
+        metadata["lazy"] = False
+
+        # The attached grid is not a view, so record where this grid lies
+        # in the file for reads from it (see iter_models)
+        if self.view_of is not None:
+            metadata["file_indices"] = self._get_file_indices()
+        metadata["max_interpolators"] = self.interpolator_cache.max_items
+        metadata["max_derived_bytes"] = self.derived_cache.max_bytes
+
+        # unyt quantities are expensive to pickle so send plain floats
+        metadata["wavelength"] = {
+            line_id: float(wavelength.to("Angstrom").value)
+            for line_id, wavelength in self.wavelength.items()}
+
+        return share_grid(self, quantities, metadata)
+
+    @classmethod
+    def from_shared_memory(cls, handle):
+        """
+        Create a Grid from a grid published with to_shared_memory. The
+        luminosities, continua and failed models are read-only views of the
+        shared memory, so no data is copied or read from the file.
+
+        Args:
+            handle (gaslight.shared.SharedGridHandle)
+                The handle returned by to_shared_memory.
+
+        Returns:
+            Grid
+                The attached grid.
+        """
+
+        grid = cls.__new__(cls)
+
+        metadata = dict(handle.metadata)
+        max_interpolators = metadata.pop("max_interpolators")
+        max_derived_bytes = metadata.pop("max_derived_bytes")
+        grid.__dict__.update(metadata)
+
+        # Keep the shared memory mapped for as long as the grid exists
+        arrays, grid._shared_segments = handle.attach_arrays()
+        grid.shared_memory_handle = handle
+
+        # The shared arrays are a grid in their own right
+        grid.view_of = None
+        grid.view_indices = None
+
+        grid.line_cache = LRUCache()
+        grid.interpolator_cache = LRUCache(max_items=max_interpolators)
+        grid.derived_cache = LRUCache(max_bytes=max_derived_bytes)
+
+        for quantity in ("luminosity",) + tuple(CONTINUUM_QUANTITIES):
+            if quantity not in arrays:
+                setattr(grid, quantity, False)
+                continue
+            units = QUANTITY_UNITS[quantity]
+            setattr(grid, quantity, {
+                line_id: unyt_array(arrays[quantity][i], units)
+                for i, line_id in enumerate(grid.line_ids)})
+
+        grid.failed_models = arrays["failed_models"]
+
+        grid.wavelength = {
+            line_id: wavelength * Angstrom
+            for line_id, wavelength in metadata["wavelength"].items()}
+
+        grid.flatten_axes()
+
+        return grid
+
+    def __reduce_ex__(self, protocol):
+        """
+        A grid attached to shared memory is pickled as its handle, so only
+        the names of the shared blocks are sent to other processes.
+        """
+        if self.shared_memory_handle is not None:
+            return (type(self).from_shared_memory,
+                    (self.shared_memory_handle,))
+        return super().__reduce_ex__(protocol)
+
+    def close(self):
+        """
+        Close the grid file if it has been left open by lazy reads. It will
+        be reopened if further lines are requested.
+        """
+        self.grid_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def __str__(self):
         """
         Function to print a basic summary of the Grid object.
@@ -184,7 +1104,8 @@ class Grid:
         # flatten the axes
         axes_values_tuple = (self.axes_values[axis] for axis in self.axes)
 
-        axes_values_mesh_tuple = np.meshgrid(*axes_values_tuple, indexing='ij')
+        axes_values_mesh_tuple = np.meshgrid(
+            *axes_values_tuple, indexing='ij')
 
         self.axes_values_flattened = {
             axis: axes_values_mesh_tuple[axis_index].flatten()
@@ -256,6 +1177,45 @@ class Grid:
                 ]
             )
 
+    def get_nearest_grid_points(self, parameters, log10=None, flat=False):
+        """
+        Function to identify the nearest grid point for many sets of
+        parameters at once.
+
+        Args:
+            parameters (dict or array-like)
+                Either a dictionary of parameter values (scalars or arrays)
+                keyed by axis, or an (N, n_axes) array with the parameters
+                in the same order as the axes. Values must be unitless, in
+                the units of the axes.
+            log10 (list)
+                List of parameters (axis) where the nearest grid point is
+                found in log10 space, e.g. ionisation_parameter.
+            flat (bool)
+                If True return indices into the flattened grid (e.g. for
+                use with axes_values_flattened) rather than per-axis indices.
+
+        Returns:
+            np.ndarray
+                The (N, n_axes) indices of the nearest grid points or, if
+                flat, the (N,) flattened indices.
+        """
+
+        if log10 is None:
+            log10 = []
+
+        parameters = self._get_parameter_array(parameters)
+
+        indices = np.stack([
+            get_nearest_indices(
+                self.axes_values[axis], parameters[:, i], log10=axis in log10)
+            for i, axis in enumerate(self.axes)], axis=1)
+
+        if flat:
+            return np.ravel_multi_index(tuple(indices.T), self.grid_shape)
+
+        return indices
+
     def get_line(
             self,
             line_id,
@@ -266,13 +1226,13 @@ class Grid:
         Returns the entire grid as a synthesizer.line.Line object.
 
         Args:
-            line_id (str)
-                The id of the line.
-            covering_fraction (float)
+            line_id (str or int)
+                The id (or integer handle) of the line.
+            covering_fraction (float or np.ndarray)
                 The covering fraction of ionising photons. This scales the line
                 luminosities, nebular and transmitted continuum. The incident
                 continuum is scaled by 1 - covering_fraction.
-            incident_escape_fraction (float)
+            incident_escape_fraction (float or np.ndarray)
                 The fraction of the incident (or transmitted) that escapes. 
                 This is relevant for modelling e.g. the narrow-line region 
                 when the central emitting source is obscured meaning we 
@@ -283,22 +1243,16 @@ class Grid:
                 A synthesizer Line object.
         """
 
-        if line_id not in self.line_ids:
-            raise exceptions.InconsistentParameter(
-                "Provided line_id is" "not in list of available lines."
-            )
-
-        wavelength = self.wavelength[line_id]
-        luminosity = covering_fraction * self.luminosity[line_id]
+        line_id = self.line_index.get_line_id(line_id)
 
-        # the transmitted continuum is unaffected by the escape fraction
-        continuum = (
-            covering_fraction * self.nebular_continuum[line_id] +
-            covering_fraction * incident_escape_fraction * self.transmitted_continuum[line_id] +
-            (1.0 - covering_fraction) * incident_escape_fraction * self.incident_continuum[line_id])
+        luminosity, continuum = self.get_line_arrays(
+            [line_id],
+            covering_fraction=covering_fraction,
+            incident_escape_fraction=incident_escape_fraction,
+            )
 
         # Create and return a synthesizer.lines.Line object
-        return Line(line_id, wavelength, luminosity, continuum)
+        return self._create_line(line_id, luminosity[0], continuum, 0)
 
     def get_line_collection(
             self,
@@ -310,9 +1264,9 @@ class Grid:
         Returns the entire grid as a synthesizer.line.LineCollection object.
 
         Args:
-            line_ids (tuple)
-                A tuple of line_ids.
-            covering_fraction (float)
+            line_ids (list)
+                A list of line_ids (or handles).
+            covering_fraction (float or np.ndarray)
                 The covering fraction of ionising photons. This scales the line
                 luminosities, nebular and transmitted continuum. The incident
                 continuum is scaled by 1 - covering_fraction.
@@ -327,22 +1281,19 @@ class Grid:
             line_collection (synthesizer.line.LineCollection)
                 A synthesizer LineCollection object.
         """
-        
-        if line_ids is None:
-            line_ids = self.lines
 
-        # Line dictionary
-        lines = {}
+        line_ids = self._get_line_ids(line_ids)
 
-        for line_id in line_ids:
-            line = self.get_line(
-                line_id,
-                covering_fraction=covering_fraction,
-                incident_escape_fraction=incident_escape_fraction,
-                )
+        luminosity, continuum = self.get_line_arrays(
+            line_ids,
+            covering_fraction=covering_fraction,
+            incident_escape_fraction=incident_escape_fraction,
+            )
 
-            # Add to dictionary
-            lines[line.id] = line
+        # Line dictionary
+        lines = {
+            line_id: self._create_line(line_id, luminosity[i], continuum, i)
+            for i, line_id in enumerate(line_ids)}
 
         # Create and return synthesiszer.lines.LineCollection
         return LineCollection(lines)
@@ -362,13 +1313,13 @@ class Grid:
             grid_point (tuple or dict)
                 A tuple of integers specifying the closest grid point or a
                 dictionary containing parameter values.
-            line_id (str)
-                The id of the line.
-            covering_fraction (float)
+            line_id (str or int)
+                The id (or integer handle) of the line.
+            covering_fraction (float or np.ndarray)
                 The covering fraction of ionising photons. This scales the line
                 luminosities, nebular and transmitted continuum. The incident
                 continuum is scaled by 1 - covering_fraction.
-            incident_escape_fraction (float)
+            incident_escape_fraction (float or np.ndarray)
                 The fraction of the incident (or transmitted) that escapes. 
                 This is relevant for modelling e.g. the narrow-line region 
                 when the central emitting source is obscured meaning we 
@@ -380,33 +1331,16 @@ class Grid:
                 A synthesizer Line object.
         """
 
-        if isinstance(grid_point_, dict):
-            grid_point = self.get_nearest_grid_point(grid_point_)
-        if isinstance(grid_point_, tuple):
-            grid_point = grid_point_
-
-        # Throw exception if the grid_point has a different shape from the grid
-        if len(grid_point) != self.naxes:
-            raise exceptions.InconsistentParameter(
-                "The grid_point tuple provided"
-                "as an argument should have same shape as the grid."
-            )
+        line_id = self.line_index.get_line_id(line_id)
 
-        if line_id not in self.lines:
-            raise exceptions.InconsistentParameter(
-                "Provided line_id is" "not in list of available lines."
+        luminosity, continuum = self.get_line_arrays(
+            [line_id],
+            covering_fraction=covering_fraction,
+            incident_escape_fraction=incident_escape_fraction,
+            grid_point=grid_point_,
             )
 
-        wavelength = self.wavelength[line_id]
-        luminosity = (covering_fraction *
-                      self.luminosity[line_id][grid_point])
-        # the transmitted continuum is unaffected by the escape fraction
-        continuum = (
-            covering_fraction * self.nebular_continuum[line_id][grid_point] +
-            covering_fraction * incident_escape_fraction * self.transmitted_continuum[line_id][grid_point] +
-            (1.0 - covering_fraction) * incident_escape_fraction * self.incident_continuum[line_id][grid_point])
-
-        return Line(line_id, wavelength, luminosity, continuum)
+        return self._create_line(line_id, luminosity[0], continuum, 0)
 
     def get_line_collection_at_grid_point(
             self,
@@ -421,14 +1355,14 @@ class Grid:
         Args:
             grid_point (tuple)
                 A tuple of integers specifying the closest grid point.
-            line_id (str)
-                The id of the lines to extract. If None use all available 
-                lines.
-            covering_fraction (float)
+            line_ids (list)
+                The ids (or handles) of the lines to extract. If None use all
+                available lines.
+            covering_fraction (float or np.ndarray)
                 The covering fraction of ionising photons. This scales the line
                 luminosities, nebular and transmitted continuum. The incident
                 continuum is scaled by 1 - covering_fraction.
-            incident_escape_fraction (float)
+            incident_escape_fraction (float or np.ndarray)
                 The fraction of the incident (or transmitted) that escapes. 
                 This is relevant for modelling e.g. the narrow-line region 
                 when the central emitting source is obscured meaning we 
@@ -439,59 +1373,666 @@ class Grid:
             line_collection (synthesizer.line.LineCollection)
                 A synthesizer LineCollection object.
         """
-        
-        # Check whether the grid point is a tuple or dictionary
-        if isinstance(grid_point_, dict):
-            grid_point = self.get_nearest_grid_point(grid_point_)
-        if isinstance(grid_point_, tuple):
-            grid_point = grid_point_
 
-        if line_ids is None:
-            line_ids = self.lines
-
-        # Line dictionary
-        lines = {}
+        line_ids = self._get_line_ids(line_ids)
 
-        for line_id in line_ids:
-            line = self.get_line_at_grid_point(
-                grid_point,
-                line_id,
-                covering_fraction=covering_fraction,
-                incident_escape_fraction=incident_escape_fraction,
-                )
+        luminosity, continuum = self.get_line_arrays(
+            line_ids,
+            covering_fraction=covering_fraction,
+            incident_escape_fraction=incident_escape_fraction,
+            grid_point=grid_point_,
+            )
 
-            # Add to dictionary
-            lines[line.id] = line
+        # Line dictionary
+        lines = {
+            line_id: self._create_line(line_id, luminosity[i], continuum, i)
+            for i, line_id in enumerate(line_ids)}
 
         # Create and return collection
         line_collection = LineCollection(lines)
 
         return line_collection
 
-    def setup_interpolator(self, line_ids=None, log10=None):
-
+    def get_line_arrays(
+            self,
+            line_ids=None,
+            covering_fraction=1.0,
+            incident_escape_fraction=1.0,
+            grid_point=None,
+            ):
         """
-        Setup the linear interpolator for the lines in line_ids.
+        Returns the luminosities and continua of several lines as plain
+        (unit-free) arrays, avoiding the overhead of creating synthesizer
+        Line objects. Luminosities are in erg/s and continua in erg/s/Hz.
 
-        Arguments:
-            line_ids (str, list)
-                Single line_id or list of line_ids.
-            log10 (list)
-                List of parameters (axis) to do interpolation in log10 space.
+        Args:
+            line_ids (list)
+                The ids (or handles) of the lines. If None use all available
+                lines.
+            covering_fraction (float or np.ndarray)
+                The covering fraction of ionising photons. This scales the line
+                luminosities, nebular and transmitted continuum. The incident
+                continuum is scaled by 1 - covering_fraction.
+            incident_escape_fraction (float or np.ndarray)
+                The fraction of the incident (or transmitted) that escapes.
+            grid_point (tuple, np.ndarray or dict)
+                If provided, a tuple of integers specifying a grid point, an
+                (N, n_axes) array of grid points or a dictionary of parameter
+                values (scalars or arrays, in which case the nearest grid
+                points are used). If None the entire grid is returned.
+
+        The covering and escape fractions can be arrays, which are broadcast
+        against grid_shape (or the N grid points). Leading dimensions are
+        allowed, e.g. a (n_scenarios, 1, 1, 1, 1) covering fraction gives
+        every scenario across a four dimensional grid in one evaluation.
+
+        Returns:
+            luminosity (np.ndarray)
+                The (n_lines, *shape) luminosities, where shape is the
+                broadcast shape of grid_shape (or (N,), or () for a single
+                grid point) and the fractions.
+            continuum (np.ndarray)
+                The continua with the same shape, or None if the grid does
+                not contain continua.
         """
 
-        # if no line_id is provided use all available lines
-        if not line_ids:
-            line_ids = self.lines
+        line_ids = self._get_line_ids(line_ids)
 
-        # if a single line_id is provided turn into a list for iterating
-        if isinstance(line_ids, str):
-            line_ids = [line_ids]
+        if grid_point is not None:
+            grid_point = self._get_grid_point(grid_point)
 
-        self.interpolator_log10 = log10
+        covering_fraction = np.asarray(covering_fraction, dtype=float)
+        incident_escape_fraction = np.asarray(
+            incident_escape_fraction, dtype=float)
 
-        # if a parameter is to be interpolated in log10 space
-        if log10:
+        luminosity = self._get_cube("luminosity", line_ids, grid_point)
+
+        # The shape of the output (excluding the lines axis) and the shape
+        # the cubes need to broadcast against it
+        base_shape = luminosity.shape[1:]
+        try:
+            shape = np.broadcast_shapes(
+                base_shape,
+                covering_fraction.shape,
+                incident_escape_fraction.shape)
+        except ValueError:
+            raise exceptions.InconsistentParameter(
+                "covering_fraction and incident_escape_fraction must "
+                f"broadcast against the grid shape {base_shape}."
+            )
+        cube_shape = (
+            (len(line_ids),)
+            + (1,) * (len(shape) - len(base_shape))
+            + base_shape)
+
+        if covering_fraction.ndim == 0:
+            luminosity *= covering_fraction
+        else:
+            luminosity = covering_fraction * luminosity.reshape(cube_shape)
+
+        if not self.nebular_continuum:
+            return luminosity, None
+
+        nebular = self._get_cube(
+            "nebular_continuum", line_ids, grid_point).reshape(cube_shape)
+        transmitted = self._get_cube(
+            "transmitted_continuum", line_ids, grid_point).reshape(cube_shape)
+        incident = self._get_cube(
+            "incident_continuum", line_ids, grid_point).reshape(cube_shape)
+
+        continuum = combine_continua(
+            nebular,
+            transmitted,
+            incident,
+            covering_fraction,
+            incident_escape_fraction)
+
+        return luminosity, continuum
+
+    def get_equivalent_widths(
+            self,
+            line_ids=None,
+            covering_fraction=1.0,
+            incident_escape_fraction=1.0,
+            grid_point=None,
+            mask_failed=True,
+            ):
+        """
+        Compute the equivalent widths of several lines at every point of the
+        grid (or at a set of grid points) in a single vectorised pass, i.e.
+        EW = L / (L_nu c / lambda^2), without creating synthesizer Line
+        objects. Results over the full grid with scalar fractions are cached
+        (see derived_cache and disk_cache).
+
+        Args:
+            line_ids (list)
+                The ids (or handles) of the lines. If None use all available
+                lines.
+            covering_fraction (float or np.ndarray)
+                The covering fraction of ionising photons (see
+                get_line_arrays).
+            incident_escape_fraction (float or np.ndarray)
+                The fraction of the incident (or transmitted) that escapes.
+            grid_point (tuple, np.ndarray or dict)
+                If provided, the grid point(s) to compute the equivalent
+                widths at (see get_line_arrays). If None the entire grid is
+                used.
+            mask_failed (bool)
+                If True, set the equivalent widths of failed models to NaN.
+
+        Returns:
+            np.ndarray
+                The (n_lines, *shape) equivalent widths in Angstrom, where
+                shape is as for get_line_arrays. This is read-only if it was
+                cached.
+        """
+
+        if not self.nebular_continuum:
+            raise exceptions.MissingAttribute(
+                "Equivalent widths require a grid containing continua.")
+
+        line_ids = self._get_line_ids(line_ids)
+
+        def create_equivalent_widths():
+            luminosity, continuum = self.get_line_arrays(
+                line_ids,
+                covering_fraction=covering_fraction,
+                incident_escape_fraction=incident_escape_fraction,
+                grid_point=grid_point)
+
+            equivalent_widths = self._get_equivalent_widths(
+                line_ids, luminosity, continuum)
+
+            if mask_failed:
+                if grid_point is None:
+                    failed_models = self.failed_models
+                else:
+                    failed_models = self.failed_models[
+                        self._get_grid_point(grid_point)]
+                equivalent_widths[..., failed_models] = np.nan
+
+            return equivalent_widths
+
+        # Only the full grid with scalar fractions is worth caching
+        if (grid_point is not None or np.ndim(covering_fraction) > 0
+                or np.ndim(incident_escape_fraction) > 0):
+            return create_equivalent_widths()
+
+        key = (
+            "equivalent_width",
+            tuple(line_ids),
+            float(covering_fraction),
+            float(incident_escape_fraction),
+            mask_failed)
+
+        return self._get_derived(key, create_equivalent_widths)
+
+    def _get_equivalent_widths(
+            self, line_ids, luminosity, continuum, line_axis=0):
+        """
+        Internally called method converting (unit-free) line luminosities
+        (erg/s) and continua (erg/s/Hz) into equivalent widths (Angstrom).
+
+        Args:
+            line_ids (list, str)
+                The ids of the lines.
+            luminosity (np.ndarray)
+                The line luminosities.
+            continuum (np.ndarray)
+                The continua, with the same shape as luminosity.
+            line_axis (int)
+                The axis of luminosity and continuum holding the lines,
+                e.g. 0 for (n_lines, *shape) cubes and -1 for (N, n_lines)
+                interpolated values.
+        """
+
+        wavelength = self.line_index.wavelengths[
+            self.line_index.get_handles(line_ids)]
+
+        # The continuum per unit wavelength is L_nu c / lambda^2
+        conversion = c.to("Angstrom/s").value / wavelength**2
+
+        # Align the conversion with the line axis
+        shape = [1] * np.ndim(luminosity)
+        shape[line_axis] = len(line_ids)
+        conversion = conversion.reshape(shape)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return luminosity / (continuum * conversion)
+
+    def _get_line_ids(self, line_ids):
+        """
+        Internally called method for converting line ids and/or integer
+        handles (see gaslight.lines.LineIndex) into a list of line ids,
+        validating them.
+
+        Args:
+            line_ids (str, int or list)
+                A single line id or handle, a list of them or None for all
+                available lines.
+
+        Returns:
+            list, str
+                The line ids.
+        """
+
+        if line_ids is None:
+            return self.lines
+
+        # if a single line_id is provided turn into a list
+        if isinstance(line_ids, (str, int, np.integer)):
+            line_ids = [line_ids]
+
+        return self.line_index.get_line_ids(line_ids)
+
+    def _get_cube(self, quantity, line_ids, grid_point=None):
+        """
+        Internally called method for stacking a quantity for several lines
+        into a new (n_lines, *grid_shape) array, or (n_lines,) at a grid
+        point, or (n_lines, N) at N grid points.
+        """
+
+        values = getattr(self, quantity)
+
+        if grid_point is None:
+            cube = np.empty((len(line_ids),) + tuple(self.grid_shape))
+            for i, line_id in enumerate(line_ids):
+                cube[i] = values[line_id].ndview
+            return cube
+
+        return np.array(
+            [values[line_id].ndview[grid_point] for line_id in line_ids],
+            dtype=float)
+
+    def _get_grid_point(self, grid_point_):
+        """
+        Internally called method for converting a grid point given as a
+        tuple of indices or a dictionary of parameters into a tuple of
+        indices. Batches of grid points (an (N, n_axes) array or a dictionary
+        of arrays) give a tuple of index arrays.
+        """
+
+        # Check whether the grid point is a tuple or dictionary
+        if isinstance(grid_point_, dict):
+            if all(np.ndim(value) == 0 for value in grid_point_.values()):
+                grid_point = self.get_nearest_grid_point(grid_point_)
+            else:
+                grid_point = tuple(
+                    self.get_nearest_grid_points(grid_point_).T)
+        elif np.ndim(grid_point_) == 2:
+            grid_point = tuple(np.asarray(grid_point_, dtype=np.intp).T)
+        else:
+            grid_point = tuple(grid_point_)
+
+        # Throw exception if the grid_point has a different shape from the grid
+        if len(grid_point) != self.naxes:
+            raise exceptions.InconsistentParameter(
+                "The grid_point tuple provided"
+                "as an argument should have same shape as the grid."
+            )
+
+        return grid_point
+
+    def get_ratio(self, ratio_id, mask_failed=True):
+        """
+        Compute a line ratio at every point of the grid in a single
+        vectorised pass. Results are cached (see derived_cache and
+        disk_cache).
+
+        Args:
+            ratio_id (str or list)
+                Either the name of a ratio defined in synthesizer.line_ratios
+                (e.g. "R23") or a [numerator, denominator] pair. Each of
+                these is a line id, a blend given as a comma separated string
+                of line ids (e.g. "O 3 4958.91A, O 3 5006.84A"), an integer
+                handle or a list of these, whose luminosities are summed.
+            mask_failed (bool)
+                If True, set the ratio of failed models to NaN.
+
+        Returns:
+            np.ndarray
+                The (read-only) ratio with the shape of the grid.
+        """
+
+        numerator, denominator = self.get_ratio_definition(ratio_id)
+
+        key = ("ratio", numerator, denominator, mask_failed)
+
+        return self._get_derived(
+            key,
+            lambda: self._create_ratio(numerator, denominator, mask_failed))
+
+    def get_ratios(self, ratio_ids, mask_failed=True):
+        """
+        Compute several line ratios at every point of the grid. The
+        luminosity of each line (or blend) is only summed once, however many
+        ratios it appears in.
+
+        Args:
+            ratio_ids (list)
+                The ratios (see get_ratio).
+            mask_failed (bool)
+                If True, set the ratio of failed models to NaN.
+
+        Returns:
+            dict
+                The ratio of each ratio_id (keyed by the ratio_id itself if
+                it is a name, otherwise by its position in ratio_ids).
+        """
+
+        return {
+            (ratio_id if isinstance(ratio_id, str) else i): self.get_ratio(
+                ratio_id, mask_failed=mask_failed)
+            for i, ratio_id in enumerate(ratio_ids)}
+
+    def get_diagram(self, diagram_id, mask_failed=True):
+        """
+        Compute the two ratios of a diagnostic diagram at every point of the
+        grid.
+
+        Args:
+            diagram_id (str or list)
+                Either the name of a diagram defined in
+                synthesizer.line_ratios (e.g. "BPT-NII") or a pair of ratios
+                (see get_ratio).
+            mask_failed (bool)
+                If True, set the ratios of failed models to NaN.
+
+        Returns:
+            tuple
+                The x and y ratios, each with the shape of the grid.
+        """
+
+        if isinstance(diagram_id, str):
+            if diagram_id not in line_ratios.diagrams:
+                raise exceptions.UnrecognisedOption(
+                    f"Unrecognised diagram {diagram_id}.")
+            diagram_id = line_ratios.diagrams[diagram_id]
+
+        if len(diagram_id) != 2:
+            raise exceptions.InconsistentParameter(
+                "A diagram should be given as a pair of ratios.")
+
+        return tuple(
+            self.get_ratio(ratio_id, mask_failed=mask_failed)
+            for ratio_id in diagram_id)
+
+    def get_ratio_definition(self, ratio_id):
+        """
+        Resolve a ratio into the (sorted) line ids making up its numerator
+        and denominator. This is also the cache key of get_ratio, so
+        equivalent definitions share a result.
+
+        Args:
+            ratio_id (str or list)
+                Either the name of a ratio defined in synthesizer.line_ratios
+                (e.g. "R23") or a [numerator, denominator] pair (see
+                get_ratio).
+
+        Returns:
+            tuple
+                The numerator and denominator, each a tuple of line ids
+                whose luminosities are summed.
+        """
+
+        if isinstance(ratio_id, str):
+            if ratio_id not in line_ratios.ratios:
+                raise exceptions.UnrecognisedOption(
+                    f"Unrecognised ratio {ratio_id}.")
+            ratio_id = line_ratios.ratios[ratio_id]
+
+        if len(ratio_id) != 2:
+            raise exceptions.InconsistentParameter(
+                "A ratio should be given as a [numerator, denominator] pair.")
+
+        return tuple(
+            tuple(sorted(self._get_line_ids(get_blend_line_ids(blend))))
+            for blend in ratio_id)
+
+    def _get_blend_luminosity(self, line_ids):
+        """
+        Internally called method for the summed luminosity (without units)
+        of a blend of lines across the grid. Results are cached.
+        """
+
+        def create_blend():
+            luminosity = np.zeros(self.grid_shape)
+            for line_id in line_ids:
+                luminosity += self.luminosity[line_id].ndview
+            luminosity.flags.writeable = False
+            return luminosity
+
+        return self.derived_cache.get_or_create(
+            ("blend", line_ids), create_blend)
+
+    def _create_ratio(self, numerator, denominator, mask_failed):
+        """
+        Internally called method for computing a ratio.
+        """
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = (
+                self._get_blend_luminosity(numerator)
+                / self._get_blend_luminosity(denominator))
+
+        if mask_failed:
+            ratio[self.failed_models] = np.nan
+
+        ratio.flags.writeable = False
+
+        return ratio
+
+    def _create_line(self, line_id, luminosity, continuum, index):
+        """
+        Internally called method for creating a synthesizer Line object from
+        the arrays returned by get_line_arrays.
+
+        Args:
+            line_id (str)
+                The id of the line.
+            luminosity (np.ndarray)
+                The luminosity of the line (erg/s).
+            continuum (np.ndarray)
+                The continua of all the lines (erg/s/Hz) or None.
+            index (int)
+                The index of the line in the continuum array.
+
+        Returns:
+            line (synthesizer.line.Line)
+                A synthesizer Line object.
+        """
+
+        luminosity = unyt_array(luminosity, QUANTITY_UNITS["luminosity"])
+
+        if continuum is None:
+            return Line(line_id, self.wavelength[line_id], luminosity)
+
+        continuum = unyt_array(
+            continuum[index], QUANTITY_UNITS["nebular_continuum"])
+
+        return Line(line_id, self.wavelength[line_id], luminosity, continuum)
+
+    def setup_interpolator(
+            self,
+            line_ids=None,
+            log10=None,
+            method="linear",
+            engine="auto",
+            fill_failed=False,
+            log10_luminosity=False,
+            ):
+
+        """
+        Setup the (linear or cubic) interpolator for the lines in line_ids.
+
+        Interpolators are cached (see get_interpolator) so this is only needed
+        to build them ahead of time. It also sets the log10 axes, method,
+        engine, failed model filling and log10 luminosity interpolation used
+        by default by get_interpolated_line.
+
+        Arguments:
+            line_ids (str, int or list)
+                Single line_id (or handle) or list of line_ids.
+            log10 (list)
+                List of parameters (axis) to do interpolation in log10 space.
+            method (str)
+                The interpolation method (see gaslight.interpolation.METHODS),
+                "linear" or "cubic" (tensor-product cubic splines, whose
+                coefficients are computed once and cached, and persisted
+                next to the grid if the grid was opened with
+                cache_dir=True). Cubic interpolation always uses the
+                gaslight engines and costs 2^n_axes times as much as linear
+                to evaluate.
+            engine (str)
+                The interpolation engine, one of the gaslight engines
+                ("auto", the default, "numpy" or "numba", see
+                gaslight.interpolation) or "scipy" (scipy's
+                RegularGridInterpolator, for the linear method only).
+            fill_failed (bool)
+                If True, fill the failed models from their neighbours before
+                interpolating (see gaslight.interpolation.get_fill_passes).
+            log10_luminosity (bool)
+                If True, interpolate log10 of the luminosities (see
+                get_interpolated_luminosities).
+        """
+
+        # if no line_id is provided use all available lines
+        if line_ids is None or np.size(line_ids) == 0:
+            line_ids = self.lines
+
+        line_ids = self._get_line_ids(line_ids)
+
+        # the defaults used by get_interpolated_line
+        self.interpolator_log10 = log10
+        self.interpolator_method = method
+        self.interpolator_engine = engine
+        self.interpolator_fill_failed = fill_failed
+        self.interpolator_log10_luminosity = log10_luminosity
+
+        for line_id in line_ids:
+            self.get_interpolator(
+                line_id,
+                log10=log10,
+                method=method,
+                engine=engine,
+                fill_failed=fill_failed,
+                log10_luminosity=log10_luminosity)
+
+    def get_interpolator(
+            self,
+            line_id,
+            log10=None,
+            method="linear",
+            engine="auto",
+            fill_failed=False,
+            log10_luminosity=False,
+            ):
+        """
+        Return the interpolator for a line, creating it if it is not already
+        in the interpolator cache.
+
+        Interpolators are cached by line, log10 axes, method, engine, failed
+        model filling and log10 luminosity, so different configurations
+        never share an interpolator. The cache can
+        be used from several threads at once.
+
+        Args:
+            line_id (str or int)
+                The id (or integer handle) of the line.
+            log10 (list)
+                List of parameters (axis) to do interpolation in log10 space.
+            method (str)
+                The interpolation method (see gaslight.interpolation.METHODS).
+            engine (str)
+                The interpolation engine (see setup_interpolator).
+            fill_failed (bool)
+                If True, fill the failed models before interpolating.
+            log10_luminosity (bool)
+                If True, the interpolator returns log10 of the luminosity.
+
+        Returns:
+            callable
+                The interpolator, which takes points in the interpolation
+                space (i.e. with log10 applied to the log10 axes).
+        """
+
+        line_id = self.line_index.get_line_id(line_id)
+
+        key = self._get_interpolator_key(
+            line_id, log10, method, engine, fill_failed, log10_luminosity)
+
+        return self.interpolator_cache.get_or_create(
+            key,
+            lambda: self._create_interpolator(
+                line_id, log10, method, engine, fill_failed,
+                log10_luminosity))
+
+    def _get_interpolator_key(
+            self,
+            line_id,
+            log10,
+            method,
+            engine,
+            fill_failed=False,
+            log10_luminosity=False,
+            ):
+        """
+        Internally called method for creating the interpolator cache key,
+        validating the configuration.
+        """
+
+        if log10 is None:
+            log10 = []
+
+        for axis in log10:
+            if axis not in self.axes:
+                raise exceptions.InconsistentParameter(
+                    f"{axis} is not an axis of the grid.")
+
+        if method not in METHODS:
+            raise exceptions.UnrecognisedOption(
+                f"Unrecognised interpolation method {method}, expected one "
+                f"of {METHODS}.")
+
+        return (
+            line_id,
+            frozenset(log10),
+            method,
+            engine,
+            bool(fill_failed),
+            bool(log10_luminosity))
+
+    def _create_interpolator(
+            self,
+            line_id,
+            log10,
+            method,
+            engine,
+            fill_failed=False,
+            log10_luminosity=False,
+            ):
+        """
+        Internally called method for creating the interpolator of a line.
+        """
+
+        values = self.luminosity[line_id]
+        if fill_failed or log10_luminosity:
+            values = self._get_table(
+                "luminosity",
+                [line_id],
+                fill_failed=fill_failed,
+                log10_values=log10_luminosity).reshape(self.grid_shape)
+
+        # The gaslight engines share a single interpolator over the axes.
+        # They are also used for the methods scipy's RegularGridInterpolator
+        # would rebuild the splines of on every call.
+        if engine != "scipy" or method != "linear":
+            return LineInterpolator(
+                self._get_grid_interpolator(log10, method, engine),
+                strip_units(values))
+
+        # if a parameter is to be interpolated in log10 space
+        if log10:
             points = []
             for axis in self.axes:
                 if axis in log10:
@@ -501,39 +2042,93 @@ class Grid:
         else:
             points = [self.axes_values[axis] for axis in self.axes]
 
-        for line_id in line_ids:
+        return RegularGridInterpolator(points, values)
+
+    def _get_grid_interpolator(self, log10, method, engine):
+        """
+        Internally called method returning the (cached) GridInterpolator
+        over the axes, shared by every line.
+        """
+
+        if engine == "scipy":
+            engine = "auto"
 
-            values = self.luminosity[line_id]
+        key = self._get_interpolator_key(None, log10, method, engine)
 
-            self.interpolator[line_id] = RegularGridInterpolator(
-                points,
-                values)
+        return self.interpolator_cache.get_or_create(
+            key,
+            lambda: GridInterpolator(
+                self.axes,
+                self.axes_values,
+                log10=log10,
+                engine=engine,
+                method=method))
 
-    def get_interpolated_line(self, parameter_dict, line_id):
+    def get_interpolated_line(
+            self,
+            parameter_dict,
+            line_id,
+            log10=None,
+            method=None,
+            engine=None,
+            fill_failed=None,
+            log10_luminosity=None,
+            ):
         """
         Method for getting the interpolated line luminosity.
 
         Args:
             parameter_dict (dict)
                 A dictionary of parameter values to use.
-            line_id (str)
-                The id of the line.
+            line_id (str or int)
+                The id (or integer handle) of the line.
             log10 (list)
-                List of parameters to interpolate in logspace
+                List of parameters to interpolate in logspace. If None use
+                those set by setup_interpolator.
+            method (str)
+                The interpolation method. If None use that set by
+                setup_interpolator.
+            engine (str)
+                The interpolation engine. If None use that set by
+                setup_interpolator.
+            fill_failed (bool)
+                Whether to fill failed models before interpolating. If None
+                use that set by setup_interpolator.
+            log10_luminosity (bool)
+                Whether to interpolate log10 of the luminosity. If None use
+                that set by setup_interpolator.
 
         Returns:
             line (synthesizer.line.Line)
                 A synthesizer Line object.
         """
 
-        if line_id not in self.interpolator.keys():
-            self.setup_interpolator(line_id)
+        line_id = self.line_index.get_line_id(line_id)
+
+        if log10 is None:
+            log10 = self.interpolator_log10
+        if method is None:
+            method = self.interpolator_method
+        if engine is None:
+            engine = self.interpolator_engine
+        if fill_failed is None:
+            fill_failed = self.interpolator_fill_failed
+        if log10_luminosity is None:
+            log10_luminosity = self.interpolator_log10_luminosity
+
+        interpolator = self.get_interpolator(
+            line_id,
+            log10=log10,
+            method=method,
+            engine=engine,
+            fill_failed=fill_failed,
+            log10_luminosity=log10_luminosity)
 
         # create array of parameters in the correct order
-        if self.interpolator_log10:
+        if log10:
             point = []
             for axis in self.axes:
-                if axis in self.interpolator_log10:
+                if axis in log10:
                     point.append(np.log10(parameter_dict[axis]))
                 else:
                     point.append(parameter_dict[axis])
@@ -541,41 +2136,600 @@ class Grid:
             point = [parameter_dict[axis] for axis in self.axes]
 
         # calculate lumuinisity using interpolation
-        luminosity = self.interpolator[line_id](point)
+        luminosity = interpolator(point)
+        if log10_luminosity:
+            luminosity = 10**luminosity
 
         wavelength = self.wavelength[line_id]
 
         return Line(line_id, wavelength, luminosity[0])
 
-    def get_interpolated_line_collection(self, parameter_dict, line_ids=None):
+    def get_interpolated_line_collection(
+            self,
+            parameter_dict,
+            line_ids=None,
+            log10=None,
+            method=None,
+            engine=None,
+            fill_failed=None,
+            log10_luminosity=None,
+            ):
         """
         Method for creating a LineCollection using linear interpolation.
 
         Args:
             parameter_dict (tuple)
                 A dictionary of parameters to interpolate.
-            line_id (str)
-                The id of the line. If None use all available lines.
+            line_ids (list)
+                The ids (or handles) of the lines. If None use all available
+                lines.
+            log10 (list)
+                List of parameters to interpolate in logspace. If None use
+                those set by setup_interpolator.
+            method (str)
+                The interpolation method. If None use that set by
+                setup_interpolator.
+            engine (str)
+                The interpolation engine. If None use that set by
+                setup_interpolator.
+            fill_failed (bool)
+                Whether to fill failed models before interpolating. If None
+                use that set by setup_interpolator.
+            log10_luminosity (bool)
+                Whether to interpolate log10 of the luminosities. If None use
+                that set by setup_interpolator.
 
         Returns:
             line_collection (synthesizer.line.LineCollection)
                 A synthesizer LineCollection object.
         """
 
-        if line_ids is None:
-            line_ids = self.lines
+        line_ids = self._get_line_ids(line_ids)
+        if log10 is None:
+            log10 = self.interpolator_log10
+        if method is None:
+            method = self.interpolator_method
+        if engine is None:
+            engine = self.interpolator_engine
+        if fill_failed is None:
+            fill_failed = self.interpolator_fill_failed
+        if log10_luminosity is None:
+            log10_luminosity = self.interpolator_log10_luminosity
+
+        # Interpolate every line at once
+        luminosities = self.get_interpolated_luminosities(
+            parameter_dict,
+            line_ids=line_ids,
+            log10=log10,
+            method=method,
+            engine=engine,
+            fill_failed=fill_failed,
+            log10_luminosity=log10_luminosity,
+            ).ndview[0]
 
         # Line dictionary
         lines = {}
 
-        for line_id in line_ids:
-            line = self.get_interpolated_line(parameter_dict, line_id)
-
-            # Add to dictionary
-            lines[line.id] = line
+        for line_id, luminosity in zip(line_ids, luminosities):
+            lines[line_id] = Line(
+                line_id, self.wavelength[line_id], luminosity)
 
         # Create and return collection
 
         line_collection = LineCollection(lines)
 
         return line_collection
+
+    def get_interpolated_luminosities(
+            self,
+            parameters,
+            line_ids=None,
+            log10=None,
+            method="linear",
+            bounds_error=True,
+            fill_value=np.nan,
+            engine="auto",
+            fill_failed=False,
+            return_failed=False,
+            log10_luminosity=False,
+            ):
+        """
+        Method for interpolating the luminosities of many lines at many
+        points at once. The cell search and interpolation weights are
+        computed once and shared by every line.
+
+        Args:
+            parameters (dict or array-like)
+                Either a dictionary of parameter values (scalars or arrays)
+                keyed by axis, or an (N, n_axes) array with the parameters
+                in the same order as the axes. Values must be unitless, in
+                the units of the axes.
+            line_ids (list)
+                The ids (or handles) of the lines. If None use all available
+                lines.
+            log10 (list)
+                List of parameters (axis) to do interpolation in log10 space.
+            method (str)
+                The interpolation method (see gaslight.interpolation.METHODS).
+            bounds_error (bool)
+                If True raise an exception for points outside the grid.
+            fill_value (float)
+                The luminosity returned for points outside the grid if
+                bounds_error is False.
+            engine (str)
+                The interpolation engine ("auto", "numpy" or "numba", see
+                gaslight.interpolation).
+            fill_failed (bool)
+                If True, fill the failed models from their neighbours before
+                interpolating (see gaslight.interpolation.get_fill_passes).
+                The filled tables are computed once and cached.
+            return_failed (bool)
+                If True, also return whether each point's interpolation uses
+                a failed model, computed with the same interpolation weights
+                (for the cubic method, from the 4 nearest grid points along
+                each axis).
+            log10_luminosity (bool)
+                If True, interpolate log10 of the values (which span many
+                decades) rather than the values themselves. The log10
+                tables are computed once and cached. Zeros are replaced by a
+                value far below the faintest positive value of the line (see
+                gaslight.interpolation.log10_table). Failed models are always
+                filled (in log10) in this case, whatever fill_failed, since
+                their zeros would otherwise drag neighbouring points down by
+                many decades.
+
+        Returns:
+            luminosity (unyt_array)
+                The (N, n_lines) interpolated luminosities.
+            touches_failed (np.ndarray)
+                If return_failed, the (N,) boolean mask of points whose
+                interpolation uses a failed model.
+        """
+
+        values, touches_failed = self._interpolate(
+            ["luminosity"],
+            parameters,
+            self._get_line_ids(line_ids),
+            log10=log10,
+            method=method,
+            bounds_error=bounds_error,
+            fill_value=fill_value,
+            engine=engine,
+            fill_failed=fill_failed,
+            return_failed=return_failed,
+            log10_values=log10_luminosity)
+
+        luminosity = unyt_array(
+            values["luminosity"], QUANTITY_UNITS["luminosity"])
+
+        if return_failed:
+            return luminosity, touches_failed
+
+        return luminosity
+
+    def get_interpolated_gradients(
+            self,
+            parameters,
+            line_ids=None,
+            log10=None,
+            method="linear",
+            bounds_error=True,
+            fill_value=np.nan,
+            engine="auto",
+            fill_failed=False,
+            log10_luminosity=False,
+            ):
+        """
+        Method for interpolating the luminosities of many lines at many
+        points along with their analytic partial derivatives with respect to
+        every axis, in a single evaluation sharing the interpolation
+        weights (e.g. for gradient based optimisers and samplers).
+
+        The derivatives are those of the interpolant: piecewise constant
+        for linear interpolation (and so discontinuous at the grid points)
+        and continuous for cubic interpolation. They are with respect to the
+        axis values themselves, including for log10 axes.
+
+        Args:
+            parameters (dict or array-like)
+                Either a dictionary of parameter values (scalars or arrays)
+                keyed by axis, or an (N, n_axes) array with the parameters
+                in the same order as the axes. Values must be unitless, in
+                the units of the axes.
+            line_ids (list)
+                The ids (or handles) of the lines. If None use all available
+                lines.
+            log10 (list)
+                List of parameters (axis) to do interpolation in log10 space.
+            method (str)
+                The interpolation method (see gaslight.interpolation.METHODS).
+            bounds_error (bool)
+                If True raise an exception for points outside the grid.
+            fill_value (float)
+                The luminosity (and derivatives) returned for points outside
+                the grid if bounds_error is False.
+            engine (str)
+                The interpolation engine ("auto", "numpy" or "numba", see
+                gaslight.interpolation).
+            fill_failed (bool)
+                If True, fill the failed models from their neighbours before
+                interpolating.
+            log10_luminosity (bool)
+                If True, interpolate log10 of the luminosities (see
+                get_interpolated_luminosities). The derivatives are still
+                those of the luminosity.
+
+        Returns:
+            luminosity (unyt_array)
+                The (N, n_lines) interpolated luminosities.
+            gradients (dict)
+                The (N, n_lines) partial derivatives of the luminosities
+                with respect to each axis, keyed by axis.
+        """
+
+        line_ids = self._get_line_ids(line_ids)
+
+        interpolator = self._get_grid_interpolator(log10, method, engine)
+
+        values, gradients = interpolator.gradient(
+            self._get_table(
+                "luminosity",
+                line_ids,
+                fill_failed,
+                log10_luminosity,
+                interpolator=interpolator),
+            self._get_parameter_array(parameters),
+            bounds_error=bounds_error,
+            fill_value=np.nan if log10_luminosity else fill_value)
+
+        # d L / d x = ln(10) L d log10(L) / d x
+        if log10_luminosity:
+            values = 10**values
+            gradients *= np.log(10) * values[:, None, :]
+            outside = np.isnan(values)
+            values[outside] = fill_value
+            gradients[np.broadcast_to(
+                outside[:, None, :], gradients.shape)] = fill_value
+
+        units = QUANTITY_UNITS["luminosity"]
+
+        return unyt_array(values, units), {
+            axis: unyt_array(gradients[:, i], units)
+            for i, axis in enumerate(self.axes)}
+
+    def get_interpolated_equivalent_widths(
+            self,
+            parameters,
+            line_ids=None,
+            covering_fraction=1.0,
+            incident_escape_fraction=1.0,
+            log10=None,
+            method="linear",
+            bounds_error=True,
+            fill_value=np.nan,
+            engine="auto",
+            fill_failed=False,
+            return_failed=False,
+            log10_luminosity=False,
+            ):
+        """
+        Method for interpolating the equivalent widths of many lines at many
+        points at once. The line luminosities and the three continua are
+        interpolated in a single pass (sharing the interpolation weights),
+        combined with the covering and escape fractions and converted into
+        equivalent widths.
+
+        Args:
+            parameters (dict or array-like)
+                Either a dictionary of parameter values (scalars or arrays)
+                keyed by axis, or an (N, n_axes) array with the parameters
+                in the same order as the axes. Values must be unitless, in
+                the units of the axes.
+            line_ids (list)
+                The ids (or handles) of the lines. If None use all available
+                lines.
+            covering_fraction (float or np.ndarray)
+                The covering fraction of ionising photons, either a scalar or
+                one value per point.
+            incident_escape_fraction (float or np.ndarray)
+                The fraction of the incident (or transmitted) that escapes,
+                either a scalar or one value per point.
+            log10 (list)
+                List of parameters (axis) to do interpolation in log10 space.
+            method (str)
+                The interpolation method (see gaslight.interpolation.METHODS).
+            bounds_error (bool)
+                If True raise an exception for points outside the grid.
+            fill_value (float)
+                The value returned for points outside the grid if
+                bounds_error is False.
+            engine (str)
+                The interpolation engine ("auto", "numpy" or "numba", see
+                gaslight.interpolation).
+            fill_failed (bool)
+                If True, fill the failed models from their neighbours before
+                interpolating (see gaslight.interpolation.get_fill_passes).
+                The filled tables are computed once and cached.
+            return_failed (bool)
+                If True, also return whether each point's interpolation uses
+                a failed model, computed with the same interpolation weights
+                (for the cubic method, from the 4 nearest grid points along
+                each axis).
+            log10_luminosity (bool)
+                If True, interpolate log10 of the values (which span many
+                decades) rather than the values themselves. The log10
+                tables are computed once and cached. Zeros are replaced by a
+                value far below the faintest positive value of the line (see
+                gaslight.interpolation.log10_table). Failed models are always
+                filled (in log10) in this case, whatever fill_failed, since
+                their zeros would otherwise drag neighbouring points down by
+                many decades.
+
+        Returns:
+            equivalent_width (unyt_array)
+                The (N, n_lines) interpolated equivalent widths.
+            touches_failed (np.ndarray)
+                If return_failed, the (N,) boolean mask of points whose
+                interpolation uses a failed model.
+        """
+
+        if not self.nebular_continuum:
+            raise exceptions.MissingAttribute(
+                "Equivalent widths require a grid containing continua.")
+
+        line_ids = self._get_line_ids(line_ids)
+
+        values, touches_failed = self._interpolate(
+            ["luminosity"] + list(CONTINUUM_QUANTITIES),
+            parameters,
+            line_ids,
+            log10=log10,
+            method=method,
+            bounds_error=bounds_error,
+            fill_value=fill_value,
+            engine=engine,
+            fill_failed=fill_failed,
+            return_failed=return_failed,
+            log10_values=log10_luminosity)
+
+        # Fractions are per point, so broadcast them along the lines
+        covering_fraction = np.asarray(covering_fraction, dtype=float)
+        incident_escape_fraction = np.asarray(
+            incident_escape_fraction, dtype=float)
+        if covering_fraction.ndim == 1:
+            covering_fraction = covering_fraction[:, np.newaxis]
+        if incident_escape_fraction.ndim == 1:
+            incident_escape_fraction = incident_escape_fraction[:, np.newaxis]
+
+        try:
+            continuum = combine_continua(
+                values["nebular_continuum"],
+                values["transmitted_continuum"],
+                values["incident_continuum"],
+                covering_fraction,
+                incident_escape_fraction)
+        except ValueError:
+            raise exceptions.InconsistentParameter(
+                "covering_fraction and incident_escape_fraction must be "
+                "scalars or have one value per point.")
+
+        equivalent_width = self._get_equivalent_widths(
+            line_ids,
+            covering_fraction * values["luminosity"],
+            continuum,
+            line_axis=-1)
+
+        if return_failed:
+            return unyt_array(equivalent_width, Angstrom), touches_failed
+
+        return unyt_array(equivalent_width, Angstrom)
+
+    def _interpolate(
+            self,
+            quantities,
+            parameters,
+            line_ids,
+            log10=None,
+            method="linear",
+            bounds_error=True,
+            fill_value=np.nan,
+            engine="auto",
+            fill_failed=False,
+            return_failed=False,
+            log10_values=False,
+            ):
+        """
+        Internally called method interpolating several quantities of
+        several lines in a single pass (see get_interpolated_luminosities
+        for the arguments).
+
+        Returns:
+            values (dict)
+                The (N, n_lines) interpolated values of each quantity.
+            touches_failed (np.ndarray)
+                If return_failed, the (N,) boolean mask of points whose
+                interpolation uses a failed model, otherwise None.
+        """
+
+        nlines = len(line_ids)
+
+        interpolator = self._get_grid_interpolator(log10, method, engine)
+
+        # Interpolate every quantity at once, then split the columns
+        tables = [
+            self._get_table(
+                quantity,
+                line_ids,
+                fill_failed,
+                log10_values,
+                interpolator=interpolator)
+            for quantity in quantities]
+        values = interpolator(
+            tables[0] if len(tables) == 1 else np.concatenate(tables, axis=1),
+            self._get_parameter_array(parameters),
+            bounds_error=bounds_error,
+            fill_value=np.nan if log10_values else fill_value,
+            mask=self.failed_models_flattened if return_failed else None)
+
+        touches_failed = None
+        if return_failed:
+            values, touches_failed = values
+
+        # Points outside the grid are the only source of NaNs in log10
+        if log10_values:
+            values = 10**values
+            values[np.isnan(values)] = fill_value
+
+        values = {
+            quantity: values[:, i * nlines:(i + 1) * nlines]
+            for i, quantity in enumerate(quantities)}
+
+        return values, touches_failed
+
+    def _get_table(
+            self,
+            quantity,
+            line_ids,
+            fill_failed=False,
+            log10_values=False,
+            interpolator=None,
+            ):
+        """
+        Internally called method for creating the (nmodels, n_lines) table
+        of a quantity used by the interpolator. Tables are held in the
+        interpolator cache and persisted in the disk cache.
+
+        Args:
+            quantity (str)
+                The name of the quantity, e.g. "luminosity".
+            line_ids (list, str)
+                The ids of the lines.
+            fill_failed (bool)
+                If True, fill the failed models from their neighbours.
+            log10_values (bool)
+                If True, take log10 of the values (see
+                gaslight.interpolation.log10_table). Failed models are then
+                always filled, in log10.
+            interpolator (gaslight.interpolation.GridInterpolator)
+                If provided, return the table prefiltered for this
+                interpolator, e.g. the spline coefficients for cubic
+                interpolation (see GridInterpolator.prefilter).
+
+        Returns:
+            np.ndarray
+                The (nmodels, n_lines) table.
+        """
+
+        values = getattr(self, quantity)
+
+        # Failed models have zero values, whose log10 (the floor set by
+        # log10_table) is many decades below their neighbours, so they are
+        # always filled in log10
+        if log10_values:
+            fill_failed = True
+
+        def create_table():
+            if prefilter:
+                return interpolator.prefilter(self._get_table(
+                    quantity, line_ids, fill_failed, log10_values))
+            if fill_failed:
+                table = self._get_table(quantity, line_ids)
+                if log10_values:
+                    table = log10_table(table)
+                return fill_table(table, self._get_fill_passes())
+            table = np.empty((self.nmodels, len(line_ids)))
+            for i, line_id in enumerate(line_ids):
+                table[:, i] = values[line_id].ndview.ravel()
+            return table
+
+        # Only the spline coefficients differ from the values
+        prefilter = interpolator is not None and any(interpolator.cubic)
+
+        key = ("table", quantity, tuple(line_ids))
+        if prefilter:
+            key += ("coefficients", tuple(interpolator.log10))
+        if fill_failed:
+            key += ("filled",)
+        if log10_values:
+            key += ("log10",)
+
+        return self.interpolator_cache.get_or_create(
+            key, lambda: self._get_persistent(key, create_table))
+
+    def _get_fill_passes(self):
+        """
+        Internally called method returning (and caching) how the failed
+        models are filled from their neighbours (see
+        gaslight.interpolation.get_fill_passes).
+        """
+        return self.interpolator_cache.get_or_create(
+            ("fill_passes",), lambda: get_fill_passes(self.failed_models))
+
+    def _get_parameter_array(self, parameters):
+        """
+        Internally called method for converting parameters into an
+        (N, n_axes) array in the order of the axes.
+
+        Args:
+            parameters (dict or array-like)
+                Either a dictionary of parameter values (scalars or arrays)
+                keyed by axis, or an array (or list) with the parameters in
+                the same order as the axes. The file does not record the
+                units of the axes, so values must be unitless (any units
+                are stripped without conversion).
+
+        Returns:
+            np.ndarray
+                The (N, n_axes) array of parameters.
+        """
+
+        if isinstance(parameters, dict):
+            missing = [axis for axis in self.axes if axis not in parameters]
+            if missing:
+                raise exceptions.MissingArgument(
+                    f"Missing parameters for axes {missing}.")
+
+            columns = [
+                np.atleast_1d(strip_units(parameters[axis]))
+                for axis in self.axes]
+
+            return np.stack(
+                np.broadcast_arrays(*columns), axis=1).astype(float)
+
+        return np.array(strip_units(parameters), dtype=float, ndmin=2)
+
+
+def combine_continua(
+        nebular,
+        transmitted,
+        incident,
+        covering_fraction,
+        incident_escape_fraction,
+        ):
+    """
+    Combine the nebular, transmitted and incident continua at the lines into
+    the total continuum for a covering fraction and escape fraction.
+
+    Args:
+        nebular (np.ndarray)
+            The nebular continuum.
+        transmitted (np.ndarray)
+            The transmitted continuum.
+        incident (np.ndarray)
+            The incident continuum.
+        covering_fraction (float or np.ndarray)
+            The covering fraction of ionising photons. This scales the
+            nebular and transmitted continuum. The incident continuum is
+            scaled by 1 - covering_fraction.
+        incident_escape_fraction (float or np.ndarray)
+            The fraction of the incident (or transmitted) that escapes.
+
+    Returns:
+        np.ndarray
+            The total continuum.
+    """
+
+    return (
+        covering_fraction * (
+            nebular + incident_escape_fraction * transmitted) +
+        (1.0 - covering_fraction) * incident_escape_fraction * incident)
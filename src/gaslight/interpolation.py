@@ -0,0 +1,991 @@
+"""
+Vectorised interpolation on the regular (rectilinear) grids used by gaslight.
+
+Interpolation is split into two steps. First, for every query point and every
+axis, the grid points contributing to the interpolation (the "support") and
+their weights are found. This only depends on the axes and so is shared by
+every line. Second, the tensor product of the per-axis weights is contracted
+with a table of values, of shape (nmodels, n_lines), evaluating all lines at
+once.
+
+The first step is cheap, O(N n_axes), and uses per-axis lookup tables
+precomputed when the interpolator is created. The second step, O(N 2^n_axes
+n_lines) for linear interpolation, dominates and has two engines: a pure
+NumPy implementation and, if numba is installed, a compiled kernel which runs
+multi-threaded over the query points (the number of threads is controlled by
+numba, e.g. with the NUMBA_NUM_THREADS environment variable).
+
+Cubic interpolation uses tensor-product cubic B-splines (with not-a-knot end
+conditions, as scipy's make_interp_spline). The table of values is first
+converted, once, into a table of spline coefficients of the same size (see
+GridInterpolator.prefilter). Each axis then has a support of 4 points, whose
+weights are the B-spline basis functions, and the contraction is the same as
+the linear case, at a cost of O(N 4^n_axes n_lines). Axes with fewer than 4
+points fall back to linear interpolation.
+
+Cubic evaluation is therefore not as cheap as linear: it visits 2^n_axes
+times as many grid points per query (16 times for a 4 axis grid, 256 times
+for 8 axes), and tools/benchmark_interpolation.py reports the measured
+ratio. A tensor-product spline cannot do better, since each point depends on
+4 coefficients per axis. It still avoids the cost of rebuilding scipy
+splines on every call, which is what the gaslight engines replace.
+
+Failed models can be filled before interpolating (see get_fill_passes and
+fill_table), replacing each failed node with an estimate from its
+neighbours along the axes, and the interpolator can flag the query points
+whose support includes a failed node as part of the same evaluation. For
+the cubic method the flag is based on the 4 grid points nearest the query
+point along each axis: the spline coefficients depend on every node, but
+the influence of a node decays quickly with distance.
+
+The partial derivatives of the interpolant with respect to every axis (see
+GridInterpolator.gradient) reuse the same support, replacing the weights of
+one axis at a time with the derivatives of its basis functions, so the
+values and all n_axes gradients are evaluated together.
+"""
+
+import itertools
+
+import numpy as np
+from scipy.interpolate import make_interp_spline
+
+import gaslight.exceptions as exceptions
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+# The number of points evaluated at once. This bounds the size of the
+# temporary arrays created during the contraction.
+POINTS_PER_BLOCK = 2**16
+
+# The relative tolerance within which the cell widths of an axis are
+# considered equal, i.e. the axis is uniformly spaced.
+UNIFORM_RTOL = 1e-9
+
+# The available contraction engines.
+ENGINES = ("auto", "numpy", "numba")
+
+# The available interpolation methods.
+METHODS = ("linear", "cubic")
+
+# The degree of the splines used by the cubic method.
+SPLINE_DEGREE = 3
+
+# When interpolating log10 values, zeros are replaced by a value this many
+# decades below the faintest positive value of the line (see log10_table).
+LOG10_ZERO_DECADES = 10
+
+
+if NUMBA_AVAILABLE:
+
+    @numba.njit(parallel=True, cache=True)
+    def _contract_numba(table, indices, weights, sizes, strides, output):
+        """
+        Compiled contraction of the per-axis weights with a table of values,
+        parallelised over points. See GridInterpolator.contract.
+
+        Args:
+            table (np.ndarray)
+                The (nmodels, n_lines) values.
+            indices (np.ndarray)
+                The (n_axes, N, m) indices of the supporting points, where m
+                is the largest support size.
+            weights (np.ndarray)
+                The (n_axes, N, m) weights of the supporting points.
+            sizes (np.ndarray)
+                The support size of each axis.
+            strides (np.ndarray)
+                The stride of each axis in the flattened grid.
+            output (np.ndarray)
+                The (N, n_lines) array to accumulate into (zeroed).
+        """
+
+        naxes = indices.shape[0]
+        npoints = indices.shape[1]
+        nlines = table.shape[1]
+
+        ncorners = 1
+        for axis in range(naxes):
+            ncorners *= sizes[axis]
+
+        for point in numba.prange(npoints):
+            for corner in range(ncorners):
+
+                # Decode the corner into a support index along each axis
+                remainder = corner
+                flat_index = 0
+                weight = 1.0
+                for axis in range(naxes - 1, -1, -1):
+                    j = remainder % sizes[axis]
+                    remainder //= sizes[axis]
+                    weight *= weights[axis, point, j]
+                    flat_index += indices[axis, point, j] * strides[axis]
+
+                if weight == 0.0:
+                    continue
+
+                for line in range(nlines):
+                    output[point, line] += weight * table[flat_index, line]
+
+
+class GridInterpolator:
+    """
+    A multilinear (or cubic spline) interpolator over the axes of a grid,
+    able to evaluate many lines at many points at once.
+
+    Attributes:
+        axes (list, str)
+            The names of the axes.
+        points (list, np.ndarray)
+            The grid points of each axis, in log10 for log10 axes.
+        log10 (list, bool)
+            Whether each axis is interpolated in log10.
+        shape (tuple)
+            The shape of the grid.
+        strides (np.ndarray)
+            The stride of each axis in the flattened (C-ordered) grid.
+        method (str)
+            The interpolation method, "linear" or "cubic".
+        cubic (list, bool)
+            Whether each axis is interpolated with cubic splines (axes with
+            fewer than 4 points are interpolated linearly).
+        knots (list, np.ndarray)
+            The spline knots of each cubic axis (None for linear axes).
+    """
+
+    def __init__(
+            self,
+            axes,
+            axes_values,
+            log10=None,
+            engine="auto",
+            method="linear",
+            ):
+        """
+        Initialise the interpolator.
+
+        Args:
+            axes (list, str)
+                The names of the axes in order.
+            axes_values (dict)
+                The values of each axis.
+            log10 (list, str)
+                The axes to interpolate in log10.
+            engine (str)
+                The contraction engine: "numpy", "numba" or "auto" (numba if
+                it is installed, otherwise numpy).
+            method (str)
+                The interpolation method, "linear" or "cubic". Cubic
+                evaluation costs 2^n_axes times as much as linear (see the
+                module docstring).
+        """
+
+        if log10 is None:
+            log10 = []
+
+        if method not in METHODS:
+            raise exceptions.UnrecognisedOption(
+                f"Unrecognised interpolation method {method}, expected one "
+                f"of {METHODS}.")
+        self.method = method
+
+        if engine not in ENGINES:
+            raise exceptions.UnrecognisedOption(
+                f"Unrecognised engine {engine}, expected one of {ENGINES}.")
+        if engine == "numba" and not NUMBA_AVAILABLE:
+            raise exceptions.UnimplementedFunctionality(
+                "The numba engine requires numba to be installed.")
+        if engine == "auto":
+            engine = "numba" if NUMBA_AVAILABLE else "numpy"
+        self.engine = engine
+
+        self.axes = list(axes)
+        self.log10 = [axis in log10 for axis in self.axes]
+
+        self.points = [
+            np.log10(axes_values[axis]) if log else
+            np.asarray(axes_values[axis], dtype=float)
+            for axis, log in zip(self.axes, self.log10)]
+
+        self.shape = tuple(len(points) for points in self.points)
+        self.strides = np.array(
+            [int(np.prod(self.shape[i + 1:])) for i in range(len(self.shape))],
+            dtype=np.intp)
+
+        # Per-axis lookup tables. Uniformly spaced axes (in interpolation
+        # space) locate a value's cell directly from the spacing, others use
+        # a binary search. The inverse cell widths avoid a division per
+        # point. Uniformity is judged relative to the spacing, since axes
+        # may have very small (or very large) values.
+        self.uniform = []
+        self.inverse_widths = []
+        for points in self.points:
+            widths = np.diff(points)
+            self.uniform.append(
+                len(points) > 1 and np.allclose(
+                    widths, widths[0], rtol=UNIFORM_RTOL, atol=0.0))
+            with np.errstate(divide="ignore"):
+                self.inverse_widths.append(1.0 / widths)
+
+        # The knots of the cubic axes, which only depend on the axis
+        self.cubic = [
+            method == "cubic" and len(points) > SPLINE_DEGREE
+            for points in self.points]
+        self.knots = [
+            make_interp_spline(
+                points, np.zeros(len(points)), k=SPLINE_DEGREE).t
+            if cubic else None
+            for points, cubic in zip(self.points, self.cubic)]
+
+    def prefilter(self, table):
+        """
+        Convert a table of values into the table interpolated by this
+        interpolator, i.e. the tensor-product spline coefficients for the
+        cubic method (the values themselves along linear axes). This is
+        done once per table and the result should be cached.
+
+        Args:
+            table (np.ndarray)
+                The (nmodels, n_lines) values, where models are in the
+                flattened (C-ordered) grid order.
+
+        Returns:
+            np.ndarray
+                The (nmodels, n_lines) table to pass to __call__.
+        """
+
+        if not any(self.cubic):
+            return table
+
+        nlines = table.shape[1]
+        values = np.asarray(table, dtype=float).reshape(self.shape + (nlines,))
+
+        # The tensor-product coefficients are found one axis at a time
+        for axis, (points, cubic) in enumerate(zip(self.points, self.cubic)):
+            if cubic:
+                # scipy puts the interpolated axis first
+                values = np.moveaxis(make_interp_spline(
+                    points, values, k=SPLINE_DEGREE, axis=axis).c, 0, axis)
+
+        return np.ascontiguousarray(values.reshape(-1, nlines))
+
+    def get_cubic_support(self, axis_index, x, bounds_error=True):
+        """
+        Find the 4 B-splines which are non-zero at each value along a single
+        axis, and their values (the weights).
+
+        Args:
+            axis_index (int)
+                The index of the axis.
+            x (np.ndarray)
+                The values to locate, already transformed.
+            bounds_error (bool)
+                If True raise an exception for values outside the axis,
+                otherwise they are flagged as out of bounds.
+
+        Returns:
+            indices (np.ndarray)
+                The (N, 4) indices of the spline coefficients.
+            weights (np.ndarray)
+                The corresponding weights.
+            out_of_bounds (np.ndarray)
+                The (N,) boolean mask of values outside the axis.
+        """
+
+        points = self.points[axis_index]
+        knots = self.knots[axis_index]
+        k = SPLINE_DEGREE
+
+        out_of_bounds = (x < points[0]) | (x > points[-1]) | np.isnan(x)
+        if bounds_error and np.any(out_of_bounds):
+            raise exceptions.GridError(
+                f"One of the requested values is outside the grid "
+                f"({points[0]} to {points[-1]}) along axis "
+                f"{self.axes[axis_index]}.")
+
+        # Evaluate points outside the axis at its edge (they are filled)
+        x = np.where(out_of_bounds, points[0], x)
+
+        # The knot interval containing each value, clipped so the upper edge
+        # of the axis falls in the last interval
+        span = np.searchsorted(knots, x, side="right") - 1
+        span = np.clip(span, k, len(points) - 1)
+
+        weights = _get_bspline_basis(knots, span, x)
+        indices = span[:, None] - k + np.arange(k + 1)
+
+        return indices, weights, out_of_bounds
+
+    def get_cubic_stencil(self, axis_index, x):
+        """
+        Find the 4 grid points nearest each value along a single (cubic)
+        axis, i.e. the ends of the cell containing the value and the next
+        point on either side (shifted inwards at the edges of the axis).
+
+        These are the grid points a cubic interpolant is built from. The
+        weights returned by get_cubic_support are those of the B-spline
+        coefficients, which depend on every grid point along the axis, and
+        some of them vanish on the grid points, so they do not say which
+        grid points a value depends on.
+
+        Args:
+            axis_index (int)
+                The index of the axis.
+            x (np.ndarray)
+                The values to locate, already transformed.
+
+        Returns:
+            np.ndarray
+                The (N, 4) indices of the grid points.
+        """
+
+        points = self.points[axis_index]
+
+        cell = np.searchsorted(points, x, side="right") - 1
+        cell = np.clip(cell, 0, len(points) - 2)
+        first = np.clip(cell - 1, 0, len(points) - SPLINE_DEGREE - 1)
+
+        return first[:, None] + np.arange(SPLINE_DEGREE + 1)
+
+    def get_linear_support(self, axis_index, x, bounds_error=True):
+        """
+        Find the cell containing each value along a single axis and the
+        linear interpolation weights of the two bounding grid points.
+
+        Args:
+            axis_index (int)
+                The index of the axis.
+            x (np.ndarray)
+                The values to locate, already transformed.
+            bounds_error (bool)
+                If True raise an exception for values outside the axis,
+                otherwise they are flagged as out of bounds.
+
+        Returns:
+            indices (np.ndarray)
+                The (N, 2) indices of the bounding grid points, or (N, 1)
+                for an axis with a single point.
+            weights (np.ndarray)
+                The corresponding weights.
+            out_of_bounds (np.ndarray)
+                The (N,) boolean mask of values outside the axis.
+        """
+
+        points = self.points[axis_index]
+        npoints = len(points)
+
+        out_of_bounds = (x < points[0]) | (x > points[-1]) | np.isnan(x)
+        if bounds_error and np.any(out_of_bounds):
+            raise exceptions.GridError(
+                f"One of the requested values is outside the grid "
+                f"({points[0]} to {points[-1]}) along axis "
+                f"{self.axes[axis_index]}.")
+
+        # A degenerate axis only has a single point which takes all the
+        # weight
+        if npoints == 1:
+            indices = np.zeros((len(x), 1), dtype=np.intp)
+            weights = np.ones((len(x), 1))
+            return indices, weights, out_of_bounds
+
+        # The lower index of the cell, clipped so that the upper edge of the
+        # grid falls in the last cell
+        if self.uniform[axis_index]:
+            with np.errstate(invalid="ignore"):
+                lower = np.floor(
+                    (x - points[0]) * self.inverse_widths[axis_index][0])
+            lower = np.nan_to_num(lower).astype(np.intp)
+        else:
+            lower = np.searchsorted(points, x, side="right") - 1
+        lower = np.clip(lower, 0, npoints - 2)
+
+        # The fractional position within the cell
+        t = (x - points[lower]) * self.inverse_widths[axis_index][lower]
+
+        indices = np.stack([lower, lower + 1], axis=1)
+        weights = np.stack([1.0 - t, t], axis=1)
+
+        return indices, weights, out_of_bounds
+
+    def get_derivative_weights(self, axis_index, x, indices):
+        """
+        Find the derivatives, with respect to the (transformed) axis value,
+        of the weights returned by get_linear_support or get_cubic_support.
+        Contracting these in place of an axis' weights gives the partial
+        derivative along that axis.
+
+        Args:
+            axis_index (int)
+                The index of the axis.
+            x (np.ndarray)
+                The values, already transformed.
+            indices (np.ndarray)
+                The (N, m) indices of the supporting points returned with
+                the weights.
+
+        Returns:
+            np.ndarray
+                The (N, m) derivatives of the weights.
+        """
+
+        points = self.points[axis_index]
+
+        # The weight of a degenerate axis is constant
+        if len(points) == 1:
+            return np.zeros(indices.shape)
+
+        if self.cubic[axis_index]:
+            x = np.where(
+                (x < points[0]) | (x > points[-1]) | np.isnan(x), points[0], x)
+            return _get_bspline_derivatives(
+                self.knots[axis_index], indices[:, -1], x)
+
+        # The linear weights, 1 - t and t, change at the inverse cell width
+        inverse_width = self.inverse_widths[axis_index][indices[:, 0]]
+        return np.stack([-inverse_width, inverse_width], axis=1)
+
+    def transform(self, xi):
+        """
+        Transform query points into the interpolation space, i.e. take the
+        log10 of any log10 axes.
+
+        Args:
+            xi (np.ndarray)
+                The (N, n_axes) query points.
+
+        Returns:
+            np.ndarray
+                The (N, n_axes) transformed points.
+        """
+
+        xi = np.array(xi, dtype=float, ndmin=2)
+
+        if xi.shape[1] != len(self.axes):
+            raise exceptions.InconsistentParameter(
+                f"Query points should have {len(self.axes)} values (one per "
+                "axis).")
+
+        for i, log in enumerate(self.log10):
+            if log:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    xi[:, i] = np.log10(xi[:, i])
+
+        return xi
+
+    def get_support(self, xi, bounds_error=True):
+        """
+        Find the supporting grid points and weights along every axis. This
+        is the part of the interpolation shared by every line.
+
+        Args:
+            xi (np.ndarray)
+                The (N, n_axes) query points, already transformed.
+            bounds_error (bool)
+                If True raise an exception for points outside the grid.
+
+        Returns:
+            indices (list, np.ndarray)
+                For each axis the (N, m) indices of the supporting points.
+            weights (list, np.ndarray)
+                For each axis the (N, m) weights of the supporting points.
+            out_of_bounds (np.ndarray)
+                The (N,) boolean mask of points outside the grid.
+        """
+
+        indices = []
+        weights = []
+        out_of_bounds = np.zeros(len(xi), dtype=bool)
+
+        for i in range(len(self.axes)):
+            get_axis_support = (
+                self.get_cubic_support if self.cubic[i]
+                else self.get_linear_support)
+            axis_indices, axis_weights, axis_out_of_bounds = (
+                get_axis_support(i, xi[:, i], bounds_error=bounds_error))
+            indices.append(axis_indices)
+            weights.append(axis_weights)
+            out_of_bounds |= axis_out_of_bounds
+
+        return indices, weights, out_of_bounds
+
+    def contract(self, table, indices, weights):
+        """
+        Contract the per-axis weights with a table of values.
+
+        Args:
+            table (np.ndarray)
+                The (nmodels, n_lines) values, where models are in the
+                flattened (C-ordered) grid order.
+            indices (list, np.ndarray)
+                For each axis the (N, m) indices of the supporting points.
+            weights (list, np.ndarray)
+                For each axis the (N, m) weights of the supporting points.
+
+        Returns:
+            np.ndarray
+                The (N, n_lines) interpolated values.
+        """
+
+        npoints = indices[0].shape[0]
+        output = np.zeros((npoints, table.shape[1]))
+
+        if self.engine == "numba":
+            sizes = np.array([w.shape[1] for w in weights], dtype=np.intp)
+            packed_indices = np.zeros(
+                (len(indices), npoints, sizes.max()), dtype=np.intp)
+            packed_weights = np.zeros((len(indices), npoints, sizes.max()))
+            for axis, (axis_indices, axis_weights) in enumerate(
+                    zip(indices, weights)):
+                packed_indices[axis, :, :sizes[axis]] = axis_indices
+                packed_weights[axis, :, :sizes[axis]] = axis_weights
+            _contract_numba(
+                np.ascontiguousarray(table, dtype=float),
+                packed_indices,
+                packed_weights,
+                sizes,
+                self.strides,
+                output)
+            return output
+
+        # Loop over the corners of the support, i.e. every combination of
+        # supporting point along each axis.
+        for corner in itertools.product(
+                *[range(w.shape[1]) for w in weights]):
+
+            flat_index = np.zeros(npoints, dtype=np.intp)
+            corner_weight = np.ones(npoints)
+            for axis_indices, axis_weights, stride, j in zip(
+                    indices, weights, self.strides, corner):
+                flat_index += axis_indices[:, j] * stride
+                corner_weight *= axis_weights[:, j]
+
+            output += corner_weight[:, None] * table[flat_index]
+
+        return output
+
+    def __call__(
+            self,
+            table,
+            xi,
+            bounds_error=True,
+            fill_value=np.nan,
+            transformed=False,
+            mask=None,
+            ):
+        """
+        Interpolate a table of values at the query points.
+
+        Args:
+            table (np.ndarray)
+                The (nmodels, n_lines) values, where models are in the
+                flattened (C-ordered) grid order, after prefilter (i.e. the
+                spline coefficients for the cubic method).
+            xi (np.ndarray)
+                The (N, n_axes) query points (not transformed).
+            bounds_error (bool)
+                If True raise an exception for points outside the grid.
+            fill_value (float)
+                The value returned for points outside the grid if
+                bounds_error is False.
+            transformed (bool)
+                Whether xi has already been transformed into the
+                interpolation space (see transform).
+            mask (np.ndarray)
+                If provided, an (nmodels,) boolean mask of flagged models
+                (e.g. failed models). The points whose interpolation gives
+                a flagged model a non-zero weight are also returned. Along
+                cubic axes a point depends on the 4 nearest grid points
+                (see get_cubic_stencil), although the spline is also
+                weakly affected by more distant ones.
+
+        Returns:
+            values (np.ndarray)
+                The (N, n_lines) interpolated values.
+            flagged (np.ndarray)
+                If mask is provided, the (N,) boolean mask of points which
+                depend on a flagged model. Points outside the grid are not
+                flagged.
+        """
+
+        if transformed:
+            xi = np.array(xi, dtype=float, ndmin=2)
+        else:
+            xi = self.transform(xi)
+        output = np.empty((len(xi), table.shape[1]))
+
+        # The weights are non-negative, so interpolating the mask gives a
+        # non-zero value only where a flagged model contributes
+        if mask is not None:
+            mask_table = np.asarray(mask, dtype=float).reshape(-1, 1)
+            flagged = np.zeros(len(xi), dtype=bool)
+
+        # Work through the points in blocks to limit the memory used
+        for start in range(0, len(xi), POINTS_PER_BLOCK):
+            block = slice(start, start + POINTS_PER_BLOCK)
+            indices, weights, out_of_bounds = self.get_support(
+                xi[block], bounds_error=bounds_error)
+            output[block] = self.contract(table, indices, weights)
+            output[block][out_of_bounds] = fill_value
+            if mask is not None:
+                # The weights of cubic axes are those of the spline
+                # coefficients, so flag from the nearest grid points instead
+                flag_indices = list(indices)
+                flag_weights = list(weights)
+                for axis in np.flatnonzero(self.cubic):
+                    flag_indices[axis] = self.get_cubic_stencil(
+                        axis, xi[block, axis])
+                    flag_weights[axis] = np.ones(flag_indices[axis].shape)
+                flagged[block] = (self.contract(
+                    mask_table, flag_indices, flag_weights)[:, 0] > 0)
+                flagged[block][out_of_bounds] = False
+
+        if mask is not None:
+            return output, flagged
+
+        return output
+
+    def gradient(self, table, xi, bounds_error=True, fill_value=np.nan):
+        """
+        Interpolate a table of values at the query points along with the
+        partial derivatives with respect to every axis, sharing the support
+        (and weights) between them. The derivatives are with respect to the
+        axis values themselves, i.e. for log10 axes the derivative in the
+        interpolation space is divided by x ln(10).
+
+        Args:
+            table (np.ndarray)
+                The (nmodels, n_lines) values after prefilter.
+            xi (np.ndarray)
+                The (N, n_axes) query points (not transformed).
+            bounds_error (bool)
+                If True raise an exception for points outside the grid.
+            fill_value (float)
+                The value (and derivatives) returned for points outside the
+                grid if bounds_error is False.
+
+        Returns:
+            values (np.ndarray)
+                The (N, n_lines) interpolated values.
+            gradients (np.ndarray)
+                The (N, n_axes, n_lines) partial derivatives.
+        """
+
+        xi = np.array(xi, dtype=float, ndmin=2)
+        transformed = self.transform(xi)
+
+        naxes = len(self.axes)
+        values = np.empty((len(xi), table.shape[1]))
+        gradients = np.empty((len(xi), naxes, table.shape[1]))
+
+        # Work through the points in blocks to limit the memory used
+        for start in range(0, len(xi), POINTS_PER_BLOCK):
+            block = slice(start, start + POINTS_PER_BLOCK)
+            indices, weights, out_of_bounds = self.get_support(
+                transformed[block], bounds_error=bounds_error)
+
+            values[block] = self.contract(table, indices, weights)
+
+            # Each partial derivative replaces one axis' weights with their
+            # derivatives
+            for axis in range(naxes):
+                axis_weights = list(weights)
+                axis_weights[axis] = self.get_derivative_weights(
+                    axis, transformed[block, axis], indices[axis])
+                gradient = self.contract(table, indices, axis_weights)
+
+                # The chain rule for axes interpolated in log10
+                if self.log10[axis]:
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        gradient /= (xi[block, axis] * np.log(10))[:, None]
+
+                gradients[block, axis] = gradient
+
+            values[block][out_of_bounds] = fill_value
+            gradients[block][out_of_bounds] = fill_value
+
+        return values, gradients
+
+
+class LineInterpolator:
+    """
+    An interpolator for a single line with the same call signature as
+    scipy's RegularGridInterpolator, i.e. taking points already in the
+    interpolation space. This allows a GridInterpolator to be used in place
+    of scipy by Grid.setup_interpolator.
+
+    Attributes:
+        interpolator (GridInterpolator)
+            The interpolator over the grid axes.
+        table (np.ndarray)
+            The (nmodels, 1) table of values.
+    """
+
+    def __init__(self, interpolator, values):
+        """
+        Initialise the LineInterpolator.
+
+        Args:
+            interpolator (GridInterpolator)
+                The interpolator over the grid axes.
+            values (np.ndarray)
+                The values of the line with the shape of the grid.
+        """
+
+        self.interpolator = interpolator
+        self.table = interpolator.prefilter(
+            np.asarray(values, dtype=float).reshape(-1, 1))
+
+    def __call__(self, xi):
+        """
+        Interpolate the line.
+
+        Args:
+            xi (array-like)
+                The (N, n_axes) points (or a single point) in the
+                interpolation space.
+
+        Returns:
+            np.ndarray
+                The (N,) interpolated values.
+        """
+        return self.interpolator(self.table, xi, transformed=True)[:, 0]
+
+
+def _get_bspline_basis(knots, span, x, k=SPLINE_DEGREE):
+    """
+    Evaluate the non-zero B-spline basis functions (of degree k) at each
+    value with the Cox-de Boor recursion, vectorised over values.
+
+    Args:
+        knots (np.ndarray)
+            The knots.
+        span (np.ndarray)
+            The (N,) index of the knot interval containing each value.
+        x (np.ndarray)
+            The (N,) values.
+        k (int)
+            The degree.
+
+    Returns:
+        np.ndarray
+            The (N, k + 1) values of the basis functions span - k to span.
+    """
+
+    npoints = len(x)
+
+    basis = np.zeros((npoints, k + 1))
+    basis[:, 0] = 1.0
+    left = np.zeros((npoints, k + 1))
+    right = np.zeros((npoints, k + 1))
+
+    for j in range(1, k + 1):
+        left[:, j] = x - knots[span + 1 - j]
+        right[:, j] = knots[span + j] - x
+        saved = np.zeros(npoints)
+        for r in range(j):
+            temp = basis[:, r] / (right[:, r + 1] + left[:, j - r])
+            basis[:, r] = saved + right[:, r + 1] * temp
+            saved = left[:, j - r] * temp
+        basis[:, j] = saved
+
+    return basis
+
+
+def _get_bspline_derivatives(knots, span, x):
+    """
+    Evaluate the derivatives of the non-zero B-spline basis functions (of
+    degree SPLINE_DEGREE) at each value, from the basis functions of one
+    degree lower:
+
+        B'_i,k = k B_i,k-1 / (t_i+k - t_i) - k B_i+1,k-1 / (t_i+k+1 - t_i+1)
+
+    Args:
+        knots (np.ndarray)
+            The knots.
+        span (np.ndarray)
+            The (N,) index of the knot interval containing each value.
+        x (np.ndarray)
+            The (N,) values.
+
+    Returns:
+        np.ndarray
+            The (N, k + 1) derivatives of the basis functions span - k to
+            span.
+    """
+
+    k = SPLINE_DEGREE
+
+    # The basis functions span - k + 1 to span of degree k - 1, padded with
+    # the (zero) functions either side
+    lower = np.zeros((len(x), k + 2))
+    lower[:, 1:-1] = _get_bspline_basis(knots, span, x, k=k - 1)
+
+    derivatives = np.zeros((len(x), k + 1))
+    for r in range(k + 1):
+        i = span - k + r
+        with np.errstate(divide="ignore", invalid="ignore"):
+            left = np.where(
+                knots[i + k] > knots[i],
+                k * lower[:, r] / (knots[i + k] - knots[i]), 0.0)
+            right = np.where(
+                knots[i + k + 1] > knots[i + 1],
+                k * lower[:, r + 1] / (knots[i + k + 1] - knots[i + 1]), 0.0)
+        derivatives[:, r] = left - right
+
+    return derivatives
+
+
+def get_fill_passes(failed):
+    """
+    Work out how to fill the failed nodes of a grid from their neighbours.
+
+    Along each axis a failed node is estimated by linear interpolation (in
+    index) between the nearest good nodes either side of it or, at the edge
+    of the axis, by the nearest good node. The estimates of every axis with
+    a good node are averaged. Nodes with no good node along any axis are
+    filled in a later pass, once their neighbours have been filled.
+
+    The result only depends on the mask, so it is computed once and applied
+    to any number of tables with fill_table.
+
+    Args:
+        failed (np.ndarray)
+            The boolean mask of failed models with the shape of the grid.
+
+    Returns:
+        list, tuple
+            The passes, each a (targets, sources, weights) tuple, where
+            targets are the (T,) flat indices of the nodes filled by the
+            pass and sources and weights the (T, 2 n_axes) flat indices and
+            weights of the nodes they are estimated from.
+    """
+
+    failed = np.asarray(failed, dtype=bool)
+    shape = failed.shape
+    flat_indices = np.arange(failed.size).reshape(shape)
+
+    good = ~failed
+    passes = []
+
+    while not good.all():
+
+        # Nothing can be filled without any good nodes
+        if not good.any():
+            break
+
+        targets = np.flatnonzero(~good)
+        sources = np.zeros((len(targets), 2 * len(shape)), dtype=np.intp)
+        weights = np.zeros((len(targets), 2 * len(shape)))
+
+        for axis in range(len(shape)):
+
+            # The index of the nearest good node below and above each node
+            # along this axis (-1 or n if there is none)
+            n = shape[axis]
+            index = np.arange(n).reshape(
+                (1,) * axis + (n,) + (1,) * (len(shape) - axis - 1))
+            below = np.maximum.accumulate(
+                np.where(good, index, -1), axis=axis)
+            above = np.flip(np.minimum.accumulate(
+                np.flip(np.where(good, index, n), axis=axis), axis=axis),
+                axis=axis)
+
+            below = below.ravel()[targets]
+            above = above.ravel()[targets]
+            position = np.unravel_index(targets, shape)[axis]
+
+            has_below = below >= 0
+            has_above = above < n
+
+            # The linear weight of the node above (1 if there is no node
+            # below, 0 if there is no node above)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.where(
+                    has_below & has_above,
+                    (position - below) / (above - below),
+                    has_above.astype(float))
+
+            # The flat indices of the nodes either side
+            offset = flat_indices.strides[axis] // flat_indices.itemsize
+            sources[:, 2 * axis] = targets + (
+                np.where(has_below, below, position) - position) * offset
+            sources[:, 2 * axis + 1] = targets + (
+                np.where(has_above, above, position) - position) * offset
+            available = has_below | has_above
+            weights[:, 2 * axis] = np.where(available, 1.0 - t, 0.0)
+            weights[:, 2 * axis + 1] = np.where(available, t, 0.0)
+
+        # Average the estimates of the axes with a good node
+        naxes = (weights.reshape(len(targets), len(shape), 2).sum(axis=2)
+                 > 0).sum(axis=1)
+        filled = naxes > 0
+        weights[filled] /= naxes[filled, None]
+
+        passes.append((targets[filled], sources[filled], weights[filled]))
+
+        good = good.copy()
+        good.ravel()[targets[filled]] = True
+
+    return passes
+
+
+def fill_table(table, passes):
+    """
+    Fill the failed models of a table of values (see get_fill_passes).
+
+    Args:
+        table (np.ndarray)
+            The (nmodels, n_lines) values, where models are in the flattened
+            (C-ordered) grid order.
+        passes (list, tuple)
+            The passes returned by get_fill_passes.
+
+    Returns:
+        np.ndarray
+            A filled copy of the table.
+    """
+
+    table = np.array(table, dtype=float)
+
+    for targets, sources, weights in passes:
+        table[targets] = np.einsum(
+            "ts,tsl->tl", weights, table[sources])
+
+    return table
+
+
+def log10_table(table):
+    """
+    Take log10 of a table of values for interpolation in log10.
+
+    Values which are zero (or negative) have no logarithm, so are replaced
+    by a value LOG10_ZERO_DECADES below the faintest positive value in their
+    column, i.e. effectively zero once the interpolated values are raised
+    to the power 10 again, without introducing infinities. A column with no
+    positive values is set to -300 (i.e. 1e-300).
+
+    Args:
+        table (np.ndarray)
+            The (nmodels, n_lines) values.
+
+    Returns:
+        np.ndarray
+            The (nmodels, n_lines) log10 values.
+    """
+
+    table = np.asarray(table, dtype=float)
+    positive = table > 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log10_values = np.log10(table)
+
+    faintest = np.min(
+        np.where(positive, log10_values, np.inf), axis=0)
+    floor = np.where(
+        np.isfinite(faintest), faintest - LOG10_ZERO_DECADES, -300.0)
+
+    return np.where(positive, log10_values, floor)
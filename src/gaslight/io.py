@@ -0,0 +1,1162 @@
+"""
+Reading and writing of gaslight HDF5 grid files.
+
+Two on-disk layouts are supported:
+
+Layout version 1 (the original layout) stores one dataset per line for each
+quantity:
+
+    /axes/<axis>                    values of each axis
+    /wavelength/<line_id>           scalar wavelength (Angstrom)
+    /luminosity/<line_id>           array with the shape of the grid
+    /<continuum>/<line_id>          array with the shape of the grid
+
+Layout version 2 (the "line cube" layout) stores each quantity as a single
+array with the line as the leading dimension, alongside an index of the
+line ids:
+
+    /axes/<axis>                    values of each axis
+    /line_ids                       (n_lines,) line ids
+    /wavelength                     (n_lines,) wavelengths (Angstrom)
+    /luminosity                     (n_lines, *grid_shape)
+    /<continuum>                    (n_lines, *grid_shape)
+
+Version 2 files carry a "layout_version" attribute, files without it are
+version 1. With version 2 reading every line of a quantity is a single bulk
+read and reading one line is a single hyperslab read.
+
+Either layout can store the per-line quantities at reduced precision
+(float32) and/or as log10 of the values, in which case the dataset carries a
+"log10" attribute. See PRECISIONS and encode_values. Values are always
+decoded to linear values on reading.
+
+Grids written by gaslight also contain a compact metadata index, so the
+properties of a grid can be found without touching the bulk data or walking
+the per-line groups of a version 1 file:
+
+    /index                          attrs: index_version, grid_shape,
+                                    content_hash
+    /index/line_ids                 (n_lines,) line ids
+    /index/wavelength               (n_lines,) wavelengths (Angstrom)
+    /index/failed_models            grid_shape boolean mask
+
+The content hash is a SHA-256 digest of the axes, lines and stored values,
+which identifies the grid's contents independently of its file name. Files
+without an index (e.g. older grids) still work, and an index can be added
+with write_index.
+
+The GridFile class wraps a grid file of either layout, opening it only when
+data is actually requested and keeping the handle open for subsequent reads.
+This is what allows the Grid to load lines lazily.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import hashlib
+import multiprocessing
+
+import h5py
+import numpy as np
+from unyt import erg, s, Hz
+
+import gaslight.exceptions as exceptions
+
+
+# The current (default) layout version for newly written grids.
+LAYOUT_VERSION = 2
+
+# The per-line quantities stored in a grid file and their units.
+QUANTITY_UNITS = {
+    "luminosity": erg / s,
+    "nebular_continuum": erg / s / Hz,
+    "incident_continuum": erg / s / Hz,
+    "transmitted_continuum": erg / s / Hz,
+}
+
+# The continuum quantities, which are only present in some grids.
+CONTINUUM_QUANTITIES = (
+    "nebular_continuum",
+    "incident_continuum",
+    "transmitted_continuum",
+)
+
+# The named chunking strategies understood by the writers (see
+# get_chunk_shape).
+CHUNK_STRATEGIES = ("line", "slice", "auto")
+
+# The target size of a chunk for the "slice" strategy.
+SLICE_CHUNK_BYTES = 2**20
+
+# The backends available for parallel reads (see read_cubes).
+READ_BACKENDS = ("thread", "process")
+
+# The version of the metadata index (see write_index).
+INDEX_VERSION = 1
+
+# The line used to identify failed models, which have zero luminosity.
+FAILED_MODEL_LINE = "H 1 6562.80A"
+
+# The precisions the per-line quantities can be stored (or held in memory)
+# at. "mixed" stores the line luminosities as float32, which is plenty for
+# line ratios, but keeps the continua (used for equivalent widths) as
+# float64. float32 only holds values up to ~3.4e38, so brighter luminosities
+# must be stored as log10 (and held in memory at float64).
+PRECISIONS = ("float64", "float32", "mixed")
+
+
+def get_quantity_dtype(precision, quantity):
+    """
+    The data type used to store a quantity at a given precision.
+
+    Args:
+        precision (str)
+            One of PRECISIONS.
+        quantity (str)
+            The name of the quantity, e.g. "luminosity".
+
+    Returns:
+        np.dtype
+    """
+
+    if precision not in PRECISIONS:
+        raise exceptions.InconsistentParameter(
+            f"precision must be one of {PRECISIONS}.")
+
+    if precision == "float32" or (
+            precision == "mixed" and quantity == "luminosity"):
+        return np.dtype(np.float32)
+
+    return np.dtype(np.float64)
+
+
+def encode_values(values, dtype, log10=False):
+    """
+    Convert values to the form they are stored in.
+
+    Args:
+        values (np.ndarray)
+            The (linear) values.
+        dtype (np.dtype)
+            The data type to store.
+        log10 (bool)
+            Whether to store log10 of the values. Zeros are stored as -inf
+            so they survive the round trip exactly.
+
+    Returns:
+        np.ndarray
+            The values to store.
+    """
+
+    values = np.asarray(values, dtype=float)
+
+    if log10:
+        with np.errstate(divide="ignore"):
+            values = np.log10(values)
+
+    return _cast(values, dtype)
+
+
+def decode_values(values, dtype=None, log10=False):
+    """
+    Convert stored values back to linear values.
+
+    Args:
+        values (np.ndarray)
+            The stored values.
+        dtype (np.dtype)
+            The data type of the result. None keeps the stored data type
+            (or uses float64 if the values are stored as log10, since
+            float32 cannot hold luminosities above ~3e38).
+        log10 (bool)
+            Whether the values are stored as log10.
+
+    Returns:
+        np.ndarray
+            The linear values.
+    """
+
+    if log10:
+        values = 10 ** np.asarray(values, dtype=np.float64)
+
+    if dtype is None:
+        return values
+
+    return _cast(values, dtype)
+
+
+def _cast(values, dtype):
+    """
+    Cast an array to a (possibly lower precision) data type, raising an
+    exception rather than silently producing infinities on overflow.
+    """
+
+    dtype = np.dtype(dtype)
+    if values.dtype == dtype:
+        return values
+
+    with np.errstate(over="raise"):
+        try:
+            return values.astype(dtype)
+        except FloatingPointError:
+            raise exceptions.InconsistentParameter(
+                f"Values exceed the range of {dtype}, store them as log10 "
+                "or use a higher precision."
+            )
+
+
+class GridFile:
+    """
+    A wrapper around a gaslight HDF5 grid file of either layout.
+
+    The file is opened on first use and the handle kept until close() is
+    called. The handle is not pickled, instead it is reopened as needed by
+    the receiving process.
+
+    Attributes:
+        filename (str)
+            The full path to the HDF5 file.
+    """
+
+    def __init__(self, filename):
+        """
+        Initialise the GridFile. This does not open the file.
+
+        Args:
+            filename (str)
+                The full path to the HDF5 file.
+        """
+
+        self.filename = filename
+        self._hf = None
+
+        # Populated on first use
+        self._layout_version = None
+        self._line_ids = None
+        self._line_index = None
+        self._index = None
+
+    @property
+    def hf(self):
+        """
+        The open h5py.File handle, opening the file if necessary.
+        """
+        if self._hf is None or not self._hf.id.valid:
+            self._hf = h5py.File(self.filename, "r")
+        return self._hf
+
+    def close(self):
+        """
+        Close the file handle if it is open.
+        """
+        if self._hf is not None and self._hf.id.valid:
+            self._hf.close()
+        self._hf = None
+
+        # The index holds a reference to a dataset in the file
+        self._index = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_hf"] = None
+        state["_index"] = None
+        return state
+
+    @property
+    def layout_version(self):
+        """
+        The layout version of the file.
+        """
+        if self._layout_version is None:
+            self._layout_version = int(
+                self.hf.attrs.get("layout_version", 1))
+        return self._layout_version
+
+    @property
+    def index(self):
+        """
+        The metadata index of the file (see write_index) as a dictionary,
+        or None if the file does not have one.
+        """
+        if self._index is None:
+            if "index" not in self.hf:
+                self._index = False
+            else:
+                group = self.hf["index"]
+                self._index = {
+                    "line_ids": list(group["line_ids"].asstr()[()]),
+                    "wavelength": group["wavelength"][()],
+                    "grid_shape": tuple(
+                        int(n) for n in group.attrs["grid_shape"]),
+                    "failed_models": group["failed_models"],
+                    "content_hash": group.attrs["content_hash"],
+                }
+        return self._index or None
+
+    @property
+    def content_hash(self):
+        """
+        The content hash of the grid, or None if the file has no index.
+        """
+        if self.index is None:
+            return None
+        return self.index["content_hash"]
+
+    @property
+    def line_ids(self):
+        """
+        The list of all line ids in the file.
+        """
+        if self._line_ids is None:
+            if self.index is not None:
+                self._line_ids = self.index["line_ids"]
+            elif self.layout_version == 1:
+                self._line_ids = list(self.hf["luminosity"].keys())
+            else:
+                self._line_ids = list(self.hf["line_ids"].asstr()[()])
+            self._line_index = {
+                line_id: i for i, line_id in enumerate(self._line_ids)}
+        return self._line_ids
+
+    @property
+    def line_index(self):
+        """
+        A dictionary mapping each line id to its position in the file.
+        """
+        if self._line_index is None:
+            self.line_ids
+        return self._line_index
+
+    @property
+    def grid_shape(self):
+        """
+        The shape of the grid (i.e. of a single line's array).
+        """
+        if self.index is not None:
+            return self.index["grid_shape"]
+        if self.layout_version == 1:
+            return self.hf["luminosity"][self.line_ids[0]].shape
+        return self.hf["luminosity"].shape[1:]
+
+    def has_quantity(self, quantity):
+        """
+        Does the file contain the given quantity?
+
+        Args:
+            quantity (str)
+                The name of the quantity, e.g. "luminosity".
+
+        Returns:
+            bool
+        """
+        return quantity in self.hf
+
+    def read_wavelengths(self, line_ids):
+        """
+        Read the wavelength of each line.
+
+        Args:
+            line_ids (list, str)
+                The ids of the lines.
+
+        Returns:
+            dict
+                A dictionary of wavelengths (in Angstrom, without units).
+        """
+        if self.index is not None:
+            wavelengths = self.index["wavelength"]
+            return {line_id: wavelengths[self.line_index[line_id]]
+                    for line_id in line_ids}
+
+        if self.layout_version == 1:
+            return {line_id: self.hf["wavelength"][line_id][()]
+                    for line_id in line_ids}
+
+        wavelengths = self.hf["wavelength"][()]
+        return {line_id: wavelengths[self.line_index[line_id]]
+                for line_id in line_ids}
+
+    def read_failed_models(self, selection=None):
+        """
+        Read the mask of models which failed, i.e. those with zero
+        luminosity in FAILED_MODEL_LINE. The index is used if available.
+
+        Args:
+            selection (tuple)
+                A tuple of slices (one per axis) selecting a sub-volume of
+                the grid.
+
+        Returns:
+            np.ndarray
+                A boolean array with the shape of the grid (or selection).
+        """
+        if selection is None:
+            selection = ()
+        if self.index is not None:
+            return self.index["failed_models"][selection]
+        return self.read("luminosity", FAILED_MODEL_LINE, selection) == 0
+
+    def read(self, quantity, line_id, selection=None, dtype=None):
+        """
+        Read the array of a quantity for a single line.
+
+        Args:
+            quantity (str)
+                The name of the quantity, e.g. "luminosity".
+            line_id (str)
+                The id of the line.
+            selection (tuple)
+                A tuple of slices (one per axis) selecting a sub-volume of
+                the grid. Only this hyperslab is read. None reads the full
+                grid.
+            dtype (np.dtype)
+                The data type to return. None keeps the stored precision
+                (see decode_values).
+
+        Returns:
+            np.ndarray
+                The array of values with the shape of the grid (or of the
+                selection).
+        """
+        if selection is None:
+            selection = ()
+        if self.layout_version == 1:
+            dset = self.hf[quantity][line_id]
+            values = dset[selection]
+        else:
+            dset = self.hf[quantity]
+            values = dset[(self.line_index[line_id],) + selection]
+        return decode_values(
+            values, dtype=dtype, log10=dset.attrs.get("log10", False))
+
+    def read_lines(self, quantity, line_ids, selection=None, dtype=None):
+        """
+        Read the arrays of a quantity for several lines.
+
+        For version 2 files this is a single read, the returned arrays are
+        views into one (n_lines, *grid_shape) array.
+
+        Args:
+            quantity (str)
+                The name of the quantity, e.g. "luminosity".
+            line_ids (list, str)
+                The ids of the lines.
+            selection (tuple)
+                A tuple of slices (one per axis) selecting a sub-volume of
+                the grid.
+            dtype (np.dtype)
+                The data type to return. None keeps the stored precision.
+
+        Returns:
+            dict
+                A dictionary of arrays, each with the shape of the grid.
+        """
+        if self.layout_version == 1:
+            return {line_id: self.read(quantity, line_id, selection, dtype)
+                    for line_id in line_ids}
+
+        cube = self.read_cube(quantity, line_ids, selection, dtype)
+        return {line_id: cube[i] for i, line_id in enumerate(line_ids)}
+
+    def read_cube(self, quantity, line_ids, selection=None, dtype=None):
+        """
+        Read a quantity for several lines as a single array.
+
+        Args:
+            quantity (str)
+                The name of the quantity, e.g. "luminosity".
+            line_ids (list, str)
+                The ids of the lines.
+            selection (tuple)
+                A tuple of slices (one per axis) selecting a sub-volume of
+                the grid.
+            dtype (np.dtype)
+                The data type to return. None keeps the stored precision.
+
+        Returns:
+            np.ndarray
+                An array of shape (n_lines, *grid_shape), in the order of
+                line_ids.
+        """
+        if selection is None:
+            selection = ()
+
+        if self.layout_version == 1:
+            return np.stack([self.read(quantity, line_id, selection, dtype)
+                             for line_id in line_ids])
+
+        dset = self.hf[quantity]
+        indices = np.array([self.line_index[line_id]
+                            for line_id in line_ids])
+
+        # Read everything in one go if we want every line in file order
+        if np.array_equal(indices, np.arange(dset.shape[0])):
+            values = dset[(slice(None),) + selection]
+
+        # Otherwise h5py requires increasing, unique indices so read the
+        # sorted set and then reorder.
+        else:
+            unique, inverse = np.unique(indices, return_inverse=True)
+            values = dset[(unique,) + selection][inverse]
+
+        return decode_values(
+            values, dtype=dtype, log10=dset.attrs.get("log10", False))
+
+
+def _read_block(filename, quantity, line_ids, selection, dtype):
+    """
+    Read a block of lines of a quantity with a private file handle. This is
+    the task run by each worker in read_cubes.
+    """
+    grid_file = GridFile(filename)
+    try:
+        return grid_file.read_cube(quantity, line_ids, selection, dtype)
+    finally:
+        grid_file.close()
+
+
+def read_cubes(
+        filename,
+        quantities,
+        line_ids,
+        selection=None,
+        workers=4,
+        backend="thread",
+        dtypes=None,
+        ):
+    """
+    Read several quantities for several lines in parallel.
+
+    The work is split into blocks of lines (contiguous hyperslabs for
+    version 2 files, groups of datasets for version 1) for each quantity,
+    which are read concurrently, each worker using its own file handle.
+
+    h5py serialises calls into the HDF5 library within a process, so the
+    "thread" backend only overlaps the work done outside HDF5 (e.g. copying
+    and reordering). The "process" backend reads with separate processes
+    and so overlaps the reads themselves, which is what helps on parallel
+    filesystems, at the cost of starting the workers and sending the arrays
+    back to this process. The worker processes are spawned rather than
+    forked (a forked child inherits the HDF5 library state and any open
+    handles of this process) and reopen the file by path, so the caller
+    should not hold the file open while they read it.
+
+    Args:
+        filename (str)
+            The full path to the HDF5 file.
+        quantities (list, str)
+            The quantities to read, e.g. ["luminosity"].
+        line_ids (list, str)
+            The ids of the lines.
+        selection (tuple)
+            A tuple of slices (one per axis) selecting a sub-volume of the
+            grid.
+        workers (int)
+            The number of threads or processes.
+        backend (str)
+            Either "thread" or "process".
+        dtypes (dict)
+            The data type to return for each quantity. Quantities not
+            included keep their stored precision.
+
+    Returns:
+        dict
+            The (n_lines, *grid_shape) array of each quantity, in the order
+            of line_ids.
+    """
+
+    if backend not in READ_BACKENDS:
+        raise exceptions.InconsistentParameter(
+            f"backend must be one of {READ_BACKENDS}.")
+
+    if dtypes is None:
+        dtypes = {}
+
+    line_ids = list(line_ids)
+    nlines = len(line_ids)
+
+    # A few blocks per worker (per quantity) balances the load without
+    # making the blocks too small
+    nblocks = max(1, min(nlines, (2 * workers) // len(quantities) or 1))
+    bounds = np.linspace(0, nlines, nblocks + 1).astype(int)
+    blocks = [
+        (quantity, start, stop)
+        for quantity in quantities
+        for start, stop in zip(bounds[:-1], bounds[1:])
+        if stop > start]
+
+    if backend == "thread":
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"))
+
+    cubes = {}
+    with executor:
+        futures = [
+            executor.submit(
+                _read_block,
+                filename,
+                quantity,
+                line_ids[start:stop],
+                selection,
+                dtypes.get(quantity))
+            for quantity, start, stop in blocks]
+
+        # Assemble each quantity's cube as the blocks arrive
+        for (quantity, start, stop), future in zip(blocks, futures):
+            block = future.result()
+            if quantity not in cubes:
+                cubes[quantity] = np.empty(
+                    (nlines,) + block.shape[1:], dtype=block.dtype)
+            cubes[quantity][start:stop] = block
+
+    return cubes
+
+
+def get_chunk_shape(chunks, grid_shape, itemsize, layout_version):
+    """
+    Determine the chunk shape of a per-line dataset.
+
+    The named strategies are chosen to match how the Grid reads data:
+
+        "line": each chunk is a whole line's array. This is best when full
+            lines are read, i.e. opening a grid eagerly or lazily.
+        "slice": each chunk spans the trailing axes in full but only a
+            single value of the leading axes, up to roughly SLICE_CHUNK_BYTES.
+            This is best when reading sub-volumes with fixed values of the
+            leading axes (e.g. the incident grid's age and metallicity).
+        "auto": let h5py choose.
+
+    Args:
+        chunks (str, tuple or None)
+            A named strategy, an explicit chunk shape for a single line's
+            array, or None for contiguous (unchunked) storage.
+        grid_shape (tuple)
+            The shape of the grid.
+        itemsize (int)
+            The size of a single value in bytes.
+        layout_version (int)
+            The layout being written. For version 2 the chunk shape includes
+            the leading line axis (with a size of 1).
+
+    Returns:
+        tuple, bool or None
+            The chunk shape, True (for "auto") or None.
+    """
+
+    if chunks is None:
+        return None
+
+    if chunks == "auto":
+        return True
+
+    if chunks == "line":
+        line_chunks = tuple(grid_shape)
+
+    elif chunks == "slice":
+
+        # Include whole trailing axes until the chunk is big enough
+        line_chunks = [1] * len(grid_shape)
+        nbytes = itemsize
+        for axis in reversed(range(len(grid_shape))):
+            if nbytes * grid_shape[axis] > SLICE_CHUNK_BYTES:
+                line_chunks[axis] = max(
+                    1, SLICE_CHUNK_BYTES // nbytes)
+                break
+            line_chunks[axis] = grid_shape[axis]
+            nbytes *= grid_shape[axis]
+        line_chunks = tuple(line_chunks)
+
+    elif isinstance(chunks, str):
+        raise exceptions.UnrecognisedOption(
+            f"Unrecognised chunking strategy {chunks}, expected one of "
+            f"{CHUNK_STRATEGIES}, a tuple or None.")
+
+    else:
+        line_chunks = tuple(chunks)
+        if len(line_chunks) != len(grid_shape):
+            raise exceptions.InconsistentParameter(
+                "The chunk shape should have the same number of dimensions "
+                "as the grid.")
+
+    if layout_version == 1:
+        return line_chunks
+    return (1,) + line_chunks
+
+
+def parse_chunks(chunks):
+    """
+    Parse a command line chunking option, i.e. a named strategy, "none" or
+    a comma separated chunk shape.
+
+    Args:
+        chunks (str)
+            The command line option.
+
+    Returns:
+        str, tuple or None
+            The chunking option accepted by write_grid and convert_grid.
+    """
+
+    if chunks is None or chunks.lower() == "none":
+        return None
+    if chunks in CHUNK_STRATEGIES:
+        return chunks
+    return tuple(int(c) for c in chunks.split(","))
+
+
+def _get_dataset_options(
+        grid_shape,
+        dtype,
+        layout_version,
+        chunks=None,
+        compression=None,
+        compression_opts=None,
+        shuffle=False,
+        ):
+    """
+    Build the h5py create_dataset keyword arguments for a per-line dataset.
+
+    Args:
+        grid_shape (tuple)
+            The shape of the grid.
+        dtype (np.dtype)
+            The data type to be stored.
+        layout_version (int)
+            The layout being written.
+        chunks (str, tuple or None)
+            The chunking (see get_chunk_shape). Compression requires a
+            chunked dataset, in which case the "line" strategy is used if no
+            chunking is given.
+        compression (str)
+            The compression filter, e.g. "gzip" or "lzf".
+        compression_opts (int)
+            The compression level (only used by "gzip").
+        shuffle (bool)
+            Whether to apply the byte shuffle filter before compression.
+
+    Returns:
+        dict
+            The keyword arguments.
+    """
+
+    if (compression or shuffle) and chunks is None:
+        chunks = "line"
+
+    options = {}
+
+    chunk_shape = get_chunk_shape(
+        chunks, grid_shape, np.dtype(dtype).itemsize, layout_version)
+    if chunk_shape is not None:
+        options["chunks"] = chunk_shape
+    if compression:
+        options["compression"] = compression
+        if compression_opts is not None:
+            options["compression_opts"] = compression_opts
+    if shuffle:
+        options["shuffle"] = True
+
+    return options
+
+
+def _write_header(hf, axes, axes_values, attrs=None):
+    """
+    Write the attributes and axes common to both layouts.
+
+    Args:
+        hf (h5py.File)
+            The open file.
+        axes (list, str)
+            The names of the axes in order.
+        axes_values (dict)
+            The values of each axis.
+        attrs (dict)
+            Any additional attributes to store on the file.
+    """
+
+    if attrs:
+        for k, v in attrs.items():
+            hf.attrs[k] = v
+
+    # save a list of the axes in the correct order
+    hf.attrs['axes'] = list(axes)
+
+    # save the values of the axes
+    for axis in axes:
+        hf[f'axes/{axis}'] = axes_values[axis]
+
+
+def _write_lines(
+        hf,
+        line_ids,
+        wavelengths,
+        quantities,
+        layout_version,
+        precision="float64",
+        log10=False,
+        **storage,
+        ):
+    """
+    Write the line ids, wavelengths and per-line quantities.
+
+    Args:
+        hf (h5py.File)
+            The open file.
+        line_ids (list, str)
+            The ids of the lines.
+        wavelengths (list, float)
+            The wavelength of each line in Angstrom, in the order of line_ids.
+        quantities (dict)
+            The per-line quantities to store. Each value is either a single
+            (n_lines, *grid_shape) array in the order of line_ids or a
+            function returning the array for a given line id. The latter
+            allows lines to be written one at a time.
+        layout_version (int)
+            The layout to write (1 or 2).
+        precision (str)
+            The precision to store the quantities at (see PRECISIONS).
+        log10 (bool)
+            Whether to store log10 of the quantities.
+        **storage
+            The chunking and compression options (see _get_dataset_options).
+    """
+
+    if layout_version not in (1, 2):
+        raise exceptions.InconsistentParameter(
+            f"Unknown layout version {layout_version}.")
+
+    # Wrap arrays so every quantity can be accessed line by line
+    line_index = {line_id: i for i, line_id in enumerate(line_ids)}
+    getters = {}
+    for quantity, values in quantities.items():
+        if callable(values):
+            getters[quantity] = values
+        else:
+            getters[quantity] = (
+                lambda line_id, values=values: values[line_index[line_id]])
+
+    if layout_version == 1:
+        for line_id, wavelength in zip(line_ids, wavelengths):
+            hf[f'wavelength/{line_id}'] = wavelength
+        for quantity, get_values in getters.items():
+            dtype = get_quantity_dtype(precision, quantity)
+            for line_id in line_ids:
+                values = encode_values(get_values(line_id), dtype, log10)
+                dset = hf.create_dataset(
+                    f'{quantity}/{line_id}',
+                    data=values,
+                    **_get_dataset_options(
+                        values.shape, values.dtype, layout_version,
+                        **storage))
+                if log10:
+                    dset.attrs['log10'] = True
+        return
+
+    hf.attrs['layout_version'] = layout_version
+    hf.create_dataset(
+        'line_ids',
+        data=np.array(line_ids, dtype=object),
+        dtype=h5py.string_dtype())
+    hf['wavelength'] = np.array(wavelengths, dtype=float)
+
+    for quantity, values in quantities.items():
+
+        dtype = get_quantity_dtype(precision, quantity)
+
+        # Whole cubes are written in a single operation
+        if not callable(values):
+            values = encode_values(values, dtype, log10)
+            dset = hf.create_dataset(
+                quantity,
+                data=values,
+                **_get_dataset_options(
+                    values.shape[1:], values.dtype, layout_version,
+                    **storage))
+
+        else:
+            first = np.asarray(values(line_ids[0]))
+            dset = hf.create_dataset(
+                quantity,
+                shape=(len(line_ids),) + first.shape,
+                dtype=dtype,
+                **_get_dataset_options(
+                    first.shape, dtype, layout_version, **storage))
+            for i, line_id in enumerate(line_ids):
+                dset[i] = encode_values(values(line_id), dtype, log10)
+
+        if log10:
+            dset.attrs['log10'] = True
+
+
+def compute_content_hash(grid_file):
+    """
+    Compute the content hash of a grid: a SHA-256 digest of the axes, line
+    ids, wavelengths and the stored bytes of every per-line quantity. Lines
+    are read one at a time so the full grid is never held in memory. The
+    digest does not depend on the layout, chunking or compression, only on
+    the stored values.
+
+    Args:
+        grid_file (GridFile)
+            The grid file.
+
+    Returns:
+        str
+            The hexadecimal digest.
+    """
+
+    hf = grid_file.hf
+    digest = hashlib.sha256()
+
+    for axis in hf.attrs["axes"]:
+        digest.update(str(axis).encode())
+        digest.update(np.ascontiguousarray(
+            hf["axes"][axis][()], dtype=float).tobytes())
+
+    line_ids = grid_file.line_ids
+    wavelengths = grid_file.read_wavelengths(line_ids)
+    for line_id in line_ids:
+        digest.update(line_id.encode())
+        digest.update(np.float64(wavelengths[line_id]).tobytes())
+
+    for quantity in QUANTITY_UNITS:
+        if not grid_file.has_quantity(quantity):
+            continue
+        digest.update(quantity.encode())
+        for line_id in line_ids:
+            if grid_file.layout_version == 1:
+                dset = hf[quantity][line_id]
+                values = dset[()]
+            else:
+                dset = hf[quantity]
+                values = dset[grid_file.line_index[line_id]]
+            digest.update(np.ascontiguousarray(values).tobytes())
+
+    return digest.hexdigest()
+
+
+def _write_index(hf):
+    """
+    Write (or rewrite) the metadata index of an open, writable grid file.
+
+    Args:
+        hf (h5py.File)
+            The open file.
+    """
+
+    # Remove any existing index so nothing is read from it
+    if "index" in hf:
+        del hf["index"]
+
+    # Use a GridFile wrapping the open handle to read the metadata
+    grid_file = GridFile(hf.filename)
+    grid_file._hf = hf
+
+    line_ids = grid_file.line_ids
+    wavelengths = grid_file.read_wavelengths(line_ids)
+    grid_shape = grid_file.grid_shape
+
+    if FAILED_MODEL_LINE in grid_file.line_index:
+        failed_models = grid_file.read_failed_models()
+    else:
+        failed_models = np.zeros(grid_shape, dtype=bool)
+
+    content_hash = compute_content_hash(grid_file)
+
+    group = hf.create_group("index")
+    group.attrs["index_version"] = INDEX_VERSION
+    group.attrs["grid_shape"] = np.array(grid_shape, dtype=np.int64)
+    group.attrs["content_hash"] = content_hash
+    group.create_dataset(
+        "line_ids",
+        data=np.array(line_ids, dtype=object),
+        dtype=h5py.string_dtype())
+    group["wavelength"] = np.array(
+        [wavelengths[line_id] for line_id in line_ids], dtype=float)
+    group["failed_models"] = failed_models
+
+
+def write_index(filename):
+    """
+    Add (or regenerate) the metadata index of an existing grid file. Grids
+    written by write_grid and convert_grid already have one.
+
+    Args:
+        filename (str)
+            The full path to the HDF5 file.
+
+    Returns:
+        str
+            The content hash of the grid.
+    """
+
+    with h5py.File(filename, "a") as hf:
+        _write_index(hf)
+        return hf["index"].attrs["content_hash"]
+
+
+def write_grid(
+        filename,
+        axes,
+        axes_values,
+        line_ids,
+        wavelengths,
+        quantities,
+        attrs=None,
+        layout_version=LAYOUT_VERSION,
+        chunks=None,
+        compression=None,
+        compression_opts=None,
+        shuffle=False,
+        precision="float64",
+        log10=False,
+        ):
+    """
+    Write a gaslight grid file.
+
+    Args:
+        filename (str)
+            The full path of the file to create.
+        axes (list, str)
+            The names of the axes in order.
+        axes_values (dict)
+            The values of each axis.
+        line_ids (list, str)
+            The ids of the lines.
+        wavelengths (dict or array-like)
+            The wavelength of each line in Angstrom, either a dictionary
+            keyed by line id or an array in the order of line_ids.
+        quantities (dict)
+            The per-line quantities to store, e.g. "luminosity". Each value
+            is either a dictionary of arrays keyed by line id or a single
+            (n_lines, *grid_shape) array in the order of line_ids.
+        attrs (dict)
+            Any additional attributes to store on the file.
+        layout_version (int)
+            The layout to write (1 or 2).
+        chunks (str, tuple or None)
+            The chunking of the per-line datasets, either "line", "slice",
+            "auto", an explicit chunk shape for a single line or None for
+            contiguous storage. See get_chunk_shape.
+        compression (str)
+            The compression filter, e.g. "gzip" or "lzf".
+        compression_opts (int)
+            The compression level (only used by "gzip").
+        shuffle (bool)
+            Whether to apply the byte shuffle filter before compression.
+        precision (str)
+            The precision to store the per-line quantities at, one of
+            "float64", "float32" or "mixed" (float32 luminosities and
+            float64 continua).
+        log10 (bool)
+            Whether to store log10 of the per-line quantities. This allows
+            float32 storage of luminosities beyond its range (~3e38).
+    """
+
+    line_ids = list(line_ids)
+
+    if isinstance(wavelengths, dict):
+        wavelengths = [wavelengths[line_id] for line_id in line_ids]
+
+    # Dictionaries are written line by line
+    quantities = {
+        quantity: (values.__getitem__ if isinstance(values, dict)
+                   else values)
+        for quantity, values in quantities.items()}
+
+    with h5py.File(filename, "w") as hf:
+        _write_header(hf, axes, axes_values, attrs=attrs)
+        _write_lines(
+            hf,
+            line_ids,
+            wavelengths,
+            quantities,
+            layout_version,
+            chunks=chunks,
+            compression=compression,
+            compression_opts=compression_opts,
+            shuffle=shuffle,
+            precision=precision,
+            log10=log10)
+        _write_index(hf)
+
+
+def convert_grid(
+        input_filename,
+        output_filename,
+        layout_version=LAYOUT_VERSION,
+        chunks=None,
+        compression=None,
+        compression_opts=None,
+        shuffle=False,
+        precision="float64",
+        log10=False,
+        ):
+    """
+    Convert a grid file to a different layout, e.g. version 1 to version 2,
+    and/or to different chunking, compression and precision.
+
+    Lines are copied one at a time so the full grid is never held in memory.
+
+    Args:
+        input_filename (str)
+            The full path of the existing grid.
+        output_filename (str)
+            The full path of the file to create.
+        layout_version (int)
+            The layout to write (1 or 2).
+        chunks (str, tuple or None)
+            The chunking of the per-line datasets (see write_grid).
+        compression (str)
+            The compression filter, e.g. "gzip" or "lzf".
+        compression_opts (int)
+            The compression level (only used by "gzip").
+        shuffle (bool)
+            Whether to apply the byte shuffle filter before compression.
+        precision (str)
+            The precision to store the per-line quantities at, one of
+            "float64", "float32" or "mixed" (float32 luminosities and
+            float64 continua).
+        log10 (bool)
+            Whether to store log10 of the per-line quantities. This allows
+            float32 storage of luminosities beyond its range (~3e38).
+    """
+
+    grid_file = GridFile(input_filename)
+
+    try:
+        hf_in = grid_file.hf
+        line_ids = grid_file.line_ids
+        axes = list(hf_in.attrs["axes"])
+        axes_values = {axis: hf_in["axes"][axis][()] for axis in axes}
+        attrs = {k: v for k, v in hf_in.attrs.items()
+                 if k not in ("axes", "layout_version")}
+        wavelengths = grid_file.read_wavelengths(line_ids)
+
+        # Read each line from the input as it is written, as float64 so
+        # nothing is lost before it is re-encoded
+        quantities = {
+            quantity: (lambda line_id, quantity=quantity:
+                       grid_file.read(quantity, line_id, dtype=np.float64))
+            for quantity in QUANTITY_UNITS
+            if grid_file.has_quantity(quantity)}
+
+        with h5py.File(output_filename, "w") as hf:
+            _write_header(hf, axes, axes_values, attrs=attrs)
+            _write_lines(
+                hf,
+                line_ids,
+                [wavelengths[line_id] for line_id in line_ids],
+                quantities,
+                layout_version,
+                chunks=chunks,
+                compression=compression,
+                compression_opts=compression_opts,
+                shuffle=shuffle,
+                precision=precision,
+                log10=log10)
+            _write_index(hf)
+
+    finally:
+        grid_file.close()
@@ -0,0 +1,161 @@
+"""
+Lazy, dictionary-like access to the per-line quantities of a grid.
+
+A LazyQuantity behaves like the dictionaries (e.g. Grid.luminosity) created
+when a Grid is read eagerly, but only reads a line's array from the HDF5 file
+the first time it is accessed. Loaded arrays are held in an LRUCache which is
+typically shared between all the quantities of a Grid, so the total memory
+used by lazily loaded lines is bounded.
+
+A QuantityView gives a view of each array of another such mapping and is
+used by Grid views (see Grid.isel) of lazy grids.
+"""
+
+from collections.abc import Mapping
+
+from unyt import unyt_array
+
+
+class LazyQuantity(Mapping):
+    """
+    A read-only mapping from line_id to the array of a single quantity.
+
+    Attributes:
+        quantity (str)
+            The name of the quantity, e.g. "luminosity".
+        line_ids (list, str)
+            The line ids available.
+        units (unyt.Unit)
+            The units attached to the returned arrays.
+    """
+
+    def __init__(
+            self,
+            grid_file,
+            quantity,
+            line_ids,
+            units,
+            cache,
+            selection=None,
+            dtype=None,
+            ):
+        """
+        Initialise the LazyQuantity.
+
+        Args:
+            grid_file (gaslight.io.GridFile)
+                The grid file to read from.
+            quantity (str)
+                The name of the quantity, e.g. "luminosity".
+            line_ids (list, str)
+                The line ids available.
+            units (unyt.Unit)
+                The units attached to the returned arrays.
+            cache (gaslight.cache.LRUCache)
+                The cache holding loaded arrays.
+            selection (tuple)
+                A tuple of slices (one per axis) selecting the sub-volume of
+                the grid to read. None reads the full grid.
+            dtype (np.dtype)
+                The data type to hold the arrays at. None keeps the
+                precision of the file.
+        """
+
+        self.grid_file = grid_file
+        self.quantity = quantity
+        self.line_ids = line_ids
+        self.units = units
+        self.cache = cache
+        self.selection = selection
+        self.dtype = dtype
+
+        # Slices are not hashable so key the cache on their indices
+        if selection is None:
+            self._selection_key = None
+        else:
+            self._selection_key = tuple(
+                (s.start, s.stop, s.step) for s in selection)
+
+        # Set for fast membership tests
+        self._line_id_set = set(line_ids)
+
+    def __getitem__(self, line_id):
+        if line_id not in self._line_id_set:
+            raise KeyError(line_id)
+
+        array = self.cache.get_or_create(
+            self._get_key(line_id),
+            lambda: self.grid_file.read(
+                self.quantity, line_id, self.selection, self.dtype),
+        )
+
+        return unyt_array(array, self.units)
+
+    def __contains__(self, line_id):
+        return line_id in self._line_id_set
+
+    def __iter__(self):
+        return iter(self.line_ids)
+
+    def __len__(self):
+        return len(self.line_ids)
+
+    def is_loaded(self, line_id):
+        """
+        Has the line already been read (and is still held in the cache)?
+
+        Args:
+            line_id (str)
+                The id of the line.
+
+        Returns:
+            bool
+        """
+        return self._get_key(line_id) in self.cache
+
+    def _get_key(self, line_id):
+        """
+        The cache key of a line.
+        """
+        return (self.quantity, line_id, self._selection_key)
+
+
+class QuantityView(Mapping):
+    """
+    A read-only mapping giving a view (e.g. a slice) of each array of
+    another mapping, used by Grid views of lazy grids. Lines are only read
+    (through the parent mapping and its cache) when accessed.
+
+    Attributes:
+        parent (Mapping)
+            The mapping being viewed, e.g. a LazyQuantity.
+        key (tuple)
+            The index applied to each array.
+    """
+
+    def __init__(self, parent, key):
+        """
+        Initialise the QuantityView.
+
+        Args:
+            parent (Mapping)
+                The mapping being viewed.
+            key (tuple)
+                The (basic) index applied to each array, so the result is a
+                view rather than a copy.
+        """
+
+        self.parent = parent
+        self.key = key
+
+    def __getitem__(self, line_id):
+        return self.parent[line_id][self.key]
+
+    def __contains__(self, line_id):
+        return line_id in self.parent
+
+    def __iter__(self):
+        return iter(self.parent)
+
+    def __len__(self):
+        return len(self.parent)
@@ -0,0 +1,253 @@
+"""
+An index of the lines in a grid.
+
+Each line is given an integer handle (its position in Grid.line_ids). The
+LineIndex maps between handles and line ids, holds the line wavelengths as a
+sorted array for range queries and records the element and ionisation state
+parsed from each line id (e.g. "O 3 5006.84A" is a line of O III). Every Grid
+accessor which takes line ids also accepts handles.
+
+Example:
+    handles = grid.line_index.in_range(3720, 3730)
+    lines = grid.get_line_collection(handles)
+"""
+
+import numpy as np
+from unyt import unyt_array, unyt_quantity
+
+import gaslight.exceptions as exceptions
+
+
+class LineIndex:
+    """
+    A lookup table of the lines of a grid.
+
+    Attributes:
+        line_ids (list, str)
+            The line ids, in handle order.
+        wavelengths (np.ndarray)
+            The wavelength of each line in Angstrom, in handle order.
+        elements (np.ndarray)
+            The element of each line, e.g. "O".
+        ions (np.ndarray)
+            The ionisation state of each line as written in the line id,
+            e.g. "3" for O III.
+        sorted_handles (np.ndarray)
+            The handles sorted by wavelength.
+        sorted_wavelengths (np.ndarray)
+            The wavelengths sorted in increasing order.
+    """
+
+    def __init__(self, line_ids, wavelengths):
+        """
+        Initialise the LineIndex.
+
+        Args:
+            line_ids (list, str)
+                The line ids.
+            wavelengths (dict or array-like)
+                The wavelength of each line in Angstrom, either a dictionary
+                keyed by line id or an array in the order of line_ids.
+        """
+
+        self.line_ids = list(line_ids)
+
+        # The hash lookup from line id to handle
+        self._handles = {
+            line_id: handle for handle, line_id in enumerate(self.line_ids)}
+
+        if isinstance(wavelengths, dict):
+            wavelengths = [
+                _get_angstrom(wavelengths[line_id])
+                for line_id in self.line_ids]
+        self.wavelengths = np.array(wavelengths, dtype=float)
+
+        # The element and ionisation state, e.g. "O 3 5006.84A" -> O, 3
+        tokens = [line_id.split() for line_id in self.line_ids]
+        self.elements = np.array(
+            [t[0] if len(t) > 0 else "" for t in tokens], dtype=object)
+        self.ions = np.array(
+            [t[1] if len(t) > 2 else "" for t in tokens], dtype=object)
+
+        # Wavelength sorted arrays for range queries
+        self.sorted_handles = np.argsort(self.wavelengths, kind="stable")
+        self.sorted_wavelengths = self.wavelengths[self.sorted_handles]
+
+    def __len__(self):
+        return len(self.line_ids)
+
+    def __contains__(self, line):
+        if isinstance(line, (int, np.integer)):
+            return 0 <= line < len(self.line_ids)
+        return line in self._handles
+
+    def get_handle(self, line):
+        """
+        Return the handle of a line.
+
+        Args:
+            line (str or int)
+                A line id or handle.
+
+        Returns:
+            int
+                The handle.
+        """
+
+        if isinstance(line, (int, np.integer)):
+            if not 0 <= line < len(self.line_ids):
+                raise exceptions.InconsistentParameter(
+                    f"Line handle {line} is out of range.")
+            return int(line)
+
+        try:
+            return self._handles[line]
+        except (KeyError, TypeError):
+            raise exceptions.InconsistentParameter(
+                "Provided line_id is" "not in list of available lines."
+            )
+
+    def get_handles(self, lines):
+        """
+        Return the handles of several lines.
+
+        Args:
+            lines (list)
+                Line ids and/or handles.
+
+        Returns:
+            np.ndarray
+                The handles.
+        """
+        return np.array(
+            [self.get_handle(line) for line in lines], dtype=np.intp)
+
+    def get_line_id(self, line):
+        """
+        Return the id of a line.
+
+        Args:
+            line (str or int)
+                A line id or handle.
+
+        Returns:
+            str
+                The line id.
+        """
+        if isinstance(line, (int, np.integer)):
+            return self.line_ids[self.get_handle(line)]
+        self.get_handle(line)
+        return line
+
+    def get_line_ids(self, lines):
+        """
+        Return the ids of several lines.
+
+        Args:
+            lines (list)
+                Line ids and/or handles.
+
+        Returns:
+            list, str
+                The line ids.
+        """
+        return [self.get_line_id(line) for line in lines]
+
+    def in_range(self, low, high):
+        """
+        Find the lines with wavelengths in an (inclusive) range.
+
+        Args:
+            low (float or unyt_quantity)
+                The lower wavelength, in Angstrom if no units are given.
+            high (float or unyt_quantity)
+                The upper wavelength, in Angstrom if no units are given.
+
+        Returns:
+            np.ndarray
+                The handles of the lines, sorted by wavelength.
+        """
+
+        start = np.searchsorted(
+            self.sorted_wavelengths, _get_angstrom(low), side="left")
+        stop = np.searchsorted(
+            self.sorted_wavelengths, _get_angstrom(high), side="right")
+
+        return self.sorted_handles[start:stop]
+
+    def nearest(self, wavelength):
+        """
+        Find the line closest in wavelength.
+
+        Args:
+            wavelength (float or unyt_quantity)
+                The wavelength, in Angstrom if no units are given.
+
+        Returns:
+            int
+                The handle of the nearest line.
+        """
+        return int(np.abs(
+            self.wavelengths - _get_angstrom(wavelength)).argmin())
+
+    def of_element(self, element, ion=None):
+        """
+        Find the lines of an element, optionally of a single ionisation
+        state.
+
+        Args:
+            element (str)
+                The element, e.g. "O".
+            ion (int or str)
+                The ionisation state as written in the line ids, e.g. 3 for
+                O III. If None all ionisation states are included.
+
+        Returns:
+            np.ndarray
+                The handles of the lines, sorted by wavelength.
+        """
+
+        mask = self.elements[self.sorted_handles] == element
+        if ion is not None:
+            mask &= self.ions[self.sorted_handles] == str(ion)
+
+        return self.sorted_handles[mask]
+
+
+def _get_angstrom(wavelength):
+    """
+    Return a wavelength in Angstrom as a float (or array), assuming
+    Angstrom if no units are given.
+    """
+    if isinstance(wavelength, (unyt_array, unyt_quantity)):
+        return wavelength.to("Angstrom").value
+    return wavelength
+
+
+def get_blend_line_ids(blend):
+    """
+    Split a blend, given as a comma separated string of line ids (e.g.
+    "O 3 4958.91A, O 3 5006.84A" as used by synthesizer.line_ratios), into
+    its component lines.
+
+    Args:
+        blend (str, int or list)
+            A line id or blend string, an integer handle, or a list of
+            these.
+
+    Returns:
+        list
+            The component line ids (and/or handles).
+    """
+
+    if isinstance(blend, str):
+        return [line_id.strip() for line_id in blend.split(",")]
+
+    if isinstance(blend, (int, np.integer)):
+        return [blend]
+
+    line_ids = []
+    for component in blend:
+        line_ids += get_blend_line_ids(component)
+
+    return line_ids
@@ -0,0 +1,225 @@
+"""
+Sharing a loaded Grid between processes using POSIX shared memory.
+
+Grid.to_shared_memory copies the line luminosities, continua and failed
+model mask of a Grid into shared memory blocks (one per quantity, each a
+(n_lines, *grid_shape) cube) and returns a SharedGridHandle. The handle is
+small and picklable, containing only the names of the blocks and the Grid's
+metadata (axes, line ids, wavelengths etc.). Passing it to worker processes
+(e.g. as an argument to a multiprocessing.Pool task) and calling
+Grid.from_shared_memory (or handle.attach()) gives a Grid whose arrays are
+read-only, zero-copy views of the shared blocks. Pickling an attached Grid
+again sends only the handle.
+
+The process that published the grid owns the blocks and should call
+handle.unlink() (or use the handle as a context manager) once the workers
+are finished with them.
+
+Example:
+    grid = Grid(grid_name, grid_dir=grid_dir)
+    with grid.to_shared_memory() as handle:
+        with multiprocessing.Pool() as pool:
+            results = pool.map(analyse, [(handle, x) for x in tasks])
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedGridHandle:
+    """
+    A picklable reference to a Grid published in shared memory.
+
+    Attributes:
+        blocks (dict)
+            The shared memory blocks, keyed by quantity (e.g. "luminosity"
+            or "failed_models"). Each value is a (name, shape, dtype) tuple.
+        metadata (dict)
+            The remaining attributes of the published Grid.
+    """
+
+    def __init__(self, blocks, metadata, segments=None):
+        """
+        Initialise the handle.
+
+        Args:
+            blocks (dict)
+                The (name, shape, dtype) of each shared block.
+            metadata (dict)
+                The remaining attributes of the published Grid.
+            segments (list)
+                The SharedMemory objects of the publishing process. These
+                are not pickled.
+        """
+
+        self.blocks = blocks
+        self.metadata = metadata
+        self._segments = segments or []
+
+    def __getstate__(self):
+        """
+        Only the names of the blocks (and the metadata) are sent to other
+        processes.
+        """
+        state = self.__dict__.copy()
+        state["_segments"] = []
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.unlink()
+
+    @property
+    def nbytes(self):
+        """
+        The total size of the shared blocks in bytes.
+        """
+        return sum(
+            int(np.prod(shape)) * np.dtype(dtype).itemsize
+            for _, shape, dtype in self.blocks.values())
+
+    def attach(self):
+        """
+        Attach to the shared blocks, returning a Grid.
+
+        Returns:
+            gaslight.grid.Grid
+                A Grid whose arrays are views of the shared blocks.
+        """
+
+        # Imported here since gaslight.grid imports this module
+        from gaslight.grid import Grid
+
+        return Grid.from_shared_memory(self)
+
+    def attach_arrays(self):
+        """
+        Attach to the shared blocks, returning read-only views of them.
+
+        Returns:
+            arrays (dict)
+                The read-only array of each block, keyed by quantity.
+            segments (list)
+                The attached SharedMemory objects. These must be kept alive
+                for as long as the arrays are in use.
+        """
+
+        arrays = {}
+        segments = []
+        for quantity, (name, shape, dtype) in self.blocks.items():
+            segment = _open_segment(name)
+            array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+            array.flags.writeable = False
+            arrays[quantity] = array
+            segments.append(segment)
+
+        return arrays, segments
+
+    def close(self):
+        """
+        Close the publishing process' mappings of the blocks. Attached
+        Grids are unaffected.
+        """
+        for segment in self._segments:
+            segment.close()
+
+    def unlink(self):
+        """
+        Free the shared blocks. This should be called once by the publishing
+        process when they are no longer needed. Processes that are still
+        attached keep their mappings until they exit.
+        """
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+
+def _open_segment(name):
+    """
+    Open an existing shared memory block. Where possible (Python >= 3.13)
+    the block is not registered with this process' resource tracker, which
+    would otherwise unlink it when an unrelated process exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _create_block(shape, dtype):
+    """
+    Create a shared memory block and an array view of it.
+
+    Returns:
+        segment (multiprocessing.shared_memory.SharedMemory)
+            The new block.
+        array (np.ndarray)
+            A writeable view of the block.
+    """
+
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+
+    # Zero sized blocks are not allowed
+    segment = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+    array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+    return segment, array
+
+
+def share_grid(grid, quantities, metadata):
+    """
+    Copy the arrays of a Grid into shared memory.
+
+    Args:
+        grid (gaslight.grid.Grid)
+            The grid to publish.
+        quantities (list, str)
+            The per-line quantities (e.g. "luminosity") to share.
+        metadata (dict)
+            The attributes needed to recreate the grid, other than the
+            shared arrays.
+
+    Returns:
+        SharedGridHandle
+            The handle of the published grid.
+    """
+
+    blocks = {}
+    segments = []
+
+    try:
+        for quantity in quantities:
+            values = getattr(grid, quantity)
+
+            # Keep the in-memory precision of the grid
+            segment, array = _create_block(
+                (len(grid.line_ids),) + tuple(grid.grid_shape),
+                values[grid.line_ids[0]].dtype)
+            segments.append(segment)
+
+            # Copy line by line to avoid holding a second copy of the grid
+            for i, line_id in enumerate(grid.line_ids):
+                array[i] = values[line_id].ndview
+
+            blocks[quantity] = (segment.name, array.shape, array.dtype.str)
+
+        failed_models = np.asarray(grid.failed_models)
+        segment, array = _create_block(
+            failed_models.shape, failed_models.dtype)
+        segments.append(segment)
+        array[...] = failed_models
+        blocks["failed_models"] = (
+            segment.name, array.shape, array.dtype.str)
+
+    except BaseException:
+        for segment in segments:
+            segment.close()
+            segment.unlink()
+        raise
+
+    return SharedGridHandle(blocks, metadata, segments)
@@ -0,0 +1,209 @@
+"""
+Generic utilities used throughout gaslight.
+"""
+
+import numpy as np
+from unyt import unyt_array, unyt_quantity
+
+import gaslight.exceptions as exceptions
+
+
+def get_axis_slice(axis_values, spec):
+    """
+    Convert a selection on a single axis into a slice of indices.
+
+    Args:
+        axis_values (np.ndarray)
+            The (sorted) values of the axis.
+        spec (slice, tuple or float)
+            Either a slice of indices, a (low, high) tuple of values (either
+            of which can be None to leave that side open) giving an
+            inclusive range, or a single value in which case the nearest
+            grid point is selected.
+
+    Returns:
+        slice
+            The slice of the axis indices, with explicit start, stop and
+            step.
+    """
+
+    naxis = len(axis_values)
+
+    if isinstance(spec, slice):
+        start, stop, step = spec.indices(naxis)
+        if step < 1:
+            raise exceptions.InconsistentParameter(
+                "Axis slices must have a positive step.")
+        return slice(start, stop, step)
+
+    if isinstance(spec, (tuple, list)):
+        if len(spec) != 2:
+            raise exceptions.InconsistentParameter(
+                "A range of axis values should be given as (low, high).")
+
+        low, high = spec
+        mask = np.ones(naxis, dtype=bool)
+        if low is not None:
+            mask &= axis_values >= strip_units(low)
+        if high is not None:
+            mask &= axis_values <= strip_units(high)
+
+        indices = np.flatnonzero(mask)
+        if len(indices) == 0:
+            raise exceptions.InconsistentParameter(
+                f"No grid points lie in the range {spec}.")
+
+        return slice(int(indices[0]), int(indices[-1]) + 1, 1)
+
+    # Otherwise assume a single value and select the nearest point
+    index = int(np.abs(axis_values - strip_units(spec)).argmin())
+    return slice(index, index + 1, 1)
+
+
+def get_nearest_indices(axis_values, values, log10=False):
+    """
+    Find the index of the nearest grid point along an axis for an array of
+    values.
+
+    Args:
+        axis_values (np.ndarray)
+            The values of the axis.
+        values (np.ndarray)
+            The values to locate.
+        log10 (bool)
+            Whether to measure distances in log10, appropriate for
+            logarithmically spaced axes.
+
+    Returns:
+        np.ndarray
+            The index of the nearest grid point to each value.
+    """
+
+    axis_values = np.asarray(axis_values, dtype=float)
+    values = np.asarray(values, dtype=float)
+
+    if log10:
+        axis_values = np.log10(axis_values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.log10(values)
+
+    naxis = len(axis_values)
+    if naxis == 1:
+        return np.zeros(values.shape, dtype=np.intp)
+
+    # Fall back to a brute force search if the axis is not sorted
+    if np.any(np.diff(axis_values) <= 0):
+        return np.abs(values[..., None] - axis_values).argmin(axis=-1)
+
+    # Compare the grid points either side of each value. Ties go to the
+    # lower index, matching argmin.
+    upper = np.clip(np.searchsorted(axis_values, values), 1, naxis - 1)
+    lower = upper - 1
+
+    return np.where(
+        np.abs(values - axis_values[lower])
+        <= np.abs(axis_values[upper] - values),
+        lower,
+        upper)
+
+
+def get_slice_length(slice_, n):
+    """
+    Return the number of elements a slice selects from an axis of length n.
+    """
+    return len(range(*slice_.indices(n)))
+
+
+def compose_indices(outer, inner):
+    """
+    Compose two indices, so that array[outer][inner] is
+    array[compose_indices(outer, inner)].
+
+    Args:
+        outer (tuple)
+            An integer or slice (with explicit start and step) per axis of
+            the array. Axes indexed by an integer are removed.
+        inner (tuple)
+            An integer or slice (with explicit start and stop) per remaining
+            axis, i.e. per slice of outer.
+
+    Returns:
+        tuple
+            An integer or slice per axis of the array.
+    """
+
+    inner = iter(inner)
+
+    composed = []
+    for index in outer:
+        if not isinstance(index, slice):
+            composed.append(index)
+            continue
+
+        index_ = next(inner)
+        if not isinstance(index_, slice):
+            composed.append(index.start + index_ * index.step)
+            continue
+
+        composed.append(slice(
+            index.start + index_.start * index.step,
+            index.start + (index_.stop - 1) * index.step + 1,
+            index.step * (index_.step or 1)))
+
+    return tuple(composed)
+
+
+def get_hyperslabs(start, stop, shape):
+    """
+    Split a contiguous range of flat (C-ordered) indices into a grid into
+    the fewest hyperslabs, each a tuple of slices (one per axis), which
+    cover the range in order.
+
+    Args:
+        start (int)
+            The first flat index.
+        stop (int)
+            One past the last flat index.
+        shape (tuple)
+            The shape of the grid.
+
+    Returns:
+        list, tuple
+            The hyperslabs.
+    """
+
+    shape = tuple(int(n) for n in shape)
+    strides = [int(np.prod(shape[axis + 1:])) for axis in range(len(shape))]
+
+    hyperslabs = []
+    while start < stop:
+        index = np.unravel_index(start, shape)
+
+        # Find the outermost axis along which a run of whole sub-blocks
+        # (of the trailing axes) starts here and fits in the range
+        for axis in range(len(shape)):
+            if (all(i == 0 for i in index[axis + 1:])
+                    and stop - start >= strides[axis]):
+                break
+
+        n = int(min(
+            shape[axis] - index[axis], (stop - start) // strides[axis]))
+
+        hyperslabs.append(
+            tuple(slice(int(i), int(i) + 1) for i in index[:axis])
+            + (slice(int(index[axis]), int(index[axis]) + n),)
+            + tuple(slice(0, length) for length in shape[axis + 1:]))
+
+        start += n * strides[axis]
+
+    return hyperslabs
+
+
+def strip_units(value):
+    """
+    Return the value of a unyt quantity (or array), or the value itself if
+    it has no units.
+    """
+    if isinstance(value, (unyt_array, unyt_quantity)):
+        return value.value
+    return value
@@ -0,0 +1,96 @@
+"""
+Shared fixtures for the gaslight tests.
+
+The tests use a small synthetic grid with four axes (the last three log
+spaced, as in the cloudy grids), ten lines, the three continua and a few
+failed models, whose luminosities are smooth functions of the axes.
+"""
+
+import h5py
+import numpy as np
+import pytest
+
+from gaslight.grid import Grid
+
+
+LINES = {
+    "H 1 6562.80A": 6562.80,
+    "H 1 4861.32A": 4861.32,
+    "O 3 5006.84A": 5006.84,
+    "O 3 4958.91A": 4958.91,
+    "O 2 3726.03A": 3726.03,
+    "O 2 3728.81A": 3728.81,
+    "N 2 6583.45A": 6583.45,
+    "S 2 6730.82A": 6730.82,
+    "Ne 3 3868.76A": 3868.76,
+    "He 2 1640.41A": 1640.41,
+}
+
+AXES = {
+    "log10age": np.array([6.0, 6.5, 7.0, 7.5, 8.0]),
+    "metallicity": np.array([0.001, 0.002, 0.004, 0.008, 0.01, 0.02]),
+    "ionisation_parameter": np.logspace(-4, -1, 7),
+    "hydrogen_density": np.array([10.0, 100.0, 1000.0, 10000.0]),
+}
+
+CONTINUA = {
+    "nebular_continuum": 1e10,
+    "incident_continuum": 1e12,
+    "transmitted_continuum": 3e11,
+}
+
+
+def write_test_grid(filename, failed_fraction=0.03, seed=1):
+    """
+    Write the synthetic grid (in the original, one dataset per line,
+    layout) to filename.
+    """
+
+    shape = tuple(len(values) for values in AXES.values())
+    mesh = np.meshgrid(*AXES.values(), indexing="ij")
+    failed = np.random.default_rng(seed).random(shape) < failed_fraction
+
+    with h5py.File(filename, "w") as hf:
+        hf.attrs["axes"] = list(AXES)
+        hf.attrs["cloudy_version"] = "c23.01"
+        for axis, values in AXES.items():
+            hf[f"axes/{axis}"] = values
+
+        for i, (line_id, wavelength) in enumerate(LINES.items()):
+            hf[f"wavelength/{line_id}"] = wavelength
+
+            # Each line has a different dependence on the ionisation
+            # parameter, so the line ratios vary across the grid
+            luminosity = (
+                1e38 * (1 + i)
+                * (1 + mesh[0] - 6) ** 2
+                * (mesh[1] / 0.01) ** 0.5
+                * (np.log10(mesh[2]) + 5) ** (1 + 0.2 * i)
+                * (1 + 0.1 * np.log10(mesh[3])))
+            luminosity[failed] = 0.0
+            hf[f"luminosity/{line_id}"] = luminosity
+
+            for quantity, scale in CONTINUA.items():
+                continuum = scale * (1 + mesh[0]) * (1 + i) * (
+                    1 + 0.05 * np.log10(mesh[2]))
+                continuum[failed] = 0.0
+                hf[f"{quantity}/{line_id}"] = continuum
+
+
+@pytest.fixture(scope="session")
+def grid_dir(tmp_path_factory):
+    """
+    A directory containing the synthetic grid, named test-grid.
+    """
+    directory = tmp_path_factory.mktemp("grids")
+    write_test_grid(directory / "test-grid.hdf5")
+    return directory
+
+
+@pytest.fixture
+def grid(grid_dir):
+    """
+    The synthetic grid, read in full.
+    """
+    with Grid("test-grid", grid_dir=str(grid_dir)) as grid_:
+        yield grid_
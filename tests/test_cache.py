@@ -0,0 +1,145 @@
+"""
+Tests of the in-memory and persistent caches.
+"""
+
+import os
+import shutil
+
+import h5py
+import numpy as np
+
+from gaslight.cache import DiskCache
+from gaslight.grid import Grid
+from gaslight.io import write_index
+
+
+RATIO = ["O 3 5006.84A", "H 1 4861.32A"]
+
+
+def test_disk_cache_round_trip(tmp_path):
+    """
+    Arrays, dictionaries and tuples survive the round trip.
+    """
+
+    cache = DiskCache(str(tmp_path))
+    value = {"a": np.arange(5.0), "b": np.ones(3)}
+    cache.put(("key", 1), value)
+    cache.put(("key", 2), (np.ones(3), np.zeros(2)))
+
+    result = cache.get(("key", 1))
+    assert np.array_equal(result["a"], value["a"])
+    assert np.array_equal(result["b"], value["b"])
+    assert np.array_equal(cache.get(("key", 2))[1], np.zeros(2))
+    assert cache.get(("missing",)) is None
+
+
+def test_disk_cache_eviction(tmp_path):
+    """
+    The least recently used entries are deleted to respect max_bytes.
+    """
+
+    cache = DiskCache(str(tmp_path))
+    for i in range(4):
+        cache.put(("entry", i), np.zeros(1000))
+    size = cache.nbytes
+
+    cache = DiskCache(str(tmp_path), max_bytes=size // 2)
+    cache.evict()
+
+    assert cache.nbytes <= size // 2
+    assert ("entry", 3) in cache
+
+
+def test_disk_cache_reused(grid_dir, tmp_path):
+    """
+    A second session reads derived products from the persistent cache.
+    """
+
+    shutil.copy(grid_dir / "test-grid.hdf5", tmp_path / "grid.hdf5")
+    write_index(str(tmp_path / "grid.hdf5"))
+    cache_dir = str(tmp_path / "cache")
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=cache_dir) as grid:
+        ratio = np.array(grid.get_ratio(RATIO))
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=cache_dir) as grid:
+        assert np.array_equal(grid.get_ratio(RATIO), ratio, equal_nan=True)
+        assert grid.disk_cache.hits > 0
+        assert grid.disk_cache.misses == 0
+
+
+def test_disk_cache_invalidated_by_edit(grid_dir, tmp_path):
+    """
+    Editing a grid in place (without rewriting its index) invalidates the
+    persistent cache.
+    """
+
+    filename = tmp_path / "grid.hdf5"
+    shutil.copy(grid_dir / "test-grid.hdf5", filename)
+    write_index(str(filename))
+    cache_dir = str(tmp_path / "cache")
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=cache_dir) as grid:
+        ratio = np.array(grid.get_ratio(RATIO))
+
+    # Double one line without updating the content hash
+    stat = os.stat(filename)
+    with h5py.File(filename, "a") as hf:
+        hf["luminosity"][RATIO[0]][...] *= 2
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=cache_dir) as grid:
+        assert np.allclose(grid.get_ratio(RATIO), 2 * ratio, equal_nan=True)
+
+
+def test_disk_cache_survives_touch_and_copy(grid_dir, tmp_path):
+    """
+    Touching or copying a grid does not change its contents, so the
+    persistent cache is still used.
+    """
+
+    filename = tmp_path / "grid.hdf5"
+    shutil.copy(grid_dir / "test-grid.hdf5", filename)
+    write_index(str(filename))
+    cache_dir = str(tmp_path / "cache")
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=cache_dir) as grid:
+        ratio = np.array(grid.get_ratio(RATIO))
+
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=cache_dir) as grid:
+        assert np.array_equal(grid.get_ratio(RATIO), ratio, equal_nan=True)
+        assert grid.disk_cache.misses == 0
+
+    copy_dir = tmp_path / "copy"
+    copy_dir.mkdir()
+    shutil.copy(filename, copy_dir / "grid.hdf5")
+
+    with Grid("grid", grid_dir=str(copy_dir), cache_dir=cache_dir) as grid:
+        assert np.array_equal(grid.get_ratio(RATIO), ratio, equal_nan=True)
+        assert grid.disk_cache.hits > 0
+        # Only the record of the new file's state is missing
+        assert grid.disk_cache.misses == 1
+
+
+def test_disk_cache_grid_without_index(grid_dir, tmp_path):
+    """
+    A grid without an index is identified by the hash of its values.
+    """
+
+    filename = tmp_path / "grid.hdf5"
+    shutil.copy(grid_dir / "test-grid.hdf5", filename)
+    with h5py.File(filename, "a") as hf:
+        if "index" in hf:
+            del hf["index"]
+    cache_dir = str(tmp_path / "cache")
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=cache_dir) as grid:
+        assert grid.content_hash is None
+        ratio = np.array(grid.get_ratio(RATIO))
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=cache_dir) as grid:
+        assert np.array_equal(grid.get_ratio(RATIO), ratio, equal_nan=True)
+        assert grid.disk_cache.misses == 0
@@ -0,0 +1,53 @@
+"""
+Tests of the equivalent width cubes and interpolated equivalent widths.
+"""
+
+import numpy as np
+from unyt import c
+
+from conftest import LINES
+
+
+def test_equivalent_widths_at_grid_points(grid):
+    """
+    The equivalent widths cube matches L / (L_nu c / lambda^2) computed
+    from the line arrays at a grid point.
+    """
+
+    line_ids = grid.line_ids[:3]
+    grid_point = (1, 2, 3, 1)
+
+    cube = grid.get_equivalent_widths(line_ids)
+
+    luminosity, continuum = grid.get_line_arrays(
+        line_ids, grid_point=grid_point)
+    wavelength = np.array([LINES[line_id] for line_id in line_ids])
+    expected = luminosity / (
+        continuum * c.to("Angstrom/s").value / wavelength**2)
+
+    assert np.allclose(cube[(slice(None),) + grid_point], expected)
+
+
+def test_interpolated_equivalent_widths_points_equal_lines(grid):
+    """
+    The wavelength conversion is applied per line even when the number of
+    points equals the number of lines.
+    """
+
+    line_ids = ["O 3 5006.84A", "H 1 6562.80A"]
+
+    # Two grid points (so N == n_lines) which did not fail
+    good = np.argwhere(~grid.failed_models)[[0, -1]]
+    parameters = np.array([
+        [grid.axes_values[axis][i] for axis, i in zip(grid.axes, index)]
+        for index in good])
+
+    interpolated = grid.get_interpolated_equivalent_widths(
+        parameters, line_ids).value
+
+    cube = grid.get_equivalent_widths(line_ids)
+    expected = np.stack([cube[(slice(None),) + tuple(index)]
+                         for index in good])
+
+    assert interpolated.shape == (2, 2)
+    assert np.allclose(interpolated, expected)
@@ -0,0 +1,158 @@
+"""
+Tests of the handling of failed models: filling them before interpolating
+and flagging the points which depend on them.
+"""
+
+import numpy as np
+
+from gaslight.interpolation import (
+    GridInterpolator,
+    fill_table,
+    get_fill_passes,
+)
+
+from conftest import AXES
+
+
+def test_cubic_flag_uses_nearest_grid_points():
+    """
+    For the cubic method a point is flagged if and only if a failed model is
+    among the 4 grid points nearest it along every axis, including points
+    on the grid where some spline weights vanish.
+    """
+
+    axes_values = {"a": np.linspace(0.0, 7.0, 8), "b": np.linspace(0, 1, 6)}
+    interpolator = GridInterpolator(["a", "b"], axes_values, method="cubic")
+
+    mask = np.zeros((8, 6), dtype=bool)
+    mask[5, 2] = True
+
+    rng = np.random.default_rng(3)
+    # Random points and the grid points themselves (where some of the
+    # spline's basis functions vanish)
+    nodes = np.stack(np.meshgrid(
+        *axes_values.values(), indexing="ij"), axis=-1).reshape(-1, 2)
+    xi = np.concatenate([nodes, np.column_stack([
+        rng.uniform(0.0, 7.0, 500), rng.uniform(0.0, 1.0, 500)])])
+    table = interpolator.prefilter(np.ones((mask.size, 1)))
+    _, flagged = interpolator(table, xi, mask=mask.flatten())
+
+    # The ends of the cell containing the point and the next grid point on
+    # either side, moved inwards at the edges
+    expected = np.zeros(len(xi), dtype=bool)
+    for i, point in enumerate(xi):
+        stencils = []
+        for values, x in zip(axes_values.values(), point):
+            cell = min(np.sum(values <= x) - 1, len(values) - 2)
+            first = min(max(cell - 1, 0), len(values) - 4)
+            stencils.append(range(first, first + 4))
+        expected[i] = mask[np.ix_(*stencils)].any()
+
+    assert np.array_equal(flagged, expected)
+    assert flagged.any() and not flagged.all()
+
+
+def test_fill_reproduces_linear_values():
+    """
+    Failed nodes bracketed by good nodes are filled by linear interpolation
+    along the axes, so a table linear in the grid indices is filled exactly.
+    A corner takes the average of the nearest good node along each axis.
+    """
+
+    shape = (6, 5, 4)
+    mesh = np.meshgrid(*[np.arange(n) for n in shape], indexing="ij")
+    values = (1.0 + 2 * mesh[0] - mesh[1] + 0.5 * mesh[2]).reshape(shape)
+
+    failed = np.zeros(shape, dtype=bool)
+    failed[2:4, 1:4, 1:3] = True
+    failed[0, 0, 0] = True
+
+    table = np.where(failed, 0.0, values).reshape(-1, 1)
+    filled = fill_table(table, get_fill_passes(failed)).reshape(shape)
+
+    block = (slice(2, 4), slice(1, 4), slice(1, 3))
+    assert np.allclose(filled[block], values[block])
+    assert np.isclose(
+        filled[0, 0, 0], (values[1, 0, 0] + values[0, 1, 0]
+                          + values[0, 0, 1]) / 3)
+    assert np.array_equal(filled[~failed], values[~failed])
+
+    # The input is not modified
+    assert np.all(table[failed.flatten()] == 0.0)
+
+
+def test_fill_in_several_passes():
+    """
+    A node with no good node along any axis is filled once its neighbours
+    have been.
+    """
+
+    failed = np.zeros((3, 3), dtype=bool)
+    failed[1, :] = failed[:, 1] = True
+    values = np.arange(9.0).reshape(3, 3)
+
+    passes = get_fill_passes(failed)
+    table = np.where(failed, 0.0, values).reshape(-1, 1)
+    filled = fill_table(table, passes).reshape(3, 3)
+
+    assert len(passes) == 2
+    assert np.allclose(filled, values)
+
+
+def test_fill_edges_from_nearest_good_node():
+    """
+    A failed node at the end of an axis takes the nearest good value.
+    """
+
+    failed = np.array([True, True, False, False])
+    table = np.array([[0.0], [0.0], [3.0], [5.0]])
+
+    assert np.array_equal(
+        fill_table(table, get_fill_passes(failed))[:, 0], [3.0, 3.0, 3.0, 5.0])
+
+
+def test_nothing_filled_without_good_nodes():
+    """
+    A grid where every model failed cannot be filled.
+    """
+
+    failed = np.ones((3, 3), dtype=bool)
+    assert get_fill_passes(failed) == []
+
+
+def test_grid_fill_and_flag(grid):
+    """
+    Interpolating with fill_failed replaces the failed models (the filled
+    table is cached) and return_failed flags the points depending on them.
+    """
+
+    line_id = grid.line_ids[0]
+    failed = np.argwhere(grid.failed_models)[0]
+    good = np.argwhere(~grid.failed_models)[0]
+    parameters = {
+        axis: values[[failed[i], good[i]]]
+        for i, (axis, values) in enumerate(AXES.items())}
+
+    raw, flagged = grid.get_interpolated_luminosities(
+        parameters, [line_id], return_failed=True)
+    filled, filled_flagged = grid.get_interpolated_luminosities(
+        parameters, [line_id], fill_failed=True, return_failed=True)
+
+    assert list(flagged) == list(filled_flagged) == [True, False]
+    assert raw[0, 0] == 0.0
+    assert filled[0, 0] > 0.0
+    assert filled[1, 0] == raw[1, 0]
+    assert ("table", "luminosity", (line_id,), "filled") in (
+        grid.interpolator_cache)
+
+    # The filled value lies within the range of the node's good neighbours
+    neighbours = []
+    for axis in range(grid.naxes):
+        for step in (-1, 1):
+            index = failed.copy()
+            index[axis] += step
+            if (0 <= index[axis] < grid.grid_shape[axis]
+                    and not grid.failed_models[tuple(index)]):
+                neighbours.append(
+                    grid.luminosity[line_id].value[tuple(index)])
+    assert min(neighbours) <= filled[0, 0] <= max(neighbours)
@@ -0,0 +1,106 @@
+"""
+Tests of fitting observed line fluxes and ratios with a grid.
+"""
+
+import numpy as np
+import pytest
+
+from gaslight.fitting import fit_fluxes, fit_ratios
+
+
+LINE_IDS = [
+    "H 1 4861.32A", "H 1 6562.80A", "O 3 5006.84A", "O 2 3726.03A",
+    "N 2 6583.45A", "Ne 3 3868.76A"]
+
+# A model which did not fail
+TRUTH = (2, 3, 4, 1)
+
+
+def get_luminosities(grid, index):
+    return np.array([
+        grid.luminosity[line_id].ndview[index] for line_id in LINE_IDS])
+
+
+@pytest.mark.parametrize("chunk_size", [7, 2**16])
+def test_fit_fluxes_matches_brute_force(grid, chunk_size):
+    """
+    The chi-squared, normalisation and marginals match a loop over the
+    models, however the models are chunked.
+    """
+
+    assert not grid.failed_models[TRUTH]
+
+    fluxes = 3e-40 * get_luminosities(grid, TRUTH)
+    errors = 0.05 * fluxes
+    weights = 1 / errors**2
+
+    result = fit_fluxes(
+        grid, LINE_IDS, fluxes, errors, chunk_size=chunk_size,
+        return_chi2=True)
+
+    chi2 = np.full(grid.grid_shape, np.inf)
+    for index in np.ndindex(*grid.grid_shape):
+        if grid.failed_models[index]:
+            continue
+        model = get_luminosities(grid, index)
+        normalisation = np.sum(weights * fluxes * model) / np.sum(
+            weights * model**2)
+        chi2[index] = np.sum(weights * (fluxes - normalisation * model)**2)
+
+    good = np.isfinite(chi2)
+    assert np.array_equal(np.isfinite(result.chi2), good)
+    assert np.allclose(result.chi2[good], chi2[good], atol=1e-6)
+
+    # The line ratios of the test grid only depend on the ionisation
+    # parameter, so models along the other axes fit equally well
+    assert result.best_fit_index[2] == TRUTH[2]
+    assert np.isclose(result.best_fit_chi2, 0, atol=1e-6)
+    model = get_luminosities(grid, result.best_fit_index)
+    assert np.allclose(
+        result.best_fit_normalisation * model, fluxes, rtol=1e-8)
+    assert result.number_of_models == np.count_nonzero(good)
+
+    posterior = np.exp(-(chi2 - chi2[good].min()) / 2)
+    for i, axis in enumerate(grid.axes):
+        marginal = posterior.sum(
+            axis=tuple(j for j in range(grid.naxes) if j != i))
+        assert np.allclose(result.marginals[axis], marginal / marginal.sum())
+
+
+def test_fit_fluxes_without_normalisation(grid):
+    """
+    Without a free normalisation the luminosities are fitted directly.
+    """
+
+    luminosities = get_luminosities(grid, TRUTH)
+
+    result = fit_fluxes(
+        grid, LINE_IDS, luminosities, 0.05 * luminosities, normalise=False)
+
+    assert result.best_fit_index == TRUTH
+    assert result.best_fit_chi2 == 0
+
+
+def test_fit_ratios(grid):
+    """
+    Line ratios (including blends), given in log10, recover the true model.
+    """
+
+    luminosities = dict(zip(LINE_IDS, get_luminosities(grid, TRUTH)))
+    ratio_ids = [
+        ["O 3 5006.84A", "H 1 4861.32A"],
+        ["N 2 6583.45A", "H 1 6562.80A"],
+        ["O 2 3726.03A, Ne 3 3868.76A", "H 1 4861.32A"],
+    ]
+    ratios = np.log10([
+        luminosities["O 3 5006.84A"] / luminosities["H 1 4861.32A"],
+        luminosities["N 2 6583.45A"] / luminosities["H 1 6562.80A"],
+        (luminosities["O 2 3726.03A"] + luminosities["Ne 3 3868.76A"])
+        / luminosities["H 1 4861.32A"],
+    ])
+
+    result = fit_ratios(grid, ratio_ids, ratios, [0.05] * 3, log10=True)
+
+    assert result.best_fit_index[2] == TRUTH[2]
+    assert np.isclose(result.best_fit_chi2, 0, atol=1e-12)
+    assert np.isclose(sum(result.marginals["ionisation_parameter"]), 1)
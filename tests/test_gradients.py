@@ -0,0 +1,79 @@
+"""
+Tests of the analytic gradients of interpolated luminosities.
+"""
+
+import numpy as np
+import pytest
+
+from gaslight.interpolation import NUMBA_AVAILABLE
+
+from test_interpolation import LOG10_AXES, get_random_parameters
+
+
+ENGINES = ["numpy"] + (["numba"] if NUMBA_AVAILABLE else [])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("method", ["linear", "cubic"])
+@pytest.mark.parametrize("log10_luminosity", [False, True])
+def test_gradients_match_finite_differences(
+        grid, engine, method, log10_luminosity):
+    """
+    The gradients match central finite differences of the interpolated
+    luminosities with respect to every axis, including log10 axes.
+    """
+
+    line_ids = grid.line_ids[:3]
+    options = dict(
+        line_ids=line_ids,
+        log10=LOG10_AXES,
+        method=method,
+        engine=engine,
+        fill_failed=True,
+        log10_luminosity=log10_luminosity)
+
+    parameters = get_random_parameters(100, margin=0.05)
+
+    luminosity, gradients = grid.get_interpolated_gradients(
+        parameters, **options)
+
+    assert np.allclose(
+        luminosity, grid.get_interpolated_luminosities(parameters, **options))
+    assert set(gradients) == set(grid.axes)
+
+    for axis in grid.axes:
+        step = 1e-6 * np.abs(parameters[axis])
+        upper = dict(parameters, **{axis: parameters[axis] + step})
+        lower = dict(parameters, **{axis: parameters[axis] - step})
+        finite_difference = (
+            grid.get_interpolated_luminosities(upper, **options).value
+            - grid.get_interpolated_luminosities(lower, **options).value
+        ) / (2 * step[:, np.newaxis])
+
+        # Linear gradients are discontinuous at the grid points, so allow
+        # for the (rare) points whose step crosses a cell boundary
+        close = np.isclose(
+            gradients[axis].value,
+            finite_difference,
+            rtol=1e-4,
+            atol=1e-6 * np.abs(finite_difference).max())
+        assert np.mean(close) > 0.98
+
+
+def test_gradients_outside_grid(grid):
+    """
+    Points outside the grid have fill_value luminosities and gradients.
+    """
+
+    parameters = {
+        axis: np.array([values[-1] * 10]) for axis, values in
+        grid.axes_values.items()}
+
+    for log10_luminosity in (False, True):
+        luminosity, gradients = grid.get_interpolated_gradients(
+            parameters, grid.line_ids[:2], bounds_error=False,
+            fill_value=0.0, log10_luminosity=log10_luminosity)
+
+        assert np.all(luminosity.value == 0)
+        assert all(
+            np.all(gradient.value == 0) for gradient in gradients.values())
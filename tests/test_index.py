@@ -0,0 +1,118 @@
+"""
+Tests of the metadata index and content hash of grid files.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from gaslight.grid import Grid
+from gaslight.io import (
+    INDEX_VERSION,
+    GridFile,
+    compute_content_hash,
+    convert_grid,
+    write_index,
+)
+
+from conftest import AXES, LINES
+
+
+INDEX_GRID = Path(__file__).parents[1] / "tools" / "index_grid.py"
+
+
+def copy_grid(grid_dir, directory):
+    """
+    Copy the test grid (which has no index) into directory.
+    """
+    filename = directory / "grid.hdf5"
+    shutil.copy(grid_dir / "test-grid.hdf5", filename)
+    return filename
+
+
+def test_index_contents(grid, grid_dir, tmp_path):
+    """
+    The index records the lines, wavelengths, grid shape, failed models and
+    content hash of the grid.
+    """
+
+    filename = copy_grid(grid_dir, tmp_path)
+    grid_file = GridFile(str(filename))
+    assert grid_file.index is None
+    grid_file.close()
+
+    content_hash = write_index(str(filename))
+
+    with h5py.File(filename, "r") as hf:
+        group = hf["index"]
+        assert group.attrs["index_version"] == INDEX_VERSION
+        assert tuple(group.attrs["grid_shape"]) == grid.grid_shape
+        assert group.attrs["content_hash"] == content_hash
+        assert sorted(group["line_ids"].asstr()[()]) == sorted(LINES)
+        for line_id, wavelength in zip(
+                group["line_ids"].asstr()[()], group["wavelength"][()]):
+            assert wavelength == LINES[line_id]
+        assert np.array_equal(group["failed_models"][()], grid.failed_models)
+
+    with Grid("grid", grid_dir=str(tmp_path)) as indexed:
+        assert indexed.content_hash == content_hash
+        assert np.array_equal(indexed.failed_models, grid.failed_models)
+        assert indexed.axes == list(AXES)
+
+
+def test_content_hash_depends_only_on_values(grid_dir, tmp_path):
+    """
+    The content hash does not depend on the layout or storage options, but
+    changes with the stored values.
+    """
+
+    filename = copy_grid(grid_dir, tmp_path)
+    content_hash = write_index(str(filename))
+
+    converted = str(tmp_path / "converted.hdf5")
+    convert_grid(
+        str(filename), converted, layout_version=2, chunks="line",
+        compression="gzip")
+    grid_file = GridFile(converted)
+    assert grid_file.content_hash == content_hash
+    assert compute_content_hash(grid_file) == content_hash
+    grid_file.close()
+
+    with h5py.File(filename, "a") as hf:
+        hf["luminosity"]["O 3 5006.84A"][0, 0, 0, 0] *= 2
+
+    # The stored hash is only updated by write_index
+    grid_file = GridFile(str(filename))
+    assert grid_file.content_hash == content_hash
+    assert compute_content_hash(grid_file) != content_hash
+    grid_file.close()
+    assert write_index(str(filename)) != content_hash
+
+
+def test_index_grid_tool(grid_dir, tmp_path):
+    """
+    tools/index_grid.py adds the index to an existing grid.
+    """
+
+    filename = copy_grid(grid_dir, tmp_path)
+
+    result = subprocess.run(
+        [sys.executable, str(INDEX_GRID), f"-grid_dir={tmp_path}",
+         "-grid_name=grid"],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+
+    grid_file = GridFile(str(filename))
+    assert grid_file.index is not None
+    assert result.stdout.strip() == f"content hash: {grid_file.content_hash}"
+    assert compute_content_hash(grid_file) == grid_file.content_hash
+    grid_file.close()
@@ -0,0 +1,308 @@
+"""
+Tests of the interpolation of line luminosities.
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+from scipy.interpolate import RegularGridInterpolator
+from scipy.sparse.linalg import spsolve
+
+import gaslight.exceptions as exceptions
+from gaslight.grid import Grid
+from gaslight.interpolation import GridInterpolator, NUMBA_AVAILABLE
+
+from conftest import AXES
+
+
+LOG10_AXES = ["metallicity", "ionisation_parameter", "hydrogen_density"]
+
+# The contraction engines to test
+ENGINES = ["numpy"] + (["numba"] if NUMBA_AVAILABLE else [])
+
+
+def get_random_parameters(n, seed=2, margin=0.0):
+    """
+    Random parameters within the grid, drawn uniformly in the log10 space
+    of the LOG10_AXES, at least margin (in that space) from the edges.
+    """
+
+    rng = np.random.default_rng(seed)
+    parameters = {}
+    for axis, values in AXES.items():
+        if axis in LOG10_AXES:
+            low, high = np.log10(values[0]), np.log10(values[-1])
+            parameters[axis] = 10**rng.uniform(
+                low + margin, high - margin, n)
+        else:
+            parameters[axis] = rng.uniform(
+                values[0] + margin, values[-1] - margin, n)
+    return parameters
+
+
+def test_line_collection_uses_engine(grid):
+    """
+    get_interpolated_line_collection uses the engine set by
+    setup_interpolator (or passed explicitly).
+    """
+
+    line_ids = grid.line_ids[:2]
+    point = {axis: values[1] for axis, values in AXES.items()}
+
+    grid.setup_interpolator(line_ids, log10=LOG10_AXES, engine="numpy")
+    grid.interpolator_cache.clear()
+    collection = grid.get_interpolated_line_collection(point, line_ids)
+
+    for engine, used in [("numpy", True), ("auto", False)]:
+        key = grid._get_interpolator_key(None, LOG10_AXES, "linear", engine)
+        assert (key in grid.interpolator_cache) == used
+
+    line = grid.get_interpolated_line(point, line_ids[0])
+    assert np.isclose(collection[line_ids[0]].luminosity, line.luminosity)
+
+
+def test_default_engine_is_shared(grid):
+    """
+    Every interpolation method defaults to the "auto" engine, while scipy
+    remains available explicitly and agrees with it.
+    """
+
+    line_id = grid.line_ids[0]
+    point = {axis: 0.5 * (values[1] + values[2])
+             for axis, values in AXES.items()}
+
+    assert grid.interpolator_engine == "auto"
+
+    line = grid.get_interpolated_line(point, line_id, log10=LOG10_AXES)
+    key = grid._get_interpolator_key(None, LOG10_AXES, "linear", "auto")
+    assert key in grid.interpolator_cache
+
+    batched = grid.get_interpolated_luminosities(
+        point, [line_id], log10=LOG10_AXES)
+    scipy_line = grid.get_interpolated_line(
+        point, line_id, log10=LOG10_AXES, engine="scipy")
+
+    assert np.isclose(line.luminosity, batched[0, 0])
+    assert np.isclose(line.luminosity, scipy_line.luminosity)
+
+
+def test_log10_luminosity_near_failed_model(grid):
+    """
+    Interpolating log10 luminosities next to a failed model gives sensible
+    values (the failed model is filled rather than treated as ~zero).
+    """
+
+    line_ids = grid.line_ids[:3]
+
+    # A point just off a failed (interior) model
+    failed = np.argwhere(grid.failed_models)
+    interior = [
+        index for index in failed
+        if all(0 < i < n - 1 for i, n in zip(index, grid.grid_shape))]
+    index = interior[0]
+    parameters = {
+        axis: 0.9 * values[i] + 0.1 * values[i + 1]
+        for (axis, values), i in zip(AXES.items(), index)}
+
+    log10_luminosity = grid.get_interpolated_luminosities(
+        parameters, line_ids, log10=LOG10_AXES, log10_luminosity=True)
+    filled = grid.get_interpolated_luminosities(
+        parameters, line_ids, log10=LOG10_AXES, log10_luminosity=True,
+        fill_failed=True)
+    linear = grid.get_interpolated_luminosities(
+        parameters, line_ids, log10=LOG10_AXES, fill_failed=True)
+
+    assert np.allclose(log10_luminosity, filled)
+    assert np.allclose(log10_luminosity, linear, rtol=0.1)
+
+
+def interpolate_scipy(grid, line_ids, parameters, method):
+    """
+    Interpolate with scipy's RegularGridInterpolator, in the same log10
+    space. The values are scaled to order unity, and the cubic splines are
+    solved directly (rather than iteratively, scipy's default) so they are
+    exact.
+    """
+
+    options = {} if method == "linear" else {"solver": spsolve}
+
+    points = [
+        np.log10(values) if axis in LOG10_AXES else values
+        for axis, values in AXES.items()]
+    xi = np.stack([
+        np.log10(parameters[axis]) if axis in LOG10_AXES
+        else parameters[axis] for axis in AXES], axis=1)
+
+    return np.stack([
+        RegularGridInterpolator(
+            points,
+            grid.luminosity[line_id].ndview / 1e38,
+            method=method,
+            **options)(xi)
+        for line_id in line_ids], axis=1) * 1e38
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cubic_exact_for_cubic_polynomials(engine):
+    """
+    Cubic splines reproduce a cubic polynomial on non-uniform axes.
+    """
+
+    axes_values = {
+        "a": np.array([0.0, 1.0, 2.5, 3.0, 4.5, 6.0]),
+        "b": np.linspace(0.0, 1.0, 5),
+        "c": np.array([0.0, 1.0, 2.0]),
+    }
+
+    def function(a, b, c):
+        return a**3 - 2 * a * b**2 + b**3 + c
+
+    mesh = np.meshgrid(*axes_values.values(), indexing="ij")
+
+    interpolator = GridInterpolator(
+        list(axes_values), axes_values, method="cubic", engine=engine)
+    coefficients = interpolator.prefilter(function(*mesh).reshape(-1, 1))
+
+    rng = np.random.default_rng(0)
+    points = np.stack([
+        rng.uniform(values[0], values[-1], 500)
+        for values in axes_values.values()], axis=1)
+
+    assert np.allclose(
+        interpolator(coefficients, points)[:, 0], function(*points.T))
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cubic_matches_scipy(grid, engine):
+    """
+    Cubic interpolation matches scipy's (not-a-knot) cubic
+    RegularGridInterpolator.
+    """
+
+    line_ids = grid.line_ids[:3]
+    parameters = get_random_parameters(200)
+
+    luminosity = grid.get_interpolated_luminosities(
+        parameters, line_ids, log10=LOG10_AXES, method="cubic",
+        engine=engine).value
+
+    assert np.allclose(
+        luminosity,
+        interpolate_scipy(grid, line_ids, parameters, "cubic"),
+        rtol=1e-8)
+
+
+def test_cubic_coefficients_persisted_next_to_grid(grid_dir, tmp_path):
+    """
+    With cache_dir=True the spline coefficients are stored next to the grid
+    and reused by later sessions.
+    """
+
+    shutil.copy(grid_dir / "test-grid.hdf5", tmp_path / "grid.hdf5")
+    parameters = get_random_parameters(10)
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=True) as grid:
+        luminosity = grid.get_interpolated_luminosities(
+            parameters, log10=LOG10_AXES, method="cubic")
+
+    assert os.listdir(tmp_path / "grid.cache")
+
+    with Grid("grid", grid_dir=str(tmp_path), cache_dir=True) as grid:
+        assert np.array_equal(
+            grid.get_interpolated_luminosities(
+                parameters, log10=LOG10_AXES, method="cubic"),
+            luminosity)
+        assert grid.disk_cache.misses == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_linear_matches_scipy(grid, engine):
+    """
+    Linear interpolation, with log10 axes, matches scipy's
+    RegularGridInterpolator.
+    """
+
+    line_ids = grid.line_ids[:4]
+    parameters = get_random_parameters(500)
+
+    luminosity = grid.get_interpolated_luminosities(
+        parameters, line_ids, log10=LOG10_AXES, engine=engine).value
+
+    assert np.allclose(
+        luminosity,
+        interpolate_scipy(grid, line_ids, parameters, "linear"),
+        rtol=1e-12)
+
+
+@pytest.mark.parametrize("scale", [1e-12, 1.0, 1e12])
+def test_uniform_axes_detected_at_any_scale(scale):
+    """
+    Uniform spacing is judged relative to the spacing, so axes of very
+    small or very large values are classified (and interpolated) correctly.
+    """
+
+    axes_values = {
+        "uniform": scale * np.array([1.0, 2.0, 3.0, 4.0]),
+        "nonuniform": scale * np.array([1.0, 2.0, 5.0, 6.0]),
+    }
+    interpolator = GridInterpolator(list(axes_values), axes_values)
+
+    assert interpolator.uniform == [True, False]
+
+    # A function linear in each axis is reproduced exactly
+    mesh = np.meshgrid(*axes_values.values(), indexing="ij")
+    table = (mesh[0] + 3 * mesh[1]).reshape(-1, 1) / scale
+    points = scale * np.array([[1.5, 4.5], [3.9, 2.2], [2.0, 5.5]])
+
+    assert np.allclose(
+        interpolator(table, points)[:, 0],
+        (points[:, 0] + 3 * points[:, 1]) / scale)
+
+
+def test_batched_matches_single_points(grid):
+    """
+    Interpolating many lines at many points at once gives the same values
+    as interpolating each line at each point, from either a dictionary of
+    arrays or an (N, n_axes) array.
+    """
+
+    line_ids = grid.line_ids[:4]
+    parameters = get_random_parameters(20)
+
+    luminosity = grid.get_interpolated_luminosities(
+        parameters, line_ids, log10=LOG10_AXES)
+    array = np.column_stack([parameters[axis] for axis in grid.axes])
+    from_array = grid.get_interpolated_luminosities(
+        array, line_ids, log10=LOG10_AXES)
+
+    assert luminosity.shape == (20, 4)
+    assert np.array_equal(luminosity, from_array)
+
+    for i in range(20):
+        point = {axis: values[i] for axis, values in parameters.items()}
+        for j, line_id in enumerate(line_ids):
+            line = grid.get_interpolated_line(
+                point, line_id, log10=LOG10_AXES)
+            assert np.isclose(luminosity[i, j], line.luminosity, rtol=1e-12)
+
+
+def test_batched_points_outside_grid(grid):
+    """
+    Points outside the grid either raise or are filled with fill_value, and
+    scalar parameters broadcast against arrays.
+    """
+
+    parameters = {axis: values[1] for axis, values in AXES.items()}
+    parameters["log10age"] = np.array([6.2, 9.0])
+
+    with pytest.raises(exceptions.GridError):
+        grid.get_interpolated_luminosities(parameters)
+
+    luminosity = grid.get_interpolated_luminosities(
+        parameters, bounds_error=False, fill_value=-1.0)
+
+    assert luminosity.shape == (2, grid.number_of_lines)
+    assert np.all(luminosity[1] == -1.0)
+    assert np.all(luminosity[0] > 0)
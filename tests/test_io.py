@@ -0,0 +1,156 @@
+"""
+Tests of reading, writing and converting grid files.
+"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from gaslight.grid import Grid
+from gaslight.io import GridFile, convert_grid, write_grid
+
+from conftest import AXES, CONTINUA
+
+
+QUANTITIES = ("luminosity",) + tuple(CONTINUA)
+
+
+def read_all(filename):
+    """
+    Read every quantity of every line of a grid file, keyed by quantity and
+    line id.
+    """
+    grid_file = GridFile(filename)
+    values = {
+        quantity: {
+            line_id: grid_file.read(quantity, line_id)
+            for line_id in grid_file.line_ids}
+        for quantity in QUANTITIES}
+    grid_file.close()
+    return values
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"chunks": "line", "compression": "gzip", "compression_opts": 4,
+     "shuffle": True},
+    {"chunks": "slice", "compression": "lzf"},
+])
+def test_layout_round_trip(grid_dir, tmp_path, options):
+    """
+    Converting version 1 to version 2 and back preserves every line.
+    """
+
+    original = str(grid_dir / "test-grid.hdf5")
+    v2 = str(tmp_path / "v2.hdf5")
+    v1 = str(tmp_path / "v1.hdf5")
+
+    convert_grid(original, v2, layout_version=2, **options)
+    convert_grid(v2, v1, layout_version=1, **options)
+
+    assert GridFile(v2).layout_version == 2
+    assert GridFile(v1).layout_version == 1
+
+    expected = read_all(original)
+    for filename in (v2, v1):
+        values = read_all(filename)
+        for quantity in QUANTITIES:
+            assert values[quantity].keys() == expected[quantity].keys()
+            for line_id, array in expected[quantity].items():
+                assert np.array_equal(values[quantity][line_id], array)
+
+
+def test_line_order_preserved_by_cube_reads(grid_dir, tmp_path):
+    """
+    Cube reads follow the requested line order, whatever the order the lines
+    are stored in.
+    """
+
+    grid_file = GridFile(str(grid_dir / "test-grid.hdf5"))
+    line_ids = grid_file.line_ids[::-1]
+    cube = grid_file.read_cube("luminosity", line_ids)
+
+    filename = str(tmp_path / "reversed.hdf5")
+    write_grid(
+        filename,
+        list(AXES),
+        AXES,
+        line_ids,
+        grid_file.read_wavelengths(line_ids),
+        {"luminosity": cube},
+        layout_version=2)
+    grid_file.close()
+
+    converted = str(tmp_path / "converted.hdf5")
+    convert_grid(filename, converted, layout_version=1)
+
+    for name in (filename, converted):
+        grid_file = GridFile(name)
+        assert np.array_equal(
+            grid_file.read_cube("luminosity", line_ids), cube)
+        grid_file.close()
+
+
+def test_grids_of_either_layout_agree(grid_dir, tmp_path):
+    """
+    A Grid reads the same lines and failed models from either layout.
+    """
+
+    convert_grid(
+        str(grid_dir / "test-grid.hdf5"), str(tmp_path / "v2.hdf5"),
+        layout_version=2)
+
+    with Grid("test-grid", grid_dir=str(grid_dir)) as v1, \
+            Grid("v2", grid_dir=str(tmp_path)) as v2:
+        assert sorted(v1.line_ids) == sorted(v2.line_ids)
+        assert np.array_equal(v1.failed_models, v2.failed_models)
+        for line_id in v1.line_ids:
+            assert np.array_equal(
+                v1.luminosity[line_id], v2.luminosity[line_id])
+
+
+PARALLEL_READ_SCRIPT = """
+import sys
+
+import numpy as np
+
+from gaslight.grid import Grid
+
+grid_dir = sys.argv[1]
+parameters = {"log10age": 6.5, "metallicity": 0.01,
+              "ionisation_parameter": 1e-3, "hydrogen_density": 100.0}
+
+values = {}
+for backend in ("thread", "process"):
+    with Grid("test-grid", grid_dir=grid_dir, read_workers=2,
+              read_backend=backend) as grid:
+        values[backend] = [
+            grid.luminosity[line_id].value for line_id in grid.line_ids]
+        values[backend].append(
+            np.asarray(grid.get_interpolated_line(
+                parameters, grid.line_ids[0]).luminosity))
+
+for thread_values, process_values in zip(values["thread"],
+                                         values["process"]):
+    np.testing.assert_array_equal(thread_values, process_values)
+"""
+
+
+def test_process_reads_match_thread_reads(grid_dir):
+    """
+    Reading with worker processes gives the same grid as reading with
+    threads, and the interpreter still exits once an interpolator has been
+    used.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, "-c", PARALLEL_READ_SCRIPT, str(grid_dir)],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
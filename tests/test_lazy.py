@@ -0,0 +1,110 @@
+"""
+Tests of the LRU cache and lazy loading of lines.
+"""
+
+import numpy as np
+
+from gaslight.cache import LRUCache
+from gaslight.grid import Grid
+
+
+def test_lru_item_budget():
+    """
+    The least recently used item is evicted once max_items is exceeded, and
+    reading an item marks it as recently used.
+    """
+
+    cache = LRUCache(max_items=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert len(cache) == 2
+
+
+def test_lru_byte_budget():
+    """
+    Entries are evicted to keep the total size within max_bytes, and a value
+    larger than the budget on its own is not cached.
+    """
+
+    cache = LRUCache(max_bytes=2000)
+    for i in range(3):
+        cache.put(i, np.zeros(100))
+
+    assert 0 not in cache
+    assert 1 in cache and 2 in cache
+    assert cache.nbytes == 1600
+
+    cache.put("large", np.zeros(1000))
+    assert "large" not in cache
+    assert cache.nbytes == 1600
+
+
+def test_lru_get_or_create():
+    """
+    A value is only created once and the hits and misses are counted.
+    """
+
+    cache = LRUCache()
+    calls = []
+
+    def create():
+        calls.append(1)
+        return np.arange(3)
+
+    for _ in range(3):
+        value = cache.get_or_create("key", create)
+
+    assert np.array_equal(value, np.arange(3))
+    assert len(calls) == 1
+    assert cache.stats() == {
+        "items": 1, "nbytes": value.nbytes, "hits": 2, "misses": 1}
+
+
+def test_lazy_lines_match_eager(grid, grid_dir):
+    """
+    A lazy grid reads each line when first accessed, giving the same values
+    as an eagerly read grid.
+    """
+
+    with Grid("test-grid", grid_dir=str(grid_dir), lazy=True) as lazy:
+        line_id = lazy.line_ids[3]
+        assert not lazy.luminosity.is_loaded(line_id)
+
+        assert np.array_equal(lazy.luminosity[line_id],
+                              grid.luminosity[line_id])
+        assert lazy.luminosity.is_loaded(line_id)
+        assert not lazy.nebular_continuum.is_loaded(line_id)
+
+        line = lazy.get_line(line_id)
+        expected = grid.get_line(line_id)
+        assert np.array_equal(line.luminosity, expected.luminosity)
+        assert np.array_equal(line.continuum, expected.continuum)
+
+
+def test_lazy_cache_budget(grid, grid_dir):
+    """
+    The lines held by a lazy grid stay within max_cache_bytes, evicted lines
+    being read again when needed.
+    """
+
+    line_nbytes = grid.luminosity[grid.line_ids[0]].nbytes
+
+    with Grid("test-grid", grid_dir=str(grid_dir), lazy=True,
+              max_cache_bytes=2 * line_nbytes) as lazy:
+        for line_id in lazy.line_ids[:5]:
+            lazy.luminosity[line_id]
+            assert lazy.line_cache.nbytes <= 2 * line_nbytes
+
+        assert len(lazy.line_cache) == 2
+        assert not lazy.luminosity.is_loaded(lazy.line_ids[0])
+        assert lazy.luminosity.is_loaded(lazy.line_ids[4])
+
+        line_id = lazy.line_ids[0]
+        assert np.array_equal(lazy.luminosity[line_id],
+                              grid.luminosity[line_id])
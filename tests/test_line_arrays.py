@@ -0,0 +1,167 @@
+"""
+Tests of the unit-free line arrays and their covering and escape fractions.
+"""
+
+import numpy as np
+import pytest
+
+import gaslight.exceptions as exceptions
+
+from conftest import AXES
+
+
+def get_expected(grid, line_ids, covering_fraction, escape_fraction):
+    """
+    The luminosities and continua of the lines over the full grid, combined
+    directly from the stored arrays.
+    """
+
+    luminosity = np.array([
+        covering_fraction * grid.luminosity[line_id].value
+        for line_id in line_ids])
+    continuum = np.array([
+        covering_fraction * (
+            grid.nebular_continuum[line_id].value
+            + escape_fraction * grid.transmitted_continuum[line_id].value)
+        + (1 - covering_fraction) * escape_fraction
+        * grid.incident_continuum[line_id].value
+        for line_id in line_ids])
+
+    return luminosity, continuum
+
+
+def test_scalar_fractions(grid):
+    """
+    Scalar fractions scale the full grid cubes of every line.
+    """
+
+    line_ids = grid.line_ids[:3]
+    luminosity, continuum = grid.get_line_arrays(
+        line_ids, covering_fraction=0.7, incident_escape_fraction=0.2)
+    expected = get_expected(grid, line_ids, 0.7, 0.2)
+
+    assert luminosity.shape == (3,) + grid.grid_shape
+    assert np.allclose(luminosity, expected[0], rtol=1e-14)
+    assert np.allclose(continuum, expected[1], rtol=1e-14)
+
+
+def test_fractions_broadcast_with_leading_dimensions(grid):
+    """
+    Fractions with leading dimensions give every scenario in one
+    evaluation, matching the scalar results.
+    """
+
+    line_ids = grid.line_ids[:2]
+    covering_fraction = np.array([0.1, 0.5, 1.0]).reshape(3, 1, 1, 1, 1)
+    escape_fraction = np.array([0.3, 0.9]).reshape(2, 1, 1, 1, 1, 1)
+
+    luminosity, continuum = grid.get_line_arrays(
+        line_ids,
+        covering_fraction=covering_fraction,
+        incident_escape_fraction=escape_fraction)
+
+    # The luminosities do not depend on the escape fraction, so that
+    # dimension has length one
+    assert luminosity.shape == (2, 1, 3) + grid.grid_shape
+    assert continuum.shape == (2, 2, 3) + grid.grid_shape
+
+    for i, fesc in enumerate(escape_fraction.flatten()):
+        for j, fcov in enumerate(covering_fraction.flatten()):
+            expected = get_expected(grid, line_ids, fcov, fesc)
+            assert np.allclose(luminosity[:, 0, j], expected[0], rtol=1e-14)
+            assert np.allclose(continuum[:, i, j], expected[1], rtol=1e-14)
+
+
+def test_grid_points(grid):
+    """
+    A single grid point, an array of grid points or parameter values select
+    from the full grid cubes.
+    """
+
+    line_ids = grid.line_ids[:2]
+    full = grid.get_line_arrays(line_ids, covering_fraction=0.5)
+
+    luminosity, continuum = grid.get_line_arrays(
+        line_ids, covering_fraction=0.5, grid_point=(1, 2, 3, 0))
+    assert luminosity.shape == (2,)
+    assert np.array_equal(luminosity, full[0][:, 1, 2, 3, 0])
+    assert np.array_equal(continuum, full[1][:, 1, 2, 3, 0])
+
+    points = np.array([[0, 0, 0, 0], [4, 5, 6, 3]])
+    covering_fraction = np.array([0.5, 0.25])
+    luminosity, _ = grid.get_line_arrays(
+        line_ids, covering_fraction=covering_fraction, grid_point=points)
+    assert luminosity.shape == (2, 2)
+    assert np.allclose(
+        luminosity.T,
+        [full[0][:, 0, 0, 0, 0], 0.5 * full[0][:, 4, 5, 6, 3]])
+
+    parameters = {axis: values[[1, 2]] for axis, values in AXES.items()}
+    luminosity, _ = grid.get_line_arrays(
+        line_ids, covering_fraction=0.5, grid_point=parameters)
+    assert np.array_equal(
+        luminosity.T, [full[0][:, 1, 1, 1, 1], full[0][:, 2, 2, 2, 2]])
+
+
+def test_fractions_must_broadcast(grid):
+    """
+    Fractions which do not broadcast against the grid are rejected.
+    """
+
+    with pytest.raises(exceptions.InconsistentParameter):
+        grid.get_line_arrays(covering_fraction=np.ones(3))
+
+
+def test_per_model_fractions(grid):
+    """
+    get_line accepts fractions with the shape of the grid, one per model.
+    """
+
+    line_id = grid.line_ids[2]
+    rng = np.random.default_rng(6)
+    covering_fraction = rng.uniform(0, 1, grid.grid_shape)
+    escape_fraction = rng.uniform(0, 1, grid.grid_shape)
+
+    line = grid.get_line(
+        line_id,
+        covering_fraction=covering_fraction,
+        incident_escape_fraction=escape_fraction)
+    expected = get_expected(
+        grid, [line_id], covering_fraction, escape_fraction)
+
+    assert np.allclose(line.luminosity.value, expected[0][0], rtol=1e-14)
+    assert np.allclose(line.continuum.value, expected[1][0], rtol=1e-14)
+
+
+def test_scenarios_at_grid_point(grid):
+    """
+    At a grid point, arrays of fractions give one value per scenario.
+    """
+
+    line_ids = grid.line_ids[:3]
+    grid_point = (2, 3, 4, 1)
+    covering_fraction = np.linspace(0, 1, 5)
+
+    line = grid.get_line_at_grid_point(
+        grid_point, line_ids[0], covering_fraction=covering_fraction,
+        incident_escape_fraction=0.5)
+    expected = get_expected(grid, line_ids, 1.0, 0.5)
+
+    assert line.luminosity.shape == (5,)
+    assert np.allclose(
+        line.luminosity.value,
+        covering_fraction * expected[0][(0,) + grid_point], rtol=1e-14)
+
+    collection = grid.get_line_collection_at_grid_point(
+        grid_point, line_ids, covering_fraction=covering_fraction,
+        incident_escape_fraction=0.5)
+
+    for i, line_id in enumerate(line_ids):
+        continuum = (
+            covering_fraction * (
+                grid.nebular_continuum[line_id].value[grid_point]
+                + 0.5 * grid.transmitted_continuum[line_id].value[grid_point])
+            + (1 - covering_fraction) * 0.5
+            * grid.incident_continuum[line_id].value[grid_point])
+        assert np.allclose(
+            collection[line_id].continuum.value, continuum, rtol=1e-14)
@@ -0,0 +1,117 @@
+"""
+Tests of the line index and integer line handles.
+"""
+
+import numpy as np
+import pytest
+from unyt import nm
+
+import gaslight.exceptions as exceptions
+from gaslight.lines import LineIndex, get_blend_line_ids
+
+from conftest import LINES
+
+
+@pytest.fixture
+def index():
+    """
+    A LineIndex of the test lines.
+    """
+    return LineIndex(list(LINES), LINES)
+
+
+def test_handles(index):
+    """
+    Handles and line ids map onto each other, and unknown lines or handles
+    out of range are rejected.
+    """
+
+    for handle, line_id in enumerate(LINES):
+        assert index.get_handle(line_id) == handle
+        assert index.get_handle(np.int64(handle)) == handle
+        assert index.get_line_id(handle) == line_id
+        assert index.get_line_id(line_id) == line_id
+
+    assert index.get_line_ids([2, "H 1 6562.80A"]) == [
+        "O 3 5006.84A", "H 1 6562.80A"]
+    assert 3 in index and len(LINES) not in index
+    assert "H 1 6562.80A" in index and "X 1 1.00A" not in index
+
+    for line in ["X 1 1.00A", len(LINES), -1]:
+        with pytest.raises(exceptions.InconsistentParameter):
+            index.get_handle(line)
+
+
+def test_in_range(index):
+    """
+    Range queries are inclusive, sorted by wavelength and accept units.
+    """
+
+    handles = index.in_range(3720, 3730)
+    assert index.get_line_ids(handles) == ["O 2 3726.03A", "O 2 3728.81A"]
+
+    handles = index.in_range(4861.32, 5006.84)
+    assert index.get_line_ids(handles) == [
+        "H 1 4861.32A", "O 3 4958.91A", "O 3 5006.84A"]
+
+    assert np.array_equal(index.in_range(372 * nm, 373 * nm),
+                          index.in_range(3720, 3730))
+    assert len(index.in_range(7000, 8000)) == 0
+
+    # Every line is returned in order of wavelength
+    handles = index.in_range(0, np.inf)
+    assert np.all(np.diff(index.wavelengths[handles]) > 0)
+    assert sorted(handles) == list(range(len(LINES)))
+
+
+def test_nearest(index):
+    """
+    The line closest in wavelength is found, with or without units.
+    """
+
+    assert index.get_line_id(index.nearest(6560)) == "H 1 6562.80A"
+    assert index.get_line_id(index.nearest(386.9 * nm)) == "Ne 3 3868.76A"
+    assert index.get_line_id(index.nearest(0)) == "He 2 1640.41A"
+
+
+def test_of_element(index):
+    """
+    Lines are selected by element and, optionally, ionisation state.
+    """
+
+    assert index.get_line_ids(index.of_element("O")) == [
+        "O 2 3726.03A", "O 2 3728.81A", "O 3 4958.91A", "O 3 5006.84A"]
+    assert index.get_line_ids(index.of_element("O", ion=3)) == [
+        "O 3 4958.91A", "O 3 5006.84A"]
+    assert len(index.of_element("Fe")) == 0
+
+
+def test_grid_accepts_handles(grid):
+    """
+    Grid accessors accept handles in place of line ids.
+    """
+
+    handle = grid.line_index.get_handle("O 3 5006.84A")
+    line = grid.get_line(handle)
+    expected = grid.get_line("O 3 5006.84A")
+
+    assert line.id == "O 3 5006.84A"
+    assert np.array_equal(line.luminosity, expected.luminosity)
+
+    handles = grid.line_index.in_range(3720, 3730)
+    luminosity, _ = grid.get_line_arrays(handles)
+    expected, _ = grid.get_line_arrays(["O 2 3726.03A", "O 2 3728.81A"])
+    assert np.array_equal(luminosity, expected)
+
+
+def test_blend_line_ids():
+    """
+    Blends are split into their component lines.
+    """
+
+    assert get_blend_line_ids("O 3 4958.91A, O 3 5006.84A") == [
+        "O 3 4958.91A", "O 3 5006.84A"]
+
+    blend = ["H 1 4861.32A", 3, "O 2 3726.03A,O 2 3728.81A"]
+    assert get_blend_line_ids(blend) == [
+        "H 1 4861.32A", 3, "O 2 3726.03A", "O 2 3728.81A"]
@@ -0,0 +1,87 @@
+"""
+Tests of the vectorised nearest grid point lookup.
+"""
+
+import numpy as np
+import pytest
+from unyt import unyt_array, K
+
+from gaslight.utils import get_nearest_indices
+
+from conftest import AXES
+
+
+@pytest.mark.parametrize("axis_values", [
+    np.array([1.0, 2.0, 4.0, 8.0, 9.0]),
+    np.array([3.0, 1.0, 2.0]),
+    np.array([5.0]),
+])
+def test_nearest_indices_match_argmin(axis_values):
+    """
+    The searchsorted lookup agrees with a brute force argmin, including
+    values outside the axis, exact ties and unsorted or single point axes.
+    """
+
+    rng = np.random.default_rng(4)
+    values = np.concatenate([
+        rng.uniform(axis_values.min() - 2, axis_values.max() + 2, 200),
+        axis_values,
+        [1.5, 3.0, 8.5]])
+
+    expected = [np.abs(axis_values - value).argmin() for value in values]
+
+    assert np.array_equal(get_nearest_indices(axis_values, values), expected)
+
+
+def test_nearest_indices_in_log10():
+    """
+    Distances along logarithmically spaced axes can be measured in log10.
+    """
+
+    axis_values = np.array([1.0, 10.0, 100.0])
+    values = np.array([4.0, 40.0])
+
+    assert list(get_nearest_indices(axis_values, values)) == [0, 1]
+    assert list(get_nearest_indices(
+        axis_values, values, log10=True)) == [1, 2]
+
+
+def test_nearest_grid_points_match_scalar_lookup(grid):
+    """
+    The array lookup agrees with get_nearest_grid_point, and flat indices
+    index the flattened axes.
+    """
+
+    rng = np.random.default_rng(5)
+    parameters = {
+        axis: rng.uniform(values[0], values[-1], 50)
+        for axis, values in AXES.items()}
+
+    indices = grid.get_nearest_grid_points(parameters)
+    flat = grid.get_nearest_grid_points(parameters, flat=True)
+
+    assert indices.shape == (50, grid.naxes)
+    for i in range(50):
+        point = [parameters[axis][i] for axis in grid.axes]
+        assert tuple(indices[i]) == tuple(grid.get_nearest_grid_point(point))
+
+        for j, axis in enumerate(grid.axes):
+            assert (grid.axes_values_flattened[axis][flat[i]]
+                    == AXES[axis][indices[i, j]])
+
+
+def test_nearest_grid_points_strip_units(grid):
+    """
+    Parameters are taken to be in the units of the axes, any units attached
+    are ignored.
+    """
+
+    parameters = {axis: values[[1, 2]] for axis, values in AXES.items()}
+    with_units = dict(parameters)
+    with_units["log10age"] = unyt_array(parameters["log10age"], K)
+
+    assert np.array_equal(
+        grid.get_nearest_grid_points(with_units),
+        grid.get_nearest_grid_points(parameters))
+    assert np.array_equal(
+        grid.get_nearest_grid_points(parameters), [[1] * 4, [2] * 4])
@@ -0,0 +1,35 @@
+"""
+Tests of reduced precision storage and in-memory precision.
+"""
+
+import numpy as np
+import pytest
+
+import gaslight.exceptions as exceptions
+from gaslight.io import decode_values, encode_values
+
+
+def test_float32_overflow_raises():
+    """
+    Values beyond the range of float32 raise rather than becoming inf.
+    """
+
+    values = np.array([1e36, 1e40])
+
+    with pytest.raises(exceptions.InconsistentParameter):
+        encode_values(values, np.float32)
+
+
+def test_float32_log10_round_trip():
+    """
+    Storing log10 at float32 holds luminosities beyond the float32 range.
+    """
+
+    values = np.array([0.0, 1e36, 1e40, 1e45])
+
+    decoded = decode_values(
+        encode_values(values, np.float32, log10=True), log10=True)
+
+    assert np.all(np.isfinite(decoded[1:]))
+    assert decoded[0] == 0
+    assert np.allclose(decoded, values, rtol=1e-5)
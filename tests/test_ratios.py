@@ -0,0 +1,96 @@
+"""
+Tests of the line ratio and diagnostic diagram engine.
+"""
+
+import numpy as np
+import pytest
+from synthesizer import line_ratios
+
+import gaslight.exceptions as exceptions
+
+
+HB = "H 1 4861.32A"
+O3 = ["O 3 4958.91A", "O 3 5006.84A"]
+
+
+def test_blended_ratio(grid):
+    """
+    Blends are summed, failed models are masked and the result is
+    read-only.
+    """
+
+    ratio = grid.get_ratio([", ".join(O3), HB])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = (
+            grid.luminosity[O3[0]].value + grid.luminosity[O3[1]].value
+        ) / grid.luminosity[HB].value
+
+    assert ratio.shape == grid.grid_shape
+    assert np.all(np.isnan(ratio[grid.failed_models]))
+    assert np.allclose(
+        ratio[~grid.failed_models], expected[~grid.failed_models],
+        rtol=1e-14)
+    assert not ratio.flags.writeable
+
+    unmasked = grid.get_ratio([", ".join(O3), HB], mask_failed=False)
+    assert np.array_equal(unmasked, expected, equal_nan=True)
+
+
+def test_equivalent_definitions_share_result(grid):
+    """
+    The same ratio given in a different order, as a list or with handles is
+    only computed once.
+    """
+
+    ratio = grid.get_ratio([", ".join(O3), HB])
+    handles = [grid.line_index.get_handle(line_id) for line_id in O3]
+
+    assert grid.get_ratio([list(reversed(O3)), HB]) is ratio
+    assert grid.get_ratio([handles, grid.line_index.get_handle(HB)]) is ratio
+
+
+def test_named_ratios_and_diagrams(grid):
+    """
+    Ratios and diagrams can be given by their synthesizer names.
+    """
+
+    ratios = grid.get_ratios(["R23", "O32", [O3[1], HB]])
+
+    assert set(ratios) == {"R23", "O32", 2}
+    for name in ("R23", "O32"):
+        assert ratios[name] is grid.get_ratio(line_ratios.ratios[name])
+
+    x, y = grid.get_diagram("BPT-NII")
+    definition = line_ratios.diagrams["BPT-NII"]
+    assert x is grid.get_ratio(definition[0])
+    assert y is grid.get_ratio(definition[1])
+
+
+def test_blends_cached_once(grid):
+    """
+    The luminosity of a blend is summed once, however many ratios use it.
+    """
+
+    grid.get_ratios([[O3[1], HB], [O3[0], HB], ["O 2 3726.03A", HB]])
+
+    blends = [
+        key for key in grid.derived_cache._data if key[0] == "blend"]
+    assert len(blends) == len(set(blends)) == 4
+    assert ("blend", (HB,)) in grid.derived_cache
+
+
+@pytest.mark.parametrize("method, argument, error", [
+    ("get_ratio", "NotARatio", exceptions.UnrecognisedOption),
+    ("get_ratio", [HB], exceptions.InconsistentParameter),
+    ("get_ratio", ["X 1 1.00A", HB], exceptions.InconsistentParameter),
+    ("get_diagram", "NotADiagram", exceptions.UnrecognisedOption),
+    ("get_diagram", [[HB, HB]], exceptions.InconsistentParameter),
+])
+def test_invalid_definitions(grid, method, argument, error):
+    """
+    Unknown names, unknown lines and malformed definitions are rejected.
+    """
+
+    with pytest.raises(error):
+        getattr(grid, method)(argument)
@@ -0,0 +1,107 @@
+"""
+Tests of opening a sub-volume of a grid with selection=.
+"""
+
+import numpy as np
+import pytest
+
+import gaslight.exceptions as exceptions
+from gaslight.grid import Grid
+
+from conftest import AXES
+
+
+def assert_subvolume(selected, grid, key):
+    """
+    Check a selected grid holds the sub-volume key (a slice per axis) of
+    the full grid.
+    """
+
+    for axis, index in zip(grid.axes, key):
+        assert np.array_equal(selected.axes_values[axis], AXES[axis][index])
+
+    expected_shape = grid.failed_models[key].shape
+    assert selected.grid_shape == expected_shape
+    assert selected.nmodels == np.prod(expected_shape)
+    assert np.array_equal(selected.failed_models, grid.failed_models[key])
+
+    for line_id in grid.line_ids:
+        assert np.array_equal(
+            selected.luminosity[line_id], grid.luminosity[line_id][key])
+        assert np.array_equal(
+            selected.nebular_continuum[line_id],
+            grid.nebular_continuum[line_id][key])
+
+    mesh = np.meshgrid(
+        *[AXES[axis][index] for axis, index in zip(grid.axes, key)],
+        indexing="ij")
+    for axis, values in zip(grid.axes, mesh):
+        assert np.array_equal(
+            selected.axes_values_flattened[axis], values.flatten())
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_range_selection(grid, grid_dir, lazy):
+    """
+    Inclusive value ranges (open at either end) read only the matching
+    hyperslab.
+    """
+
+    selection = {
+        "log10age": (None, 7.0),
+        "hydrogen_density": (100.0, 1000.0)}
+    key = (slice(0, 3), slice(0, 6), slice(0, 7), slice(1, 3))
+
+    with Grid("test-grid", grid_dir=str(grid_dir), selection=selection,
+              lazy=lazy) as selected:
+        assert_subvolume(selected, grid, key)
+
+
+def test_scalar_and_slice_selection(grid, grid_dir):
+    """
+    A single value selects the nearest grid point, keeping the axis, and a
+    slice selects by index.
+    """
+
+    selection = {
+        "metallicity": 0.0045,
+        "ionisation_parameter": slice(1, None, 2)}
+    key = (slice(0, 5), slice(2, 3), slice(1, 7, 2), slice(0, 4))
+
+    with Grid("test-grid", grid_dir=str(grid_dir),
+              selection=selection) as selected:
+        assert selected.axes == grid.axes
+        assert_subvolume(selected, grid, key)
+
+
+def test_views_of_selection(grid, grid_dir):
+    """
+    Views of a selected grid agree with the same views of the full grid.
+    """
+
+    with Grid("test-grid", grid_dir=str(grid_dir),
+              selection={"log10age": (6.5, None)}) as selected:
+        view = selected.isel(log10age=slice(0, None, 2), metallicity=1)
+        expected = grid.isel(log10age=slice(1, None, 2), metallicity=1)
+
+        assert view.axes == expected.axes
+        assert view.grid_shape == expected.grid_shape
+        assert np.array_equal(view.failed_models, expected.failed_models)
+        for line_id in grid.line_ids:
+            assert np.array_equal(
+                view.luminosity[line_id], expected.luminosity[line_id])
+
+
+@pytest.mark.parametrize("selection", [
+    {"temperature": (1.0, 2.0)},
+    {"log10age": (8.5, 9.0)},
+    {"log10age": (6.0, 7.0, 8.0)},
+    {"log10age": slice(None, None, -1)},
+])
+def test_invalid_selection(grid_dir, selection):
+    """
+    Unknown axes, empty ranges and malformed selections are rejected.
+    """
+
+    with pytest.raises(exceptions.InconsistentParameter):
+        Grid("test-grid", grid_dir=str(grid_dir), selection=selection)
@@ -0,0 +1,58 @@
+"""
+Tests of sharing grids (and views of grids) through shared memory.
+"""
+
+import pickle
+
+import numpy as np
+
+
+def collect_models(grid, **kwargs):
+    """
+    Concatenate the chunks of iter_models.
+    """
+    chunks = list(grid.iter_models(prefetch=False, **kwargs))
+    return {
+        key: np.concatenate([chunk[key] for chunk in chunks])
+        for key in ("indices", "failed_models", "luminosity")}
+
+
+def test_shared_grid_round_trip(grid):
+    """
+    The attached grid holds the same lines, and pickles as its handle.
+    """
+
+    with grid.to_shared_memory() as handle:
+        attached = handle.attach()
+        line_id = grid.line_ids[0]
+
+        assert np.array_equal(
+            attached.luminosity[line_id], grid.luminosity[line_id])
+        assert np.array_equal(attached.failed_models, grid.failed_models)
+
+        unpickled = pickle.loads(pickle.dumps(attached))
+        assert unpickled.shared_memory_handle.blocks == handle.blocks
+
+
+def test_shared_view_reads_from_file(grid):
+    """
+    A view published in shared memory reads the same models from the file
+    as it holds in memory.
+    """
+
+    view = grid.isel(log10age=slice(1, None, 2), metallicity=2)
+    line_ids = grid.line_ids[:3]
+
+    with view.to_shared_memory() as handle:
+        attached = handle.attach()
+
+        assert attached.grid_shape == view.grid_shape
+        assert attached.fixed_axes == view.fixed_axes
+
+        expected = collect_models(
+            view, chunk_size=5, line_ids=line_ids, source="memory")
+        for source in ("memory", "file"):
+            models = collect_models(
+                attached, chunk_size=5, line_ids=line_ids, source=source)
+            for key, values in expected.items():
+                assert np.array_equal(models[key], values)
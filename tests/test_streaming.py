@@ -0,0 +1,104 @@
+"""
+Tests of streaming the models of a grid in chunks.
+"""
+
+import numpy as np
+import pytest
+
+from gaslight.grid import Grid
+from gaslight.utils import get_hyperslabs
+
+
+@pytest.mark.parametrize("shape", [(5, 6, 7, 4), (3, 1, 4), (10,)])
+@pytest.mark.parametrize("chunk", [1, 5, 13, 24, 100])
+def test_hyperslabs_cover_range(shape, chunk):
+    """
+    The hyperslabs of consecutive ranges cover the grid in order, exactly
+    once.
+    """
+
+    flat = np.arange(np.prod(shape)).reshape(shape)
+    nmodels = flat.size
+
+    covered = []
+    for start in range(0, nmodels, chunk):
+        stop = min(start + chunk, nmodels)
+        hyperslabs = get_hyperslabs(start, stop, shape)
+        covered.append(np.concatenate(
+            [flat[hyperslab].ravel() for hyperslab in hyperslabs]))
+
+        # The range should need few hyperslabs (at most two per axis)
+        assert len(hyperslabs) <= 2 * len(shape)
+
+    assert np.array_equal(np.concatenate(covered), np.arange(nmodels))
+
+
+def collect_models(grid, **kwargs):
+    """
+    Concatenate the chunks of iter_models.
+    """
+    chunks = list(grid.iter_models(**kwargs))
+    models = {
+        key: np.concatenate([chunk[key] for chunk in chunks])
+        for key in chunks[0] if key != "parameters"}
+    models["parameters"] = {
+        axis: np.concatenate([chunk["parameters"][axis] for chunk in chunks])
+        for axis in grid.axes}
+    return models
+
+
+@pytest.mark.parametrize("source", ["memory", "file"])
+@pytest.mark.parametrize("chunk_size", [5, 17, 2**16])
+def test_iter_models(grid, source, chunk_size):
+    """
+    The chunks hold every model, in flat order, from memory or the file.
+    """
+
+    line_ids = grid.line_ids[:3]
+    models = collect_models(
+        grid, chunk_size=chunk_size, line_ids=line_ids, source=source,
+        prefetch=chunk_size > 5)
+
+    assert np.array_equal(models["indices"], np.arange(grid.nmodels))
+    assert np.array_equal(
+        models["failed_models"], grid.failed_models.ravel())
+    for i, line_id in enumerate(line_ids):
+        assert np.array_equal(
+            models["luminosity"][:, i],
+            grid.luminosity[line_id].ndview.ravel())
+        assert np.array_equal(
+            models["nebular_continuum"][:, i],
+            grid.nebular_continuum[line_id].ndview.ravel())
+
+    mesh = np.meshgrid(
+        *[grid.axes_values[axis] for axis in grid.axes], indexing="ij")
+    for axis, values in zip(grid.axes, mesh):
+        assert np.array_equal(models["parameters"][axis], values.ravel())
+
+
+def test_iter_models_of_views_and_selections(grid_dir, grid):
+    """
+    Views and sub-volumes read the same models from the file as they hold
+    in memory.
+    """
+
+    line_ids = grid.line_ids[:2]
+
+    selected = Grid(
+        "test-grid", grid_dir=str(grid_dir), lazy=True,
+        selection={"metallicity": (0.002, 0.01)})
+    grids = [
+        grid.isel(log10age=slice(1, None, 2), ionisation_parameter=3),
+        selected,
+        selected.isel(hydrogen_density=slice(0, 4, 3)),
+    ]
+
+    for grid_ in grids:
+        expected = collect_models(
+            grid_, chunk_size=7, line_ids=line_ids, source="memory")
+        models = collect_models(
+            grid_, chunk_size=7, line_ids=line_ids, source="file")
+        for key in ("indices", "failed_models", "luminosity"):
+            assert np.array_equal(models[key], expected[key])
+
+    selected.close()
@@ -0,0 +1,151 @@
+"""
+Tests of grid views created with isel and select.
+"""
+
+import numpy as np
+import pytest
+
+import gaslight.exceptions as exceptions
+from gaslight.grid import Grid
+
+from conftest import AXES
+
+
+LOG10_AXES = ["ionisation_parameter", "hydrogen_density"]
+
+
+def test_isel_reduces_axes(grid):
+    """
+    Integer indices remove an axis (recording its value) and slices keep
+    it, with the grid shape, failed models and flattened axes rebuilt.
+    """
+
+    view = grid.isel(metallicity=2, ionisation_parameter=slice(1, None, 2))
+
+    assert view.axes == ["log10age", "ionisation_parameter",
+                         "hydrogen_density"]
+    assert view.fixed_axes == {"metallicity": AXES["metallicity"][2]}
+    assert view.grid_shape == (5, 3, 4)
+    assert view.nmodels == 60
+    assert np.array_equal(
+        view.ionisation_parameter, AXES["ionisation_parameter"][1::2])
+    assert np.array_equal(
+        view.failed_models, grid.failed_models[:, 2, 1::2, :])
+    assert len(view.axes_values_flattened["log10age"]) == 60
+    assert view.view_of is grid
+
+
+def test_views_share_memory(grid):
+    """
+    The arrays of a view are views of the parent's arrays.
+    """
+
+    view = grid.isel(log10age=slice(0, 3), hydrogen_density=1)
+
+    for line_id in grid.line_ids:
+        assert np.shares_memory(
+            view.luminosity[line_id], grid.luminosity[line_id])
+        assert np.array_equal(
+            view.luminosity[line_id], grid.luminosity[line_id][0:3, :, :, 1])
+
+
+def test_select_by_value(grid):
+    """
+    select takes value ranges, single values (the nearest grid point) and
+    slices, and agrees with the equivalent isel.
+    """
+
+    view = grid.select(
+        log10age=(6.5, 7.5), metallicity=0.0045,
+        hydrogen_density=slice(None, None, 3))
+    expected = grid.isel(
+        log10age=slice(1, 4), metallicity=2,
+        hydrogen_density=slice(0, 4, 3))
+
+    assert view.axes == expected.axes
+    assert view.fixed_axes == expected.fixed_axes
+    assert view.grid_shape == (3, 7, 2)
+    for line_id in grid.line_ids:
+        assert np.array_equal(
+            view.luminosity[line_id], expected.luminosity[line_id])
+
+
+def test_views_of_views(grid):
+    """
+    Selecting from a view is the same as selecting from the grid directly.
+    """
+
+    view = grid.isel(log10age=slice(1, None)).isel(
+        log10age=slice(None, None, 2), metallicity=-1)
+    expected = grid.isel(log10age=slice(1, None, 2), metallicity=5)
+
+    assert view.fixed_axes == expected.fixed_axes
+    assert view.grid_shape == expected.grid_shape
+    assert np.array_equal(view.failed_models, expected.failed_models)
+    for line_id in grid.line_ids:
+        assert np.array_equal(
+            view.luminosity[line_id], expected.luminosity[line_id])
+
+
+def test_view_methods(grid):
+    """
+    Line access, ratios and interpolation work on a view.
+    """
+
+    view = grid.isel(log10age=3, metallicity=1)
+    line_id = grid.line_ids[2]
+
+    line = view.get_line(line_id, covering_fraction=0.5)
+    assert np.array_equal(
+        line.luminosity.value, 0.5 * grid.luminosity[line_id].value[3, 1])
+
+    ratio = view.get_ratio([line_id, grid.line_ids[1]])
+    expected = grid.get_ratio([line_id, grid.line_ids[1]])
+    assert np.array_equal(ratio, expected[3, 1], equal_nan=True)
+
+    # Interpolating the view matches interpolating the full grid on the
+    # fixed axes' grid points
+    rng = np.random.default_rng(7)
+    parameters = {
+        axis: 10**rng.uniform(
+            np.log10(AXES[axis][0]), np.log10(AXES[axis][-1]), 10)
+        for axis in LOG10_AXES}
+    luminosity = view.get_interpolated_luminosities(
+        parameters, [line_id], log10=LOG10_AXES, fill_failed=True)
+
+    parameters.update(log10age=AXES["log10age"][3],
+                      metallicity=AXES["metallicity"][1])
+    expected = grid.get_interpolated_luminosities(
+        parameters, [line_id], log10=LOG10_AXES, fill_failed=True)
+
+    assert np.allclose(luminosity, expected, rtol=1e-12)
+
+
+def test_lazy_views(grid, grid_dir):
+    """
+    Views of lazy grids read the parent's lines when accessed.
+    """
+
+    with Grid("test-grid", grid_dir=str(grid_dir), lazy=True) as lazy:
+        view = lazy.isel(hydrogen_density=2)
+        line_id = grid.line_ids[0]
+
+        assert not lazy.luminosity.is_loaded(line_id)
+        assert np.array_equal(
+            view.luminosity[line_id], grid.luminosity[line_id][..., 2])
+        assert lazy.luminosity.is_loaded(line_id)
+
+
+@pytest.mark.parametrize("indexers", [
+    {"temperature": 0},
+    {"log10age": 5},
+    {"log10age": 1.5},
+    {"log10age": slice(None, None, -1)},
+])
+def test_invalid_indexers(grid, indexers):
+    """
+    Unknown axes, indices out of range and invalid indices are rejected.
+    """
+
+    with pytest.raises(exceptions.InconsistentParameter):
+        grid.isel(indexers)
@@ -0,0 +1,160 @@
+"""
+Benchmark the gaslight interpolation engines against scipy's
+RegularGridInterpolator, interpolating a set of lines at random points
+within the grid. The cost of cubic spline interpolation relative to linear
+interpolation (with the same engine) is also reported.
+
+Example:
+    python benchmark_interpolation.py -grid_dir=grids \
+        -grid_name=bpass-c23.01-full -npoints=100000 -nlines=50 \
+        -log10 ionisation_parameter hydrogen_density
+"""
+
+import argparse
+import time
+
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+from gaslight.grid import Grid
+from gaslight.interpolation import GridInterpolator, NUMBA_AVAILABLE
+
+
+def run_scipy(grid, line_ids, points, log10):
+    """
+    Interpolate each line with its own scipy interpolator (as
+    Grid.setup_interpolator does).
+    """
+
+    axes_points = [
+        np.log10(grid.axes_values[axis]) if axis in log10
+        else grid.axes_values[axis] for axis in grid.axes]
+
+    xi = points.copy()
+    for i, axis in enumerate(grid.axes):
+        if axis in log10:
+            xi[:, i] = np.log10(xi[:, i])
+
+    return np.stack([
+        RegularGridInterpolator(
+            axes_points, grid.luminosity[line_id].ndview)(xi)
+        for line_id in line_ids], axis=1)
+
+
+def run_gaslight(grid, line_ids, points, log10, engine, method="linear"):
+    """
+    Interpolate every line at once with a GridInterpolator.
+    """
+
+    interpolator = GridInterpolator(
+        grid.axes, grid.axes_values, log10=log10, engine=engine,
+        method=method)
+
+    return interpolator(
+        grid._get_table("luminosity", line_ids, interpolator=interpolator),
+        points)
+
+
+def time_run(run):
+    """
+    Return the result and wall clock time of a run.
+    """
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the interpolation engines"
+    )
+
+    # path to grid directory
+    parser.add_argument("-grid_dir",
+                        type=str,
+                        required=True)
+
+    # the name of the grid to benchmark
+    parser.add_argument("-grid_name",
+                        type=str,
+                        required=True)
+
+    # the number of points to interpolate
+    parser.add_argument("-npoints",
+                        type=int,
+                        default=100000,
+                        required=False)
+
+    # the number of lines to interpolate
+    parser.add_argument("-nlines",
+                        type=int,
+                        default=50,
+                        required=False)
+
+    # the axes to interpolate in log10
+    parser.add_argument("-log10",
+                        type=str,
+                        nargs="*",
+                        default=[],
+                        required=False)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    grid = Grid(args.grid_name, grid_dir=args.grid_dir)
+    line_ids = grid.line_ids[:args.nlines]
+
+    # Random points within the grid, drawn uniformly in the interpolation
+    # space
+    rng = np.random.default_rng(42)
+    points = np.empty((args.npoints, grid.naxes))
+    for i, axis in enumerate(grid.axes):
+        values = grid.axes_values[axis]
+        if axis in args.log10:
+            points[:, i] = 10**rng.uniform(
+                np.log10(values[0]), np.log10(values[-1]), args.npoints)
+        else:
+            points[:, i] = rng.uniform(values[0], values[-1], args.npoints)
+
+    print(f"grid shape: {grid.grid_shape}, lines: {len(line_ids)}, "
+          f"points: {args.npoints}")
+
+    runs = {"scipy": lambda: run_scipy(grid, line_ids, points, args.log10)}
+    runs["numpy"] = lambda: run_gaslight(
+        grid, line_ids, points, args.log10, "numpy")
+    if NUMBA_AVAILABLE:
+
+        # Compile outside of the timed run
+        run_gaslight(grid, line_ids, points[:1], args.log10, "numba")
+
+        runs["numba"] = lambda: run_gaslight(
+            grid, line_ids, points, args.log10, "numba")
+
+    reference = None
+    reference_time = None
+    linear_times = {}
+    for label, run in runs.items():
+        result, elapsed = time_run(run)
+        linear_times[label] = elapsed
+
+        if reference is None:
+            reference, reference_time = result, elapsed
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            error = np.nanmax(np.abs(result - reference) / np.abs(reference))
+
+        print(f"{label:<8} {elapsed:>9.4f} s  speed-up: "
+              f"{reference_time / elapsed:>7.2f}  max rel. diff: {error:.2e}")
+
+    # Cubic splines visit 4^n_axes rather than 2^n_axes grid points per
+    # query. The spline coefficients are computed (and cached) outside of
+    # the timed runs.
+    print(f"cubic (expected cost ratio 2^n_axes = {2**grid.naxes}):")
+    for label in runs:
+        if label == "scipy":
+            continue
+        run_gaslight(grid, line_ids, points[:1], args.log10, label, "cubic")
+        _, elapsed = time_run(lambda: run_gaslight(
+            grid, line_ids, points, args.log10, label, "cubic"))
+        print(f"{label:<8} {elapsed:>9.4f} s  cubic / linear: "
+              f"{elapsed / linear_times[label]:>7.2f}")
@@ -0,0 +1,126 @@
+"""
+Compare the accuracy and speed of interpolating linear and log10 line
+luminosities using held-out grid nodes.
+
+Every other node along each axis (with at least three points) is kept to
+form a coarse grid (a view of the full grid, see Grid.isel). The held-out
+nodes, i.e. those of the full grid not in the coarse grid, are then
+interpolated from the coarse grid and compared with their true values. Nodes
+which failed, or whose interpolation uses a failed model, are excluded. The
+error is reported in dex, i.e. |log10(interpolated / true)|, along with the
+time taken per point.
+
+Example:
+    python benchmark_log10_interpolation.py -grid_dir=grids \
+        -grid_name=bpass-c23.01-full \
+        -log10 ionisation_parameter hydrogen_density
+"""
+
+import argparse
+import time
+
+import numpy as np
+from gaslight.grid import Grid
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark linear and log10 luminosity interpolation"
+    )
+
+    # path to grid directory
+    parser.add_argument("-grid_dir",
+                        type=str,
+                        required=True)
+
+    # the name of the grid
+    parser.add_argument("-grid_name",
+                        type=str,
+                        required=True)
+
+    # the axes to interpolate in log10
+    parser.add_argument("-log10",
+                        type=str,
+                        nargs="*",
+                        default=[],
+                        required=False)
+
+    # the lines to interpolate (default all)
+    parser.add_argument("-lines",
+                        type=str,
+                        nargs="*",
+                        default=None,
+                        required=False)
+
+    # the number of times each interpolation is timed
+    parser.add_argument("-repeats",
+                        type=int,
+                        default=3,
+                        required=False)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    grid = Grid(args.grid_name, grid_dir=args.grid_dir)
+    line_ids = args.lines or grid.line_ids
+
+    # The coarse grid keeps every other node of each axis
+    step = {
+        axis: 2 if len(grid.axes_values[axis]) >= 3 else 1
+        for axis in grid.axes}
+    coarse = grid.isel({
+        axis: slice(None, None, step[axis]) for axis in grid.axes})
+
+    # The held-out nodes lie between the coarse nodes and did not fail
+    indices = np.indices(grid.grid_shape).reshape(grid.naxes, -1).T
+    held_out = np.zeros(len(indices), dtype=bool)
+    inside = np.ones(len(indices), dtype=bool)
+    for i, axis in enumerate(grid.axes):
+        held_out |= indices[:, i] % step[axis] != 0
+        last = (len(grid.axes_values[axis]) - 1) // step[axis] * step[axis]
+        inside &= indices[:, i] <= last
+    held_out &= inside & ~grid.failed_models_flattened
+
+    parameters = {
+        axis: grid.axes_values_flattened[axis][held_out]
+        for axis in grid.axes}
+    truth = grid._get_table("luminosity", line_ids)[held_out]
+
+    print(f"grid shape: {grid.grid_shape}, coarse shape: "
+          f"{coarse.grid_shape}, held-out nodes: {held_out.sum()}, "
+          f"lines: {len(line_ids)}")
+    print(f"{'mode':<12}{'median':>12}{'90%':>12}{'99%':>12}"
+          f"{'max':>12}{'us/point':>12}")
+
+    for label, log10_luminosity in (("linear", False), ("log10", True)):
+
+        # The first call builds (and caches) the tables
+        luminosity, touches_failed = coarse.get_interpolated_luminosities(
+            parameters,
+            line_ids=line_ids,
+            log10=args.log10,
+            log10_luminosity=log10_luminosity,
+            return_failed=True)
+
+        elapsed = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            coarse.get_interpolated_luminosities(
+                parameters,
+                line_ids=line_ids,
+                log10=args.log10,
+                log10_luminosity=log10_luminosity)
+            elapsed.append(time.perf_counter() - start)
+
+        # Only compare positive values away from failed models
+        good = ~touches_failed[:, None] & (truth > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            error = np.abs(np.log10(luminosity.ndview / truth))
+        error = error[good & np.isfinite(error)]
+
+        print(f"{label:<12}{np.median(error):>12.2e}"
+              f"{np.percentile(error, 90):>12.2e}"
+              f"{np.percentile(error, 99):>12.2e}"
+              f"{error.max():>12.2e}"
+              f"{1e6 * min(elapsed) / held_out.sum():>12.3f}")
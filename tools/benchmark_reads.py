@@ -0,0 +1,69 @@
+"""
+Benchmark the time taken to open a Grid with serial and parallel reads,
+reporting the time spent in each phase (metadata, luminosities, continua
+and failed models).
+
+Example:
+    python benchmark_reads.py -grid_dir=grids -grid_name=bpass-c23.01-full \
+        -workers 2 4 8
+"""
+
+import argparse
+import time
+
+from gaslight.grid import Grid
+from gaslight.io import READ_BACKENDS
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark serial and parallel grid reads"
+    )
+
+    # path to grid directory
+    parser.add_argument("-grid_dir",
+                        type=str,
+                        required=True)
+
+    # the name of the grid to benchmark
+    parser.add_argument("-grid_name",
+                        type=str,
+                        required=True)
+
+    # the numbers of workers to try
+    parser.add_argument("-workers",
+                        type=int,
+                        nargs="*",
+                        default=[2, 4, 8],
+                        required=False)
+
+    # the backends to try
+    parser.add_argument("-backends",
+                        type=str,
+                        nargs="*",
+                        default=list(READ_BACKENDS),
+                        required=False)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    runs = [("serial", None, "thread")]
+    for backend in args.backends:
+        for workers in args.workers:
+            runs.append((f"{backend}-{workers}", workers, backend))
+
+    for label, workers, backend in runs:
+        start = time.perf_counter()
+        grid = Grid(
+            args.grid_name,
+            grid_dir=args.grid_dir,
+            read_workers=workers,
+            read_backend=backend,
+        )
+        elapsed = time.perf_counter() - start
+
+        timings = "  ".join(
+            f"{phase}: {seconds:.3f}"
+            for phase, seconds in grid.read_timings.items())
+        print(f"{label:<12} total: {elapsed:.3f} s  {timings}")
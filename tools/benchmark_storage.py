@@ -0,0 +1,153 @@
+"""
+Benchmark the file size and read time of a grid stored with different
+layouts, chunking and compression settings.
+
+The grid is converted to each setting in a temporary directory and the
+following reads, matching how the Grid accesses data, are timed:
+
+    full: every line of the luminosity (as when opening a Grid eagerly).
+    line: a single line (as when a lazy Grid touches a line).
+    slice: every line at a fixed value of the first axis (as when opening a
+        sub-volume of the grid).
+
+Example:
+    python benchmark_storage.py -grid_dir=grids -grid_name=bpass-c23.01-full
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from gaslight.io import GridFile, convert_grid
+
+
+# The settings to benchmark: (label, layout_version, chunks, compression,
+# compression_opts, shuffle)
+SETTINGS = [
+    ("v1", 1, None, None, None, False),
+    ("v1-gzip4", 1, "line", "gzip", 4, True),
+    ("v2", 2, None, None, None, False),
+    ("v2-line", 2, "line", None, None, False),
+    ("v2-line-lzf", 2, "line", "lzf", None, True),
+    ("v2-line-gzip1", 2, "line", "gzip", 1, True),
+    ("v2-line-gzip4", 2, "line", "gzip", 4, True),
+    ("v2-line-gzip9", 2, "line", "gzip", 9, True),
+    ("v2-slice-gzip4", 2, "slice", "gzip", 4, True),
+    ("v2-auto-gzip4", 2, "auto", "gzip", 4, True),
+]
+
+
+def time_read(filename, read, repeats):
+    """
+    Return the best time of a read, reopening the file each time so that
+    the HDF5 chunk cache is cold.
+    """
+
+    times = []
+    for _ in range(repeats):
+        grid_file = GridFile(filename)
+        start = time.perf_counter()
+        read(grid_file)
+        times.append(time.perf_counter() - start)
+        grid_file.close()
+
+    return min(times)
+
+
+def read_full(grid_file):
+    grid_file.read_cube("luminosity", grid_file.line_ids)
+
+
+def read_line(grid_file):
+    grid_file.read("luminosity", grid_file.line_ids[0])
+
+
+def read_slice(grid_file):
+    if grid_file.layout_version == 1:
+        for line_id in grid_file.line_ids:
+            grid_file.hf["luminosity"][line_id][0]
+    else:
+        grid_file.hf["luminosity"][:, 0]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark grid storage settings"
+    )
+
+    # path to grid directory
+    parser.add_argument("-grid_dir",
+                        type=str,
+                        required=True)
+
+    # the name of the grid to benchmark
+    parser.add_argument("-grid_name",
+                        type=str,
+                        required=True)
+
+    # the number of times to repeat each read
+    parser.add_argument("-repeats",
+                        type=int,
+                        default=3,
+                        required=False)
+
+    # the directory to write the converted grids to
+    parser.add_argument("-tmp_dir",
+                        type=str,
+                        default=None,
+                        required=False)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    input_filename = f'{args.grid_dir}/{args.grid_name}.hdf5'
+
+    print(f"{'setting':<16} {'size/MB':>9} {'ratio':>7} "
+          f"{'full/s':>9} {'line/s':>9} {'slice/s':>9}")
+
+    reference_size = None
+    reference_file = GridFile(input_filename)
+    line_ids = reference_file.line_ids
+    reference = reference_file.read_cube("luminosity", line_ids)
+    reference_file.close()
+
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp_dir:
+
+        for (label, layout_version, chunks, compression, compression_opts,
+             shuffle) in SETTINGS:
+
+            filename = f'{tmp_dir}/{label}.hdf5'
+
+            convert_grid(
+                input_filename,
+                filename,
+                layout_version=layout_version,
+                chunks=chunks,
+                compression=compression,
+                compression_opts=compression_opts,
+                shuffle=shuffle)
+
+            # Check the data survived the round trip. The lines are read in
+            # the order of the input since version 1 files list them in
+            # (alphabetical) group order.
+            grid_file = GridFile(filename)
+            assert np.array_equal(
+                grid_file.read_cube("luminosity", line_ids), reference)
+            grid_file.close()
+
+            size = os.path.getsize(filename)
+            if reference_size is None:
+                reference_size = size
+
+            timings = [
+                time_read(filename, read, args.repeats)
+                for read in (read_full, read_line, read_slice)]
+
+            print(f"{label:<16} {size / 2**20:>9.2f} "
+                  f"{size / reference_size:>7.3f} "
+                  + " ".join(f"{t:>9.4f}" for t in timings))
+
+            os.remove(filename)
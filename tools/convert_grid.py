@@ -0,0 +1,99 @@
+"""
+Convert a gaslight grid between on-disk layouts, e.g. from the original
+one-dataset-per-line layout (version 1) to the line cube layout (version 2),
+optionally changing the chunking, compression and precision. See gaslight.io
+for a description of the layouts.
+
+Example:
+    python convert_grid.py -grid_dir=grids -grid_name=bpass-c23.01-full
+    python convert_grid.py -grid_dir=grids -grid_name=bpass-c23.01-full \
+        -chunks=line -compression=gzip -compression_opts=4 -shuffle
+"""
+
+import argparse
+from gaslight.io import convert_grid, parse_chunks, LAYOUT_VERSION, PRECISIONS
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Convert a gaslight grid to a different layout"
+    )
+
+    # path to grid directory
+    parser.add_argument("-grid_dir",
+                        type=str,
+                        required=True)
+
+    # the name of the grid to convert
+    parser.add_argument("-grid_name",
+                        type=str,
+                        required=True)
+
+    # the name of the new grid, by default the layout version is appended
+    parser.add_argument("-new_grid_name",
+                        type=str,
+                        default=None,
+                        required=False)
+
+    # the layout version to convert to
+    parser.add_argument("-layout_version",
+                        type=int,
+                        default=LAYOUT_VERSION,
+                        required=False)
+
+    # the chunking of the grid datasets: line, slice, auto, none or a comma
+    # separated chunk shape (see gaslight.io.get_chunk_shape)
+    parser.add_argument("-chunks",
+                        type=str,
+                        default=None,
+                        required=False)
+
+    # the compression filter, e.g. gzip or lzf
+    parser.add_argument("-compression",
+                        type=str,
+                        default=None,
+                        required=False)
+
+    # the compression level (gzip only)
+    parser.add_argument("-compression_opts",
+                        type=int,
+                        default=None,
+                        required=False)
+
+    # apply the shuffle filter before compression
+    parser.add_argument("-shuffle",
+                        action="store_true")
+
+    # the precision to store the lines and continua at: float64, float32 or
+    # mixed (float32 luminosities, float64 continua). float32 can only hold
+    # values up to ~3.4e38, so luminosities above this need -log10.
+    parser.add_argument("-precision",
+                        type=str,
+                        default="float64",
+                        choices=PRECISIONS,
+                        help="float32 and mixed require -log10 for "
+                             "luminosities above ~3.4e38 erg/s",
+                        required=False)
+
+    # store log10 of the lines and continua
+    parser.add_argument("-log10",
+                        action="store_true")
+
+    # parse arguments
+    args = parser.parse_args()
+
+    new_grid_name = args.new_grid_name
+    if new_grid_name is None:
+        new_grid_name = f'{args.grid_name}-v{args.layout_version}'
+
+    convert_grid(
+        f'{args.grid_dir}/{args.grid_name}.hdf5',
+        f'{args.grid_dir}/{new_grid_name}.hdf5',
+        layout_version=args.layout_version,
+        chunks=parse_chunks(args.chunks),
+        compression=args.compression,
+        compression_opts=args.compression_opts,
+        shuffle=args.shuffle,
+        precision=args.precision,
+        log10=args.log10)
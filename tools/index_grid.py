@@ -0,0 +1,36 @@
+"""
+Add (or regenerate) the metadata index of an existing gaslight grid, so its
+axes, lines, failed models and content hash can be read without touching the
+bulk data. Grids written by gaslight.io already contain an index. See
+gaslight.io for a description of the index.
+
+Example:
+    python index_grid.py -grid_dir=grids -grid_name=bpass-c23.01-full
+"""
+
+import argparse
+from gaslight.io import write_index
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Add a metadata index to a gaslight grid"
+    )
+
+    # path to grid directory
+    parser.add_argument("-grid_dir",
+                        type=str,
+                        required=True)
+
+    # the name of the grid to index
+    parser.add_argument("-grid_name",
+                        type=str,
+                        required=True)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    content_hash = write_index(f'{args.grid_dir}/{args.grid_name}.hdf5')
+
+    print(f'content hash: {content_hash}')
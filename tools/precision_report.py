@@ -0,0 +1,121 @@
+"""
+Quantify the accuracy of line ratios when a grid is stored at reduced
+precision.
+
+Each line's luminosity is encoded at each storage precision (exactly as
+gaslight.io does when writing), decoded again, and its ratio to a reference
+line compared with the float64 ratio over all models that did not fail. The
+error is reported in dex, i.e. |log10(ratio / float64 ratio)|, along with the
+memory required to hold the luminosities.
+
+Example:
+    python precision_report.py -grid_dir=grids -grid_name=bpass-c23.01-full \
+        -reference_line="H 1 4861.32A"
+"""
+
+import argparse
+
+import numpy as np
+from gaslight.grid import Grid
+from gaslight.io import decode_values, encode_values
+import gaslight.exceptions as exceptions
+
+
+# The storage settings to compare: (label, dtype, log10)
+SETTINGS = [
+    ("float32", np.float32, False),
+    ("float16-log10", np.float16, True),
+    ("float32-log10", np.float32, True),
+]
+
+
+def round_trip(values, dtype, log10):
+    """
+    Encode and decode values, returning None if they cannot be stored at
+    this precision.
+    """
+    try:
+        return decode_values(
+            encode_values(values, dtype, log10), np.float64, log10)
+    except exceptions.InconsistentParameter:
+        return None
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Report the accuracy of line ratios at reduced precision"
+    )
+
+    # path to grid directory
+    parser.add_argument("-grid_dir",
+                        type=str,
+                        required=True)
+
+    # the name of the grid
+    parser.add_argument("-grid_name",
+                        type=str,
+                        required=True)
+
+    # the line all other lines are divided by
+    parser.add_argument("-reference_line",
+                        type=str,
+                        default="H 1 6562.80A",
+                        required=False)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    grid = Grid(args.grid_name, grid_dir=args.grid_dir)
+
+    # Only consider models that did not fail
+    good = ~grid.failed_models
+
+    reference = grid.luminosity[args.reference_line].ndview[good]
+
+    print(f"grid shape: {grid.grid_shape}, lines: {grid.number_of_lines}, "
+          f"reference line: {args.reference_line}")
+    print(f"{'setting':<16}{'memory':>12}{'median':>12}"
+          f"{'99%':>12}{'max':>12}  worst line")
+
+    for label, dtype, log10 in SETTINGS:
+
+        reference_ = round_trip(reference, dtype, log10)
+        if reference_ is None:
+            print(f"{label:<16} values exceed the range of "
+                  f"{np.dtype(dtype).name}")
+            continue
+
+        errors = {}
+        overflow = False
+        for line_id in grid.line_ids:
+            values = grid.luminosity[line_id].ndview[good]
+            values_ = round_trip(values, dtype, log10)
+            if values_ is None:
+                overflow = True
+                break
+
+            # Only compare finite, non-zero ratios
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = values / reference
+                ratio_ = values_ / reference_
+                error = np.abs(np.log10(ratio_ / ratio))
+            errors[line_id] = error[np.isfinite(error)]
+
+        if overflow:
+            print(f"{label:<16} values exceed the range of "
+                  f"{np.dtype(dtype).name}")
+            continue
+
+        all_errors = np.concatenate(list(errors.values()))
+        worst = max(
+            errors, key=lambda k: errors[k].max() if errors[k].size else 0)
+        memory = grid.nmodels * grid.number_of_lines * np.dtype(dtype).itemsize
+
+        print(f"{label:<16}{memory / 2**20:>9.2f} MB"
+              f"{np.median(all_errors):>12.2e}"
+              f"{np.percentile(all_errors, 99):>12.2e}"
+              f"{all_errors.max():>12.2e}  {worst}")
+
+    memory = grid.nmodels * grid.number_of_lines * 8
+    print(f"{'float64':<16}{memory / 2**20:>9.2f} MB (reference)")